@@ -12,8 +12,15 @@ from dotenv import load_dotenv
 from google_auth_oauthlib.flow import Flow
 from googleapiclient.discovery import build
 from werkzeug.security import generate_password_hash
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, ConnectionRefusedError, join_room, emit
 from models import db, User  # Ensure User model is imported
+from execution_queue import execution_queue
+import quiz_ingest
+import chat_rooms
+import chat_ingest
+import chat_search
+import plagiarism_checker
+from utils.socket_bus import socketio_options
 
 # Load environment variables
 load_dotenv()
@@ -39,6 +46,34 @@ def create_app():
     app.config['JWT_SECRET_KEY'] = os.getenv("JWT_SECRET_KEY", "fallback_secret_key")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = False
 
+    # Use MinHash/LSH candidates instead of exact fingerprints for plagiarism checks
+    app.config['PLAGIARISM_USE_LSH'] = os.getenv("PLAGIARISM_USE_LSH", "false").lower() in ['true', '1']
+
+    # Code execution jobs: parallel runs, queue depth before 429s, and runs in flight per user.
+    # The limits apply per worker process; jobs are shared through the code_jobs table.
+    app.config['CODE_EXECUTION_CONCURRENCY'] = int(os.getenv("CODE_EXECUTION_CONCURRENCY", 4))
+    app.config['CODE_EXECUTION_QUEUE_DEPTH'] = int(os.getenv("CODE_EXECUTION_QUEUE_DEPTH", 100))
+    app.config['CODE_EXECUTION_MAX_JOBS_PER_USER'] = int(os.getenv("CODE_EXECUTION_MAX_JOBS_PER_USER", 3))
+
+    # Quiz submissions: buffer them and write in batches (rows per INSERT, max seconds a row waits)
+    app.config['QUIZ_WRITE_BEHIND'] = os.getenv("QUIZ_WRITE_BEHIND", "false").lower() in ['true', '1']
+    app.config['QUIZ_SUBMISSION_BATCH'] = int(os.getenv("QUIZ_SUBMISSION_BATCH", 500))
+    app.config['QUIZ_SUBMISSION_FLUSH_INTERVAL'] = float(os.getenv("QUIZ_SUBMISSION_FLUSH_INTERVAL", 0.05))
+
+    # Chat messages: optionally broadcast first and write in batches (rows per INSERT, max seconds a row waits)
+    app.config['CHAT_WRITE_BEHIND'] = os.getenv("CHAT_WRITE_BEHIND", "false").lower() in ['true', '1']
+    app.config['CHAT_FLUSH_BATCH'] = int(os.getenv("CHAT_FLUSH_BATCH", 200))
+    app.config['CHAT_FLUSH_INTERVAL'] = float(os.getenv("CHAT_FLUSH_INTERVAL", 0.1))
+    # Required with CHAT_WRITE_BEHIND: this process's snowflake worker id (0-31), different for every worker and host
+    app.config['SNOWFLAKE_WORKER_ID'] = os.getenv("SNOWFLAKE_WORKER_ID")
+    # Chat event streams: seconds between keep-alives (and database catch-ups), seconds before the client reconnects
+    app.config['CHAT_STREAM_KEEPALIVE'] = float(os.getenv("CHAT_STREAM_KEEPALIVE", 15))
+    app.config['CHAT_STREAM_DURATION'] = float(os.getenv("CHAT_STREAM_DURATION", 300))
+
+    # Socket.IO message bus shared by all workers, e.g. redis://host:6379/0 or amqp://host//; see utils.socket_bus
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv("SOCKETIO_MESSAGE_QUEUE")
+    app.config['SOCKETIO_CHANNEL'] = os.getenv("SOCKETIO_CHANNEL", "flask-socketio")
+
     # Configure mail
     try:
         app.config['MAIL_SERVER'] = os.getenv("MAIL_SERVER")
@@ -62,7 +97,13 @@ def create_app():
     mail.init_app(app)
     migrate.init_app(app, db)
     JWTManager(app)
-    socketio.init_app(app)
+    socketio.init_app(app, **socketio_options(app))  # Room broadcasts reach clients of every worker
+    execution_queue.init_app(app, socketio)
+    quiz_ingest.init_app(app)
+    chat_rooms.init_app(app, socketio)
+    chat_ingest.init_app(app)
+    chat_search.init_app(app)
+    plagiarism_checker.init_app(app)
     CORS(app, supports_credentials=True)
 
     # Allow insecure transport for local development
@@ -157,17 +198,51 @@ def create_app():
 
     # WebSocket Handlers
     @socketio.on('connect')
-    def handle_connect():
-        print("✅ Client connected")
+    def handle_connect(auth=None):
+        # Only authenticated sockets; each joins the rooms of its own classes and gets only their chats
+        user = chat_rooms.authenticate(auth)
+        if not user:
+            raise ConnectionRefusedError('unauthorized')
+        session['user_id'] = user.id
+        for class_id in chat_rooms.class_ids(user):
+            join_room(chat_rooms.room(class_id))
+        print(f"✅ Client connected (user {user.id})")
 
     @socketio.on('disconnect')
     def handle_disconnect():
         print("❌ Client disconnected")
 
+    @socketio.on('join_class')
+    def handle_join_class(data):
+        # For classes the user joined after connecting
+        try:
+            class_id = int((data or {}).get('class_id'))
+        except (TypeError, ValueError):
+            emit('error', {'msg': 'class_id must be a number'})
+            return
+        user = User.query.get(session.get('user_id'))
+        if not user or not chat_rooms.is_member(user, class_id):
+            emit('error', {'msg': 'Not a member of this class', 'class_id': class_id})
+            return
+        join_room(chat_rooms.room(class_id))
+        emit('joined_class', {'class_id': class_id})
+
     @socketio.on('message')
     def handle_message(data):
         print(f"📩 Received message: {data}")
-        socketio.emit('response', {'message': 'Message received!'})
+        emit('response', {'message': 'Message received!'})  # To the sender only
+
+    @socketio.on('subscribe_job')
+    def handle_subscribe_job(data):
+        job_id = (data or {}).get('job_id')
+        job = execution_queue.get(job_id)
+        # Only the submitter, as on GET /code/jobs/<id>; other users cannot tell the job exists
+        if not job or str(job['user_id']) != str(session.get('user_id')):
+            emit('code_result', {'id': job_id, 'status': 'unknown'})
+            return
+        join_room(execution_queue.room(job_id))
+        if job['status'] == 'done':
+            emit('code_result', execution_queue.public_view(job))  # Finished before the client subscribed
 
     # Test API Route
     @app.route('/test')
@@ -189,6 +264,7 @@ def create_app():
     from routes.chat_routes import chat_bp
     from routes.class_routes import classes_bp
     from routes.quizes import quiz_bp
+    from routes.code_routes import code_bp
 
     app.register_blueprint(user_bp)
     app.register_blueprint(school_bp)
@@ -198,6 +274,7 @@ def create_app():
     app.register_blueprint(chat_bp)
     app.register_blueprint(classes_bp)
     app.register_blueprint(quiz_bp)
+    app.register_blueprint(code_bp)
 
     return app
 
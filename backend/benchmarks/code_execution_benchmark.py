@@ -0,0 +1,71 @@
+"""Runs/sec of the warm interpreter pool against spawning an interpreter per call.
+
+Node workers serve one run each, so under sustained load they are bound by
+Node start-up like the spawn path; their gain shows in the idle latency line,
+where a pre-started worker is always waiting.
+
+    python benchmarks/code_execution_benchmark.py --runs 100 --concurrency 1 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_execution import execute_code, get_pool  # noqa: E402
+
+PROGRAMS = {
+    "python": "n = int(input())\nprint(sum(i * i for i in range(n)))\n",
+    "javascript": "let s = 0; for (let i = 0; i < 1000; i++) s += i * i; console.log(s);\n",
+}
+
+
+def measure(language, runs, concurrency, use_pool):
+    def one(_):
+        result = execute_code(language, PROGRAMS[language], stdin="1000", use_pool=use_pool, cache=False)
+        assert result.get("exit_code") == 0, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(runs)))
+    return runs / (time.perf_counter() - started)
+
+
+def idle_latency(language, runs, use_pool):
+    """Mean latency of single runs spaced out enough for the pool to refill."""
+    total = 0
+    for _ in range(runs):
+        time.sleep(0.5)
+        started = time.perf_counter()
+        execute_code(language, PROGRAMS[language], stdin="1000", use_pool=use_pool, cache=False)
+        total += time.perf_counter() - started
+    return total / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--languages", nargs="+", default=list(PROGRAMS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    args = parser.parse_args()
+
+    for language in args.languages:
+        get_pool(language)
+        time.sleep(1)  # Let the pool start its first workers
+        for concurrency in args.concurrency:
+            spawned = measure(language, args.runs, concurrency, use_pool=False)
+            pooled = measure(language, args.runs, concurrency, use_pool=True)
+            print(
+                f"{language:<10} concurrency {concurrency}: spawn {spawned:6.1f} runs/s, "
+                f"pool {pooled:6.1f} runs/s (x{pooled / spawned:.1f})"
+            )
+        print(
+            f"{language:<10} idle latency: spawn {idle_latency(language, 5, False):6.1f} ms, "
+            f"pool {idle_latency(language, 5, True):6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Recall/speed benchmark of MinHash/LSH candidates against the pairwise SequenceMatcher scan.
+
+Runs fully in memory on generated programs: random functions built from a
+dozen statement shapes, with random names, constants and operators, so
+unrelated submissions still share some structure. A tenth of the corpus are
+edited copies of other submissions. Half of the queries are edited copies of
+corpus submissions, and recall is the share of those where the LSH path
+reports the same best score as scanning the whole corpus; the other half are
+new programs, for the candidates an unrelated submission costs. Each
+threshold builds and queries its own index, with the bands and rows
+plagiarism_checker would pick for it.
+
+    python benchmarks/plagiarism_benchmark.py --submissions 2000 --queries 50
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from code_normalizer import normalize_code  # noqa: E402
+from plagiarism_checker import fingerprint, minhash_signature, lsh_buckets, estimate_similarity, _lsh_shape  # noqa: E402
+
+STATEMENTS = [
+    "{v} = {w} {op} {n}",
+    "if {v} {cmp} {n}:\n    {w} = {v} {op} {w}",
+    "if {v} {cmp} {w}:\n    return {v}\nelse:\n    {v} = {n}",
+    "for {i} in range({n}):\n    {v} {op}= {i}",
+    "for {i} in {w}:\n    if {i} {cmp} {n}:\n        {v}.append({i})",
+    "while {v} {cmp} {n}:\n    {v} = {v} // 2 + {w}",
+    "{v} = [{i} {op} {n} for {i} in {w}]",
+    "{v} = {{{i}: {i} {op} {n} for {i} in {w}}}",
+    "{v} = sorted({w}, key=lambda {i}: {i} {op} {n})",
+    "{v} = {w}.get({i}, {n}) if {w} else {n}",
+    "try:\n    {v} = {w}[{n}]\nexcept (IndexError, KeyError):\n    {v} = None",
+    "print({v}, {w}, sep=\"{op}\")",
+]
+NAMES = ["x", "y", "data", "values", "items", "nums", "acc", "total", "res", "n", "k", "word", "seen", "out", "cur"]
+OPERATORS = ["+", "-", "*", "%", "//"]
+COMPARISONS = ["<", ">", "<=", "==", "!="]
+
+
+def make_submission(rng):
+    """A function of 4 to 14 random statements over random names."""
+    params = rng.sample(NAMES, rng.randrange(1, 4))
+    lines = [f"def {rng.choice(['solve', 'run', 'calc', 'main', 'helper'])}({', '.join(params)}):"]
+    for _ in range(rng.randrange(4, 15)):
+        statement = rng.choice(STATEMENTS).format(
+            v=rng.choice(NAMES), w=rng.choice(NAMES), i=rng.choice(NAMES), n=rng.randrange(100),
+            op=rng.choice(OPERATORS), cmp=rng.choice(COMPARISONS),
+        )
+        lines += ["    " + line for line in statement.splitlines()]
+    lines.append(f"    return {rng.choice(NAMES)}")
+    return "\n".join(lines) + "\n"
+
+
+def copy_with_edits(code, rng):
+    """What a copied submission usually looks like: a renamed identifier, an extra comment, maybe a moved line."""
+    old, new = rng.sample(NAMES, 2)
+    lines = code.replace(old, new).splitlines()
+    lines.insert(rng.randrange(1, len(lines) + 1), "    # my own solution")
+    if rng.random() < 0.5:
+        line = lines.pop(len(lines) - 2)
+        lines.insert(rng.randrange(1, len(lines)), line)
+    return "\n".join(lines) + "\n"
+
+
+def score(tokens, other):
+    return round(SequenceMatcher(None, tokens, other, autojunk=False).ratio() * 100)
+
+
+def exact_best(query, corpus):
+    return max(score(query, tokens) for tokens in corpus)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.5, 0.7])
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    codes = []
+    for _ in range(args.submissions):
+        copy = codes and rng.random() < 0.1
+        codes.append(copy_with_edits(rng.choice(codes), rng) if copy else make_submission(rng))
+    copies = [copy_with_edits(rng.choice(codes), rng) for _ in range(args.queries - args.queries // 2)]
+    fresh = [make_submission(rng) for _ in range(args.queries // 2)]
+    queries = copies + fresh
+
+    started = time.perf_counter()
+    corpus = [normalize_code(code) for code in codes]
+    signatures = [minhash_signature(fingerprint(tokens)) for tokens in corpus]
+    print(f"Normalized and signed {len(corpus)} submissions in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    for query in queries:
+        max(SequenceMatcher(None, query, code).ratio() for code in codes)
+    raw_seconds = time.perf_counter() - started
+    print(f"SequenceMatcher scan on raw code: {raw_seconds / len(queries) * 1000:.1f} ms/query")
+
+    started = time.perf_counter()
+    baseline = [exact_best(normalize_code(query), corpus) for query in queries]
+    baseline_seconds = time.perf_counter() - started
+    print(f"SequenceMatcher scan on normalized tokens: {baseline_seconds / len(queries) * 1000:.1f} ms/query")
+
+    for threshold in args.thresholds:
+        bands, rows = _lsh_shape(threshold)
+        started = time.perf_counter()
+        buckets = defaultdict(list)
+        for index, signature in enumerate(signatures):
+            for key in lsh_buckets(signature, bands, rows):
+                buckets[key].append(index)
+        index_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        exact_hits = 0
+        total_error = 0
+        fresh_candidates = 0
+        for number, (query, expected) in enumerate(zip(queries, baseline)):
+            tokens = normalize_code(query)
+            signature = minhash_signature(fingerprint(tokens))
+            found = {index for key in lsh_buckets(signature, bands, rows) for index in buckets.get(key, ())}
+            ranked = sorted(((estimate_similarity(signature, signatures[i]), i) for i in found), reverse=True)
+            chosen = [i for similarity, i in ranked[:args.candidates] if similarity >= threshold]
+            best = max((score(tokens, corpus[i]) for i in chosen), default=0)
+            if number < len(copies):
+                exact_hits += abs(best - expected) <= 1
+                total_error += expected - best
+            else:
+                fresh_candidates += len(found)
+        seconds = time.perf_counter() - started
+        print(
+            f"LSH threshold {threshold:.2f} ({bands} bands x {rows} rows): indexed in {index_seconds:.2f}s, "
+            f"{seconds / len(queries) * 1000:.1f} ms/query, "
+            f"recall of best score {exact_hits / max(len(copies), 1):.0%}, "
+            f"mean score shortfall {total_error / max(len(copies), 1):.1f} points, "
+            f"{fresh_candidates / max(len(fresh), 1):.0f} candidates per new program, "
+            f"speed-up x{baseline_seconds / max(seconds, 1e-9):.0f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Time to regrade every submission of a quiz after its answer key changes.
+
+Compares the vectorized regrade (one NumPy matrix, one bulk UPDATE) with
+scoring and saving submissions one at a time, on an in-memory SQLite database.
+
+    python benchmarks/quiz_regrade_benchmark.py --submissions 5000 --questions 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from models import db, Quiz, QuizQuestion, QuizSubmission, User  # noqa: E402
+from quiz_grading import pack_answers, regrade_quiz, unpack_answers  # noqa: E402
+
+
+def seed(submissions, questions):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title="Benchmark quiz")
+    db.session.add(quiz)
+    db.session.flush()
+    db.session.add_all(
+        QuizQuestion(quiz_id=quiz.id, question=f"Q{i}", option_1="a", option_2="b", option_3="c", option_4="d",
+                     correct_answer=random.randint(1, 4))
+        for i in range(questions)
+    )
+    db.session.flush()
+    question_ids = [question.id for question in quiz.questions]
+    db.session.execute(db.insert(User), [
+        {"id": i, "username": f"s{i}", "email": f"s{i}@example.com", "role": "student"} for i in range(1, submissions + 1)
+    ])
+    db.session.execute(db.insert(QuizSubmission), [
+        {"quiz_id": quiz.id, "student_id": i, "score": 0,
+         "answers_packed": pack_answers({str(q): random.randint(1, 4) for q in question_ids}, question_ids)}
+        for i in range(1, submissions + 1)
+    ])
+    db.session.commit()
+    return quiz.id
+
+
+def regrade_one_by_one(quiz_id):
+    key = {question.id: question.correct_answer for question in QuizQuestion.query.filter_by(quiz_id=quiz_id)}
+    question_ids = sorted(key)
+    for submission in QuizSubmission.query.filter_by(quiz_id=quiz_id):
+        answers = unpack_answers(submission.answers_packed, question_ids)
+        submission.score = sum(1 for question_id, correct in key.items() if answers.get(str(question_id)) == correct)
+    db.session.commit()
+
+
+def change_key(quiz_id):
+    for question in QuizQuestion.query.filter_by(quiz_id=quiz_id):
+        question.correct_answer = question.correct_answer % 4 + 1
+    db.session.commit()
+
+
+def timed(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=5000)
+    parser.add_argument("--questions", type=int, default=20)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        random.seed(1)
+        quiz_id = seed(args.submissions, args.questions)
+
+        change_key(quiz_id)
+        loop = timed(lambda: regrade_one_by_one(quiz_id))
+        db.session.expunge_all()
+        change_key(quiz_id)
+        vectorized = timed(lambda: (regrade_quiz(quiz_id), db.session.commit()))
+
+    print(f"{args.submissions} submissions x {args.questions} questions")
+    print(f"one by one: {loop * 1000:8.1f} ms")
+    print(f"vectorized: {vectorized * 1000:8.1f} ms (x{loop / vectorized:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Latency of POST /quizzes/<id>/submit with many students submitting at once.
+
+Every submitter sends its submission twice, like a client retrying during a
+rush, so the run also checks that retries are answered instead of failing.
+Compares the write-behind ingest with one commit per submission. Uses a
+SQLite file unless --database-url points somewhere else.
+
+    python benchmarks/quiz_submit_load_test.py --submitters 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_jwt_extended import JWTManager, create_access_token  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+import quiz_ingest  # noqa: E402
+from models import db, Quiz, QuizQuestion, QuizSubmission, User  # noqa: E402
+from quiz_grading import answer_key_cache  # noqa: E402
+from routes.quizes import quiz_bp  # noqa: E402
+
+QUESTIONS = 20
+
+
+def build_app(database_url, write_behind):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=database_url,
+        SQLALCHEMY_ENGINE_OPTIONS={"pool_size": 32, "max_overflow": 0, "pool_timeout": 120,
+                                   **({"connect_args": {"timeout": 120}} if database_url.startswith("sqlite") else {})},
+        JWT_SECRET_KEY="load-test",
+        QUIZ_WRITE_BEHIND=write_behind,
+    )
+    db.init_app(app)
+    JWTManager(app)
+    quiz_ingest.init_app(app)
+    app.register_blueprint(quiz_bp)
+    return app
+
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    teacher = User(username="teacher", email="teacher@example.com", role="educator", school_id=1)
+    quiz = Quiz(class_id=1, school_id=1, quiz_title="Load test")
+    db.session.add_all([teacher, quiz])
+    db.session.flush()
+    db.session.add_all(
+        QuizQuestion(quiz_id=quiz.id, question=f"Q{i}", option_1="a", option_2="b", option_3="c", option_4="d",
+                     correct_answer=i % 4 + 1)
+        for i in range(QUESTIONS)
+    )
+    db.session.commit()
+    question_ids = [question.id for question in quiz.questions]
+    return create_access_token(identity=str(teacher.id)), quiz.id, question_ids
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run(database_url, submitters, write_behind):
+    app = build_app(database_url, write_behind)
+    answer_key_cache.clear()
+    quiz_ingest.recent_submissions.clear()
+    with app.app_context():
+        token, quiz_id, question_ids = seed()
+    headers = {"Authorization": f"Bearer {token}"}
+    start = threading.Barrier(submitters)
+    latencies, statuses = [], []
+
+    def submit(student_id):
+        client = app.test_client()
+        body = {"student_id": student_id, "answers": {str(q): (student_id + q) % 4 + 1 for q in question_ids}}
+        start.wait()
+        for _ in range(2):  # The second request is a client retry
+            started = time.perf_counter()
+            response = client.post(f"/quizzes/{quiz_id}/submit", json=body, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=submitters) as executor:
+        list(executor.map(submit, range(1, submitters + 1)))
+    elapsed = time.perf_counter() - started
+    quiz_ingest.submission_buffer.flush_now()
+
+    with app.app_context():
+        stored = db.session.scalar(select(func.count(QuizSubmission.id)))
+        db.session.remove()
+        db.engine.dispose()
+    errors = sum(1 for status in statuses if status >= 400)
+    mode = "write-behind" if write_behind else "direct"
+    print(f"{mode:12} p50 {percentile(latencies, 0.5) * 1000:7.1f} ms  p95 {percentile(latencies, 0.95) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms  {len(latencies) / elapsed:6.0f} req/s  "
+          f"errors {errors}  stored {stored}/{submitters}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submitters", type=int, default=1000)
+    parser.add_argument("--database-url")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f"sqlite:///{os.path.join(directory, 'load_test.db')}"
+        print(f"{args.submitters} concurrent submitters, {QUESTIONS} questions, each submitting twice")
+        for write_behind in (False, True):
+            run(database_url, args.submitters, write_behind)
+
+
+if __name__ == "__main__":
+    main()
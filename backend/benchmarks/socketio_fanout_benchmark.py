@@ -0,0 +1,118 @@
+"""Cross-worker delivery latency of Socket.IO room broadcasts over the message bus.
+
+Starts several Socket.IO servers, one per simulated worker, on the same bus,
+with clients spread over them and joined to class rooms. Each message is
+emitted by one worker to one room. Latency is measured from the emit to
+the moment another worker hands the event to its client's connection.
+"one at a time" waits for every delivery before the next emit; "burst"
+emits all messages at once.
+
+    python benchmarks/socketio_fanout_benchmark.py --workers 4 --clients 200
+    python benchmarks/socketio_fanout_benchmark.py --message-queue redis://localhost:6379/0
+
+Workers share one process, so with --message-queue pointing at a real broker
+this measures the broker round trip, not separate machines.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import socketio  # noqa: E402
+from socketio import packet  # noqa: E402
+from utils.socket_bus import client_manager  # noqa: E402
+
+
+class Deliveries:
+    def __init__(self):
+        self.latencies = []
+        self.expected = 0
+        self.condition = threading.Condition()
+
+    def record(self, latency):
+        with self.condition:
+            self.latencies.append(latency)
+            self.condition.notify_all()
+
+    def wait(self, count, timeout=30):
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.latencies) >= count, timeout)
+
+
+def make_worker(index, url, channel, deliveries):
+    server = socketio.Server(client_manager=client_manager(url, channel=channel))
+    server.manager_initialized = True
+    server.manager.initialize()
+
+    def send_eio_packet(eio_sid, eio_packet):
+        received = time.perf_counter()
+        _, data = packet.Packet(encoded_packet=eio_packet.data).data
+        if data["worker"] != index:  # Only deliveries that crossed the bus
+            deliveries.record(received - data["sent"])
+
+    server._send_eio_packet = send_eio_packet
+    return server
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def report(mode, latencies, elapsed):
+    print(f"{mode:15} p50 {percentile(latencies, 0.5) * 1000:7.2f} ms  p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  max {max(latencies) * 1000:7.2f} ms  "
+          f"{len(latencies) / elapsed:8.0f} deliveries/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=200, help="Connected clients, spread over the workers")
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--message-queue", default="local://")
+    args = parser.parse_args()
+
+    random.seed(1)
+    channel = f"fanout-benchmark-{uuid.uuid4().hex[:8]}"
+    deliveries = Deliveries()
+    workers = [make_worker(index, args.message_queue, channel, deliveries) for index in range(args.workers)]
+    members = {}  # (worker, room) -> connected clients
+    for client in range(args.clients):
+        worker, room = client % args.workers, f"class_{client % args.rooms}"
+        sid = workers[worker].manager.connect(uuid.uuid4().hex, "/")
+        workers[worker].manager.enter_room(sid, "/", room)
+        members[worker, room] = members.get((worker, room), 0) + 1
+
+    def remote_members(sender, room):
+        return sum(count for (worker, member_room), count in members.items() if worker != sender and member_room == room)
+
+    print(f"{args.workers} workers, {args.clients} clients in {args.rooms} rooms, {args.messages} messages, "
+          f"bus {args.message_queue}")
+    for mode in ("one at a time", "burst"):
+        deliveries.latencies = []
+        expected = 0
+        started = time.perf_counter()
+        for seq in range(args.messages):
+            sender, room = seq % args.workers, f"class_{random.randrange(args.rooms)}"
+            expected += remote_members(sender, room)
+            workers[sender].emit("chat_message", {"seq": seq, "worker": sender, "sent": time.perf_counter()}, to=room)
+            if mode == "one at a time" and not deliveries.wait(expected):
+                sys.exit(f"Timed out waiting for message {seq}")
+        if not deliveries.wait(expected):
+            sys.exit(f"Timed out: {len(deliveries.latencies)} of {expected} deliveries")
+        report(mode, deliveries.latencies, time.perf_counter() - started)
+
+    for worker in workers:
+        if hasattr(worker.manager, "close"):
+            worker.manager.close()
+
+
+if __name__ == "__main__":
+    main()
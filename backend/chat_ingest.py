@@ -0,0 +1,108 @@
+import time
+from sqlalchemy import insert, text
+from models import db, Chat
+from utils.snowflake import SnowflakeGenerator
+from utils.write_behind import WriteBehindBuffer, BufferFull
+
+# Buffered messages need their id before they are written, so they can be
+# broadcast first and still sort by send time in the id-keyset history. They
+# get a snowflake id from this worker's generator, set up by init_app in
+# write-behind mode; messages written right away keep the database's
+# autoincrement id. Each batch moves the id sequence past its snowflakes, so
+# autoincrement ids issued later, say after write-behind is switched off,
+# still sort after them.
+chat_ids = None
+
+# Another worker's buffered message reaches the database up to a flush
+# interval, plus however long the flush takes, after it got its id; by then a
+# later message of this worker may already have been read past. Reads after a
+# cursor re-read this window of ids behind it, and clients skip ids they have.
+FLUSH_GRACE_MS = 1000
+
+
+def insert_chats(rows):
+    """Inserts chat rows, ids included, in one executemany; rolls back on failure."""
+    try:
+        db.session.execute(insert(Chat), rows)
+        if db.engine.dialect.name == "postgresql":  # SQLite continues from the largest id on its own
+            db.session.execute(
+                text("SELECT setval(seq::regclass, GREATEST(:id, nextval(seq::regclass))) "
+                     "FROM pg_get_serial_sequence('chats', 'id') AS seq"),
+                {"id": max(row["id"] for row in rows)},
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+chat_buffer = WriteBehindBuffer(insert_chats, name="chat_buffer")
+
+
+def init_app(app):
+    global chat_ids
+    if app.config.get("CHAT_WRITE_BEHIND"):
+        worker_id = app.config.get("SNOWFLAKE_WORKER_ID")
+        if worker_id is None or worker_id == "":
+            raise RuntimeError("CHAT_WRITE_BEHIND needs SNOWFLAKE_WORKER_ID (0-31), unique per worker process")
+        chat_ids = SnowflakeGenerator(int(worker_id))
+    chat_buffer.init_app(
+        app,
+        max_batch=app.config.get("CHAT_FLUSH_BATCH"),
+        interval=app.config.get("CHAT_FLUSH_INTERVAL"),
+    )
+
+
+def save_chat(row, write_behind=False):
+    """Writes a message, or queues it for the next batch in write-behind mode; returns the row with its id.
+
+    When the buffer is full the message is written right away instead,
+    keeping the snowflake id it was given.
+    """
+    if write_behind and chat_ids is not None:
+        row["id"] = chat_ids.next_id()
+        try:
+            chat_buffer.add(row)
+            return row
+        except BufferFull:
+            insert_chats([row])
+            return row
+    chat = Chat(**row)
+    try:
+        db.session.add(chat)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    row["id"] = chat.id
+    return row
+
+
+def pending_chats(class_id, school_id, before=None, after=None):
+    """Buffered messages of a class not yet in the database, within the id bounds."""
+    return [
+        row for row in chat_buffer.pending()
+        if row["class_id"] == class_id and row["school_id"] == school_id
+        and (before is None or row["id"] < before) and (after is None or row["id"] > after)
+    ]
+
+
+def replay_floor(last_id):
+    """The id after which messages may still be arriving from other workers' buffers, for a cursor at `last_id`."""
+    if chat_ids is None:
+        return last_id
+    window_ms = int(chat_buffer.interval * 1000) + FLUSH_GRACE_MS
+    floor = SnowflakeGenerator.first_id_at(SnowflakeGenerator.timestamp_ms(last_id) - window_ms)
+    return floor if 0 <= floor < last_id else last_id  # Autoincrement ids from before write-behind are not replayed
+
+
+def ensure_written(chat_id, timeout=2):
+    """Makes sure a message is in the database, flushing the buffer if it is still queued.
+
+    Called before a message is edited or deleted. Waits up to `timeout`
+    seconds for a batch that the background thread is already writing.
+    """
+    deadline = time.monotonic() + timeout
+    while any(row["id"] == chat_id for row in chat_buffer.pending()) and time.monotonic() < deadline:
+        chat_buffer.flush_now()
+        time.sleep(0.005)
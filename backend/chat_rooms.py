@@ -0,0 +1,66 @@
+from flask import request
+from flask_jwt_extended import decode_token
+from sqlalchemy import exists, or_, select, union
+from models import db, Class, StudentsClasses, User
+from utils.event_feed import EventFeed
+
+# Set by init_app; None when the app runs without Socket.IO (e.g. in tests)
+_socketio = None
+
+# The same events per class, for server-sent event streams on this worker
+feed = EventFeed()
+
+
+def init_app(app, socketio):
+    global _socketio
+    _socketio = socketio
+    app.extensions['chat_rooms'] = socketio
+
+
+def room(class_id):
+    return f"class_{class_id}"
+
+
+def authenticate(auth):
+    """Returns the User of a socket connection's JWT, or None.
+
+    The token comes from the Socket.IO auth payload ({"token": ...}) or, for
+    clients that cannot send one, the `token` query parameter.
+    """
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    if not token:
+        return None
+    try:
+        user_id = decode_token(token)['sub']
+    except Exception:
+        return None
+    return db.session.get(User, int(user_id))
+
+
+def class_ids(user):
+    """Ids of the classes whose chat the user takes part in: the ones they teach or are enrolled in."""
+    return set(db.session.scalars(union(
+        select(Class.id).where(Class.educator_id == user.id),
+        select(StudentsClasses.class_id).where(StudentsClasses.student_id == user.id),
+    )))
+
+
+def is_member(user, class_id):
+    """Whether the user takes part in a class's chat: it is in their school and they teach or are enrolled in it."""
+    return db.session.scalar(select(exists().where(
+        Class.id == class_id,
+        Class.school_id == user.school_id,
+        or_(Class.educator_id == user.id,
+            exists().where(StudentsClasses.class_id == Class.id, StudentsClasses.student_id == user.id)),
+    )))
+
+
+def publish(event, class_id, payload):
+    """Pushes an event to the sockets in the class's room only, on every worker sharing the message bus.
+
+    Event streams of the class on this worker get it too.
+    """
+    feed.publish(class_id, event, payload)
+    if _socketio is not None:
+        _socketio.emit(event, payload, to=room(class_id))
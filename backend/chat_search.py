@@ -0,0 +1,109 @@
+import base64
+import re
+import click
+from sqlalchemy import DDL, column, event, func, literal_column, select, table, tuple_
+from models import db, Chat, User
+
+# PostgreSQL: a generated tsvector column with a GIN index. SQLite (local
+# runs and tests): an external-content FTS5 table kept in sync by triggers.
+# Either way the database maintains the index on every insert, edit and
+# delete, including the batched inserts of the chat write-behind buffer.
+TEXT_SEARCH_CONFIG = "english"
+
+POSTGRES_DDL = (
+    f"ALTER TABLE chats ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(message, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_chats_search_vector ON chats USING GIN (search_vector)",
+)
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(message, content='chats', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS chats_fts_insert AFTER INSERT ON chats BEGIN "
+    "INSERT INTO chats_fts(rowid, message) VALUES (new.id, new.message); END",
+    "CREATE TRIGGER IF NOT EXISTS chats_fts_delete AFTER DELETE ON chats BEGIN "
+    "INSERT INTO chats_fts(chats_fts, rowid, message) VALUES ('delete', old.id, old.message); END",
+    "CREATE TRIGGER IF NOT EXISTS chats_fts_update AFTER UPDATE OF message ON chats BEGIN "
+    "INSERT INTO chats_fts(chats_fts, rowid, message) VALUES ('delete', old.id, old.message); "
+    "INSERT INTO chats_fts(rowid, message) VALUES (new.id, new.message); END",
+)
+
+for statement in POSTGRES_DDL:
+    event.listen(Chat.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_DDL:
+    event.listen(Chat.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Chat.__table__, "after_drop", DDL("DROP TABLE IF EXISTS chats_fts").execute_if(dialect="sqlite"))
+
+chats_fts = table("chats_fts", column("rowid"), column("message"))
+
+
+def init_app(app):
+    app.cli.add_command(search_index_command)
+
+
+def install_search_index():
+    """Adds the search index to an existing chats table and indexes the messages already in it."""
+    dialect = db.engine.dialect.name
+    statements = POSTGRES_DDL if dialect == "postgresql" else SQLITE_DDL
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if dialect == "sqlite":
+            connection.exec_driver_sql("INSERT INTO chats_fts(chats_fts) VALUES ('rebuild')")
+
+
+@click.command("chat-search-index")
+def search_index_command():
+    """Create the chat full-text search index on an existing database."""
+    install_search_index()
+    click.echo("Chat search index is up to date")
+
+
+def encode_cursor(score, chat_id):
+    return base64.urlsafe_b64encode(f"{score!r}|{chat_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Returns (score, id) of the last result of the previous page; raises ValueError if malformed."""
+    score, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return float(score), int(chat_id)
+
+
+def _fts5_query(text):
+    # Every word must appear; quoting keeps FTS5 operators in user input literal
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", text))
+
+
+def search_chats(school_id, class_id, text, limit, after=None):
+    """Messages of a class matching `text`, best match first, each row with its `score`.
+
+    Ties on score are broken by newest id, and `after` is the (score, id) of
+    the last result already seen, so pages are keyset-paginated over the
+    ranking. Fetches `limit` + 1 rows so the caller can tell if more follow.
+    """
+    columns = (Chat.id, Chat.class_id, Chat.sender_id, Chat.message, Chat.timestamp,
+               User.username.label("sender_name"))
+    if db.engine.dialect.name == "postgresql":
+        query = func.websearch_to_tsquery(literal_column(f"'{TEXT_SEARCH_CONFIG}'::regconfig"), text)
+        vector = literal_column("chats.search_vector")
+        score = func.ts_rank_cd(vector, query)
+        statement = select(*columns, score.label("score")).select_from(Chat).where(vector.op("@@")(query))
+    else:
+        match = _fts5_query(text)
+        if not match:
+            return []
+        index = literal_column("chats_fts")
+        score = -func.bm25(index)  # bm25 is lower for better matches
+        statement = (
+            select(*columns, score.label("score"))
+            .select_from(Chat)
+            .join(chats_fts, chats_fts.c.rowid == Chat.id)
+            .where(index.op("MATCH")(match))
+        )
+    statement = (
+        statement.outerjoin(User, User.id == Chat.sender_id)
+        .where(Chat.school_id == school_id, Chat.class_id == class_id)
+        .order_by(score.desc(), Chat.id.desc())
+        .limit(limit + 1)
+    )
+    if after is not None:
+        statement = statement.where(tuple_(score, Chat.id) < tuple_(*after))
+    return db.session.execute(statement).all()
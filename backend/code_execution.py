@@ -1,29 +1,753 @@
+import atexit
+import hashlib
+import json
+import math
+import os
+import pwd
+import queue
+import resource
+import secrets
+import selectors
+import shutil
+import signal
 import subprocess
 import tempfile
+import threading
+import time
+from utils.cache import TTLCache
 
-def execute_code(language, code):
-    """Executes the given code in a secure environment and returns the output."""
-    
-    if language not in ["python", "javascript"]:
+SUPPORTED_LANGUAGES = ["python", "javascript"]
+EXECUTION_TIMEOUT = 5  # Seconds a submission may run
+
+# Batch test-case runs: each case gets its own timeout, and only failing cases
+# echo back (truncated) output so the response stays small.
+CASE_TIMEOUT = 2
+MAX_TEST_CASES = 100
+MAX_ECHOED_OUTPUT = 2000
+
+# Warm interpreter pool: idle workers kept per language (0 disables the pool) and
+# runs a Python worker serves before it is replaced. Node workers always serve a
+# single run, since a Node process cannot reset its global state between runs.
+POOL_SIZE = int(os.getenv("CODE_EXECUTION_POOL_SIZE", 2))
+PYTHON_WORKER_MAX_RUNS = int(os.getenv("CODE_EXECUTION_WORKER_MAX_RUNS", 100))
+WORKER_GRACE_SECONDS = 2  # Extra time a worker gets to report back before it is treated as crashed
+# When the app runs as root, Python runs switch to this unprivileged user, so
+# student code cannot reach the fork server's pipes, files or process. Set it
+# to an empty string to keep running as root.
+SANDBOX_USER = os.getenv("CODE_EXECUTION_USER", "nobody")
+
+# Per-run resource limits. Each output stream is streamed into a buffer of at
+# most MAX_OUTPUT_BYTES; a run writing more is stopped and its output marked as
+# truncated. Scratch directories (the run's working directory) live on a tmpfs
+# when one is available and are removed after every run.
+MAX_OUTPUT_BYTES = int(os.getenv("CODE_EXECUTION_MAX_OUTPUT", 64 * 1024))
+MEMORY_LIMIT_BYTES = int(os.getenv("CODE_EXECUTION_MEMORY_LIMIT", 256 * 1024 * 1024))
+FILE_SIZE_LIMIT_BYTES = 1024 * 1024
+TRUNCATION_MARKER = "\n[output truncated]\n"
+SCRATCH_ROOT = os.getenv("CODE_EXECUTION_SCRATCH_DIR") or (
+    "/dev/shm" if os.access("/dev/shm", os.W_OK) else tempfile.gettempdir()
+)
+
+# Results of completed runs are cached by a hash of everything that determines
+# them (language, code, stdin or test cases, timeout and limits), so identical
+# starter code or a re-run grading job is served without executing again.
+# Timeouts and crashes are never cached. A size of 0 disables the cache.
+result_cache = TTLCache(
+    max_entries=int(os.getenv("CODE_EXECUTION_CACHE_SIZE", 1024)),
+    ttl=int(os.getenv("CODE_EXECUTION_CACHE_TTL", 600)),
+    max_bytes=64 * 1024 * 1024,
+    sizeof=lambda result: len(json.dumps(result)),
+)
+
+# The Python worker is a small fork server: it starts once, then forks a fresh
+# child per run, so every submission starts from the same clean interpreter
+# state without paying interpreter start-up. A job carries a list of stdin
+# cases; the code is compiled once per job and each case runs in its own child.
+_PYTHON_WORKER = r'''
+import ctypes, json, os, resource, selectors, shutil, signal, sys, tempfile, time, traceback
+# Loaded once here, so children start with them and need no access to the interpreter's files
+import bisect, collections, datetime, decimal, fractions, functools, heapq, itertools, math, random, re, statistics, string
+
+TRUNCATED = "\n[output truncated]\n"
+
+def forget_request(job):
+    """Drops this process's references to the request, so student code cannot read its id off the stack."""
+    job.clear()
+    for name in ("data", "line", "request", "request_id", "job", "response"):  # The last response holds an id too
+        globals().pop(name, None)
+
+def child(code, stdin_fd, stdout_fd, stderr_fd, scratch, limits, sandbox_ids):
+    os.setsid()
+    os.chdir(scratch)
+    for limit, value in limits:
+        resource.setrlimit(limit, (value, value))
+    os.dup2(stdin_fd, 0)
+    os.dup2(stdout_fd, 1)
+    os.dup2(stderr_fd, 2)
+    os.closerange(3, os.sysconf("SC_OPEN_MAX"))  # The protocol pipes above all: student code sees stdio only
+    if sandbox_ids:  # Another uid cannot open this server's fds through /proc or signal it
+        os.setgroups([])
+        os.setgid(sandbox_ids[1])
+        os.setuid(sandbox_ids[0])
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    sys.argv = ["main.py"]
+    exit_code = 0
+    try:
+        exec(code, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if isinstance(e.code, int) or e.code is None:
+            exit_code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            exit_code = 1
+    except BaseException as e:
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)  # Hide this worker's own frame
+        exit_code = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(exit_code)
+
+def run_case(code, stdin, job):
+    started = time.monotonic()
+    scratch = tempfile.mkdtemp(dir=job["scratch"])
+    if job["sandbox_ids"]:
+        os.chown(scratch, *job["sandbox_ids"])
+    limits = [(resource.RLIMIT_CPU, int(job["timeout"]) + 1),
+              (resource.RLIMIT_AS, job["memory"]),
+              (resource.RLIMIT_FSIZE, job["file_size"])]
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        for fd in (stdin_w, stdout_r, stderr_r):
+            os.close(fd)
+        sandbox_ids = job["sandbox_ids"]
+        forget_request(job)
+        child(code, stdin_r, stdout_w, stderr_w, scratch, limits, sandbox_ids)
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+
+    pending = stdin.encode()
+    chunks = {stdout_r: [], stderr_r: []}
+    sizes = {stdout_r: 0, stderr_r: 0}
+    overflowed = None
+    selector = selectors.DefaultSelector()
+    selector.register(stdout_r, selectors.EVENT_READ)
+    selector.register(stderr_r, selectors.EVENT_READ)
+    if pending:
+        os.set_blocking(stdin_w, False)
+        selector.register(stdin_w, selectors.EVENT_WRITE)
+    else:
+        os.close(stdin_w)
+
+    deadline = started + job["timeout"]
+    timed_out = False
+    while len(selector.get_map()) and overflowed is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in selector.select(remaining):
+            fd = key.fd
+            if fd == stdin_w:
+                try:
+                    pending = pending[os.write(fd, pending[:65536]):]
+                except BrokenPipeError:
+                    pending = b""
+                if not pending:
+                    selector.unregister(fd)
+                    os.close(fd)
+                continue
+            data = os.read(fd, 65536)
+            if data:
+                room = job["max_output"] - sizes[fd]
+                chunks[fd].append(data[:room])
+                sizes[fd] += len(data)
+                if len(data) > room:
+                    overflowed = fd  # Stop the run instead of buffering unbounded output
+                    break
+            else:
+                selector.unregister(fd)
+                os.close(fd)
+
+    for key in list(selector.get_map().values()):
+        selector.unregister(key.fd)
+        os.close(key.fd)
+    if timed_out or overflowed is not None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, status = os.waitpid(pid, 0)
+    shutil.rmtree(scratch, ignore_errors=True)
+    output = {fd: b"".join(parts).decode(errors="replace") for fd, parts in chunks.items()}
+    if overflowed is not None:
+        output[overflowed] += TRUNCATED
+    return {
+        "stdout": output[stdout_r],
+        "stderr": output[stderr_r],
+        "exit_code": None if timed_out or overflowed is not None else os.waitstatus_to_exitcode(status),
+        "timed_out": timed_out,
+        "truncated": overflowed is not None,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+def run(job):
+    try:
+        code = compile(job["code"], "main.py", "exec")
+    except (SyntaxError, ValueError) as e:
+        error = "".join(traceback.format_exception_only(type(e), e))
+        failed = {"stdout": "", "stderr": error, "exit_code": 1, "timed_out": False, "truncated": False, "elapsed_ms": 0}
+        return {"results": [failed for _ in job["cases"]]}
+    return {"results": [run_case(code, stdin, job) for stdin in job["cases"]]}
+
+protocol_in = os.fdopen(os.dup(0), "rb", buffering=0)
+protocol_out = os.fdopen(os.dup(1), "wb", buffering=0)
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)  # Children close every fd past stdio, the protocol pipes included
+os.dup2(devnull, 1)
+signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+ctypes.CDLL(None).prctl(4, 0, 0, 0, 0)  # PR_SET_DUMPABLE 0: /proc/<this pid>/fd is closed to other processes
+
+line = b""
+while True:
+    data = protocol_in.read(65536)
+    if not data:
+        break
+    line += data
+    while b"\n" in line:
+        request, line = line.split(b"\n", 1)
+        job = json.loads(request)
+        request_id = job.pop("id")
+        response = run(job)
+        response["id"] = request_id
+        protocol_out.write(json.dumps(response).encode() + b"\n")
+'''
+
+# The Node worker waits, fully started, until its job arrives on a separate pipe,
+# then runs it as a regular CommonJS main module with the real stdio. Test cases
+# each get their own worker process and are judged from its output by the
+# parent, so nothing the student's code writes can pass for a result.
+_NODE_WORKER = r'''
+const fs = require("fs");
+const path = require("path");
+const Module = require("module");
+
+const jobFd = Number(process.argv[1]);
+const job = JSON.parse(fs.readFileSync(jobFd, "utf8"));
+fs.closeSync(jobFd);
+const filename = path.resolve("main.js");
+
+const main = new Module(filename, null);
+main.filename = filename;
+main.paths = Module._nodeModulePaths(path.dirname(filename));
+process.argv = [process.argv[0], filename];
+process.mainModule = main;
+main._compile(job.code, filename);
+'''
+
+
+class WorkerCrashed(Exception):
+    """A pooled worker died or stopped answering; it is replaced, not reused."""
+
+
+def _sandbox_ids():
+    """(uid, gid) that fork-server children switch to, or None when the app does not run as root."""
+    if os.geteuid() != 0 or not SANDBOX_USER:
+        return None
+    user = pwd.getpwnam(SANDBOX_USER)
+    return user.pw_uid, user.pw_gid
+
+
+def _scratch_dir(prefix):
+    return tempfile.mkdtemp(dir=SCRATCH_ROOT, prefix=prefix)
+
+
+def _apply_limits(pid, cpu_seconds, memory=None):
+    """Caps CPU time, written file size and, optionally, address space of a started process."""
+    limits = [(resource.RLIMIT_CPU, math.ceil(cpu_seconds)), (resource.RLIMIT_FSIZE, FILE_SIZE_LIMIT_BYTES)]
+    if memory:
+        limits.append((resource.RLIMIT_AS, memory))
+    for limit, value in limits:
+        resource.prlimit(pid, limit, (value, value))
+
+
+def _kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _read_until_exit(process, stdin, timeout, max_output=MAX_OUTPUT_BYTES):
+    """Feeds stdin and streams stdout/stderr of a one-shot process, or returns None on timeout.
+
+    At most `max_output` bytes of each stream are kept; a process writing more
+    is killed and its output ends with a truncation marker.
+    """
+    streams = {process.stdout.fileno(): "stdout", process.stderr.fileno(): "stderr"}
+    chunks = {name: [] for name in streams.values()}
+    sizes = dict.fromkeys(streams.values(), 0)
+    overflowed = None
+    pending = stdin.encode()
+
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        selector.register(fd, selectors.EVENT_READ)
+    stdin_fd = process.stdin.fileno()
+    if pending:
+        os.set_blocking(stdin_fd, False)
+        selector.register(stdin_fd, selectors.EVENT_WRITE)
+    else:
+        process.stdin.close()
+
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    try:
+        while selector.get_map() and overflowed is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            for key, _ in selector.select(remaining):
+                if key.fd == stdin_fd:
+                    try:
+                        pending = pending[os.write(stdin_fd, pending[:65536]):]
+                    except BrokenPipeError:
+                        pending = b""
+                    if not pending:
+                        selector.unregister(stdin_fd)
+                        process.stdin.close()
+                    continue
+                data = os.read(key.fd, 65536)
+                name = streams[key.fd]
+                if not data:
+                    selector.unregister(key.fd)
+                    continue
+                room = max_output - sizes[name]
+                chunks[name].append(data[:room])
+                sizes[name] += len(data)
+                if len(data) > room:
+                    overflowed = name
+                    break
+    finally:
+        selector.close()
+
+    if timed_out or overflowed:
+        _kill_group(process)
+    process.wait()
+    for stream in (process.stdin, process.stdout, process.stderr):
+        stream.close()
+    if timed_out:
+        return None
+
+    output = {name: b"".join(parts).decode(errors="replace") for name, parts in chunks.items()}
+    if overflowed:
+        output[overflowed] += TRUNCATION_MARKER
+    return {
+        "stdout": output["stdout"],
+        "stderr": output["stderr"],
+        "exit_code": None if overflowed else process.returncode,
+        "truncated": overflowed is not None,
+    }
+
+
+class _PythonWorker:
+    """A running fork-server interpreter that serves runs over a JSON-lines pipe."""
+
+    def __init__(self):
+        self.runs = 0
+        self._scratch = _scratch_dir("python-")
+        self._sandbox_ids = _sandbox_ids()
+        if self._sandbox_ids:
+            os.chmod(self._scratch, 0o711)  # Children reach only their own case directory inside
+        self.process = subprocess.Popen(
+            ["python3", "-I", "-c", _PYTHON_WORKER],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            bufsize=0, cwd=self._scratch
+        )
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self.process.stdout, selectors.EVENT_READ)
+
+    @property
+    def reusable(self):
+        return self.process.poll() is None and self.runs < PYTHON_WORKER_MAX_RUNS
+
+    def run_cases(self, code, stdins, timeout):
+        """Runs code once per stdin; returns one stdout/stderr/exit_code/timed_out/elapsed_ms dict each."""
+        self.runs += 1
+        request_id = secrets.token_hex(8)
+        request = {
+            "id": request_id, "code": code, "cases": stdins, "timeout": timeout, "scratch": self._scratch,
+            "max_output": MAX_OUTPUT_BYTES, "memory": MEMORY_LIMIT_BYTES, "file_size": FILE_SIZE_LIMIT_BYTES,
+            "sandbox_ids": self._sandbox_ids,
+        }
+        try:
+            self.process.stdin.write(json.dumps(request).encode() + b"\n")
+        except OSError as e:
+            raise WorkerCrashed(str(e))
+
+        response = b""
+        deadline = time.monotonic() + timeout * len(stdins) + WORKER_GRACE_SECONDS
+        while not response.endswith(b"\n"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self._selector.select(remaining):
+                raise WorkerCrashed("Worker did not answer in time")
+            data = os.read(self.process.stdout.fileno(), 65536)
+            if not data:
+                raise WorkerCrashed("Worker exited")
+            response += data
+
+        # Exactly one line, answering this request; anything else means the protocol is out of step
+        try:
+            if response.count(b"\n") != 1:
+                raise ValueError("Unexpected framing")
+            response = json.loads(response)
+            if response.get("id") != request_id:
+                raise ValueError("Response to another request")
+            return response["results"]
+        except (ValueError, KeyError, AttributeError) as e:
+            raise WorkerCrashed(f"Worker sent an invalid response: {e}")
+
+    def run(self, code, stdin, timeout):
+        result = self.run_cases(code, [stdin], timeout)[0]
+        return None if result["timed_out"] else result
+
+    def close(self):
+        self._selector.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            stream.close()
+        shutil.rmtree(self._scratch, ignore_errors=True)
+
+
+class _NodeWorker:
+    """A pre-started Node process blocked on its job pipe; it serves exactly one job."""
+
+    def __init__(self):
+        self.runs = 0
+        self._scratch = _scratch_dir("node-")
+        job_r, self._job_w = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                ["node", f"--max-old-space-size={MEMORY_LIMIT_BYTES // (1024 * 1024)}", "-e", _NODE_WORKER, str(job_r)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                pass_fds=(job_r,), cwd=self._scratch, start_new_session=True
+            )
+        finally:
+            os.close(job_r)
+
+    @property
+    def reusable(self):
+        return False
+
+    def _send(self, job, cpu_seconds):
+        self.runs += 1
+        try:
+            # V8 reserves far more address space than it uses, so Node's heap is
+            # capped with --max-old-space-size rather than RLIMIT_AS
+            _apply_limits(self.process.pid, cpu_seconds + WORKER_GRACE_SECONDS)
+            os.write(self._job_w, json.dumps(job).encode())
+        except OSError as e:
+            raise WorkerCrashed(str(e))
+        finally:
+            os.close(self._job_w)
+            self._job_w = None
+
+    def run(self, code, stdin, timeout):
+        self._send({"code": code}, timeout)
+        return _read_until_exit(self.process, stdin, timeout)
+
+    def run_case(self, code, stdin, timeout):
+        """Runs one test case in this process; returns the same result dict as a Python worker's case."""
+        started = time.monotonic()
+        result = self.run(code, stdin, timeout)
+        elapsed_ms = round((time.monotonic() - started) * 1000, 1)
+        if result is None:
+            return {"stdout": "", "stderr": "", "exit_code": None, "timed_out": True, "truncated": False,
+                    "elapsed_ms": elapsed_ms}
+        return dict(result, timed_out=False, elapsed_ms=elapsed_ms)
+
+    def run_cases(self, code, stdins, timeout):
+        """Runs the first case here and every other case in a fresh worker of its own."""
+        results = [self.run_case(code, stdins[0], timeout)]
+        for stdin in stdins[1:]:
+            worker = _NodeWorker()
+            try:
+                results.append(worker.run_case(code, stdin, timeout))
+            finally:
+                worker.close()
+        return results
+
+    def close(self):
+        if self._job_w is not None:
+            os.close(self._job_w)
+            self._job_w = None
+        if self.process.poll() is None:
+            _kill_group(self.process)
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout, self.process.stderr):
+            stream.close()
+        shutil.rmtree(self._scratch, ignore_errors=True)
+
+
+class InterpreterPool:
+    """Keeps pre-started worker interpreters of one language warm and recycles them."""
+
+    _worker_classes = {"python": _PythonWorker, "javascript": _NodeWorker}
+
+    def __init__(self, language, size=POOL_SIZE):
+        self.language = language
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._starting = 0
+        self._closed = False
+
+    def _new_worker(self):
+        return self._worker_classes[self.language]()
+
+    def _replenish(self):
+        """Tops the idle queue back up to `size` workers in the background."""
+        with self._lock:
+            missing = self.size - self._idle.qsize() - self._starting
+            if self._closed or missing <= 0:
+                return
+            self._starting += missing
+
+        def start():
+            for _ in range(missing):
+                try:
+                    worker = self._new_worker()
+                except OSError:
+                    worker = None
+                with self._lock:
+                    self._starting -= 1
+                    closed = self._closed
+                if worker and not closed:
+                    self._idle.put(worker)
+                elif worker:
+                    worker.close()
+
+        threading.Thread(target=start, daemon=True).start()
+
+    def _acquire(self):
+        try:
+            while True:
+                worker = self._idle.get_nowait()
+                if worker.process.poll() is None:
+                    return worker
+                worker.close()  # Died while idle
+        except queue.Empty:
+            return self._new_worker()  # Pool drained by a burst: start one on demand
+
+    def _use(self, call):
+        worker = self._acquire()
+        try:
+            return call(worker)
+        except WorkerCrashed:
+            worker.close()
+            worker = None
+            self._replenish()
+            raise
+        finally:
+            if worker is not None:
+                if worker.reusable and not self._closed and self._idle.qsize() < self.size:
+                    self._idle.put(worker)
+                else:
+                    worker.close()
+                    self._replenish()
+
+    def run(self, code, stdin="", timeout=EXECUTION_TIMEOUT):
+        """Runs code on a warm worker; returns stdout/stderr/exit_code, or None on timeout."""
+        return self._use(lambda worker: worker.run(code, stdin, timeout))
+
+    def run_cases(self, code, stdins, timeout=CASE_TIMEOUT):
+        """Runs code against every stdin; returns one result per case.
+
+        A Python worker takes the whole batch. Node workers serve one run
+        each, so every case takes its own warm worker.
+        """
+        if self.language == "javascript":
+            return [self._use(lambda worker: worker.run_case(code, stdin, timeout)) for stdin in stdins]
+        return self._use(lambda worker: worker.run_cases(code, stdins, timeout))
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(language):
+    """Returns the shared pool of a language, starting its workers on first use."""
+    with _pools_lock:
+        if language not in _pools:
+            _pools[language] = InterpreterPool(language)
+            _pools[language]._replenish()
+        return _pools[language]
+
+
+@atexit.register
+def _close_pools():
+    for pool in list(_pools.values()):
+        pool.close()
+
+
+def _spawn_and_run(language, code, stdin, timeout):
+    """Runs code in a freshly started interpreter inside a scratch directory; returns None on timeout."""
+    with tempfile.TemporaryDirectory(dir=SCRATCH_ROOT, prefix="run-") as scratch:
+        filename = "main.py" if language == "python" else "main.js"
+        with open(os.path.join(scratch, filename), "w") as source:
+            source.write(code)
+
+        if language == "python":
+            command, memory = ["python3", filename], MEMORY_LIMIT_BYTES
+        else:
+            command, memory = ["node", f"--max-old-space-size={MEMORY_LIMIT_BYTES // (1024 * 1024)}", filename], None
+        process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=scratch, start_new_session=True
+        )
+        try:
+            _apply_limits(process.pid, timeout + 1, memory)
+        except OSError:
+            pass  # Already exited
+        return _read_until_exit(process, stdin, timeout)
+
+
+def _output_lines(text):
+    return [line.rstrip() for line in (text or "").rstrip().splitlines()]
+
+
+def _case_passed(result, expected_output):
+    """Judges compare line by line, ignoring trailing whitespace and trailing blank lines."""
+    return (not result["timed_out"] and result["exit_code"] == 0
+            and _output_lines(result["stdout"]) == _output_lines(expected_output))
+
+
+def _cache_key(*parts):
+    limits = (MAX_OUTPUT_BYTES, MEMORY_LIMIT_BYTES, FILE_SIZE_LIMIT_BYTES)
+    return hashlib.sha256(json.dumps([*parts, limits]).encode()).hexdigest()
+
+
+def _cached(key, cache, run, cacheable):
+    """Serves a run from the result cache, storing it afterwards if it is deterministic."""
+    if not cache:
+        return run()
+    result = result_cache.get(key)
+    if result is None:
+        result = run()
+        if cacheable(result):
+            result_cache.put(key, result)
+    return result
+
+
+def run_test_cases(language, code, cases, timeout=CASE_TIMEOUT, use_pool=None, cache=True):
+    """Grades code against a list of {"stdin", "expected_output"} test cases.
+
+    Python code is compiled once in a fork-server worker and forked per input;
+    JavaScript runs each input in its own Node process. Every case has its
+    own timeout, and its output is judged here, outside the sandbox. Returns a compact `passed` vector plus
+    per-case timings; output and errors are only echoed for failing cases.
+    Pass cache=False for programs whose output is not deterministic.
+    """
+
+    if language not in SUPPORTED_LANGUAGES:
         return {"error": f"Unsupported language: {language}"}
+    if len(cases) > MAX_TEST_CASES:
+        return {"error": f"At most {MAX_TEST_CASES} test cases can be run at once"}
+    if not cases:
+        return {"passed": [], "score": 0, "total": 0, "cases": []}
+
+    key = _cache_key("test", language, code, cases, timeout)
+    return _cached(key, cache, lambda: _run_test_cases(language, code, cases, timeout, use_pool),
+                   lambda result: "error" not in result and not any(case["timed_out"] for case in result["cases"]))
+
+
+def _run_test_cases(language, code, cases, timeout, use_pool):
+    if use_pool is None:
+        use_pool = POOL_SIZE > 0
+    stdins = [case.get("stdin") or "" for case in cases]
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".py" if language == "python" else ".js") as temp_file:
-            temp_file.write(code.encode())
-            temp_file.flush()
-
-            if language == "python":
-                result = subprocess.run(["python3", temp_file.name], capture_output=True, text=True, timeout=5)
-            else:  # JavaScript
-                result = subprocess.run(["node", temp_file.name], capture_output=True, text=True, timeout=5)
-
-            return {
-                "output": result.stdout,
-                "error": result.stderr if result.stderr else None,
-                "exit_code": result.returncode
-            }
-    except subprocess.TimeoutExpired:
-        return {"error": "Code execution timed out"}
+        if use_pool:
+            results = get_pool(language).run_cases(code, stdins, timeout)
+        else:
+            worker = InterpreterPool._worker_classes[language]()
+            try:
+                results = worker.run_cases(code, stdins, timeout)
+            finally:
+                worker.close()
+    except WorkerCrashed:
+        return {"error": "Code execution crashed"}
     except Exception as e:
         return {"error": str(e)}
 
+    passed = [_case_passed(result, case.get("expected_output")) for result, case in zip(results, cases)]
+    details = []
+    for ok, result in zip(passed, results):
+        detail = {"elapsed_ms": result["elapsed_ms"], "timed_out": result["timed_out"], "exit_code": result["exit_code"]}
+        if result.get("truncated"):
+            detail["truncated"] = True
+        if not ok:
+            detail["output"] = result["stdout"][:MAX_ECHOED_OUTPUT]
+            detail["error"] = result["stderr"][:MAX_ECHOED_OUTPUT] or None
+        details.append(detail)
+    return {"passed": passed, "score": sum(passed), "total": len(passed), "cases": details}
+
+
+def execute_code(language, code, stdin="", timeout=EXECUTION_TIMEOUT, use_pool=None, cache=True):
+    """Executes the given code in a secure environment and returns the output.
+
+    Runs go to a warm interpreter pool when one is configured (POOL_SIZE > 0),
+    and to a freshly spawned interpreter otherwise. Completed runs are served
+    from the result cache unless cache=False (for non-deterministic programs).
+    """
+
+    if language not in SUPPORTED_LANGUAGES:
+        return {"error": f"Unsupported language: {language}"}
+
+    key = _cache_key("run", language, code, stdin or "", timeout)
+    return _cached(key, cache, lambda: _execute_code(language, code, stdin, timeout, use_pool),
+                   lambda result: "exit_code" in result)
+
+
+def _execute_code(language, code, stdin, timeout, use_pool):
+    if use_pool is None:
+        use_pool = POOL_SIZE > 0
+
+    try:
+        if use_pool:
+            result = get_pool(language).run(code, stdin or "", timeout)
+        else:
+            result = _spawn_and_run(language, code, stdin or "", timeout)
+
+        if result is None:
+            return {"error": "Code execution timed out"}
+        response = {
+            "output": result["stdout"],
+            "error": result["stderr"] if result["stderr"] else None,
+            "exit_code": result["exit_code"]
+        }
+        if result.get("truncated"):
+            response["truncated"] = True
+        return response
+    except WorkerCrashed:
+        return {"error": "Code execution crashed"}
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,103 @@
+import builtins
+import io
+import keyword
+import re
+import struct
+import tokenize
+import zlib
+from functools import lru_cache
+
+# Identifiers, literals and layout are collapsed so renaming variables or
+# rewording comments does not change a submission's token stream.
+IDENTIFIER = "ID"
+NUMBER = "NUM"
+STRING = "STR"
+
+PYTHON_NAMES = frozenset(keyword.kwlist) | frozenset(dir(builtins))
+
+JAVASCRIPT_NAMES = frozenset("""
+    await break case catch class const continue debugger default delete do else export extends
+    false finally for function if import in instanceof let new null of return static super switch
+    this throw true try typeof undefined var void while with yield async get set
+    console log Math JSON Object Array String Number Boolean Promise Map Set parseInt parseFloat
+    require module exports process length push pop shift slice splice map filter reduce forEach
+""".split())
+
+_PYTHON_SKIPPED = {tokenize.COMMENT, tokenize.NL, tokenize.ENCODING, tokenize.ENDMARKER}
+
+_LEXER = re.compile(r"""
+    (?P<space>\s+)
+   |(?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z)|\#[^\n]*)
+   |(?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?)
+   |(?P<number>(?:0[xXbBoO][0-9a-fA-F_]+|\d[\d_]*\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)n?)
+   |(?P<name>[A-Za-z_$][\w$]*)
+   |(?P<op>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|=>|&&=|\|\|=|\?\?=|[-+*/%&|^!=<>]=|&&|\|\||\?\?|\?\.|\+\+|--|\*\*|<<|>>|.)
+""", re.S | re.X)
+
+
+def _lex(code, names):
+    """Small regex lexer for JavaScript (and for Python code that tokenize rejects)."""
+    tokens = []
+    for match in _LEXER.finditer(code):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("space", "comment"):
+            continue
+        if kind == "string":
+            tokens.append(STRING)
+        elif kind == "number":
+            tokens.append(NUMBER)
+        elif kind == "name":
+            tokens.append(text if text in names else IDENTIFIER)
+        else:
+            tokens.append(text)
+    return tokens
+
+
+def _python_tokens(code):
+    tokens = []
+    for token in tokenize.generate_tokens(io.StringIO(code).readline):
+        kind = token.type
+        if kind in _PYTHON_SKIPPED or (kind == tokenize.ERRORTOKEN and not token.string.strip()):
+            continue
+        if kind == tokenize.NAME:
+            tokens.append(token.string if token.string in PYTHON_NAMES else IDENTIFIER)
+        elif kind == tokenize.NUMBER:
+            tokens.append(NUMBER)
+        elif kind == tokenize.STRING:
+            tokens.append(STRING)
+        elif kind in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+            tokens.append(tokenize.tok_name[kind])  # Block structure matters in Python
+        else:
+            tokens.append(token.string)
+    return tokens
+
+
+@lru_cache(maxsize=4096)
+def _token_id(token):
+    return zlib.crc32(token.encode()) & 0xFFFF
+
+
+def normalize_code(code, language="python"):
+    """Returns the submission as a list of small integer token ids.
+
+    Comments and whitespace are dropped, identifiers, numbers and strings are
+    replaced by placeholders, and keywords, builtins and operators are kept.
+    """
+    code = code or ""
+    if language == "python":
+        try:
+            tokens = _python_tokens(code)
+        except (tokenize.TokenError, IndentationError, SyntaxError):
+            tokens = _lex(code, PYTHON_NAMES)
+    else:
+        tokens = _lex(code, JAVASCRIPT_NAMES)
+    return [_token_id(token) for token in tokens]
+
+
+def pack_tokens(tokens):
+    """Packs token ids as little-endian uint16, two bytes per token."""
+    return struct.pack(f"<{len(tokens)}H", *tokens)
+
+
+def unpack_tokens(blob):
+    return list(struct.unpack(f"<{len(blob) // 2}H", blob))
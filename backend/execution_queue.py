@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from code_execution import execute_code, run_test_cases
+from models import db, CodeJob
+
+FINISHED_JOB_TTL = 600  # Seconds a finished job's result stays available for polling
+
+
+class QueueFull(Exception):
+    """Raised when a job is rejected for backpressure; routes answer 429."""
+
+
+class ExecutionQueue:
+    """Runs code execution jobs on a bounded pool of threads, off the request thread.
+
+    Queued jobs are kept per user and dispatched round-robin, so one user
+    submitting a burst cannot starve the others. Submissions are rejected once
+    the queue is `max_depth` deep or a user already has `max_per_user` jobs
+    waiting or running.
+
+    Jobs run on the worker process they were submitted to, and the queue
+    limits apply per process. Once set up with init_app, each job is also
+    recorded in the code_jobs table, so that a poll or a subscribe_job
+    reaching any other worker still finds it.
+    """
+
+    def __init__(self, concurrency=4, max_depth=100, max_per_user=3):
+        self.concurrency = concurrency
+        self.max_depth = max_depth
+        self.max_per_user = max_per_user
+        self.on_complete = None
+        self.app = None
+        self._jobs = {}
+        self._queues = OrderedDict()  # user_id -> deque of job ids, in round-robin order
+        self._depth = 0
+        self._running = 0
+        self._active_per_user = {}
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def init_app(self, app, socketio=None):
+        self.concurrency = app.config.get('CODE_EXECUTION_CONCURRENCY', self.concurrency)
+        self.max_depth = app.config.get('CODE_EXECUTION_QUEUE_DEPTH', self.max_depth)
+        self.max_per_user = app.config.get('CODE_EXECUTION_MAX_JOBS_PER_USER', self.max_per_user)
+        self.app = app
+        if socketio is not None:
+            self.on_complete = lambda job: socketio.emit('code_result', self.public_view(job), to=self.room(job["id"]))
+        app.extensions['execution_queue'] = self
+
+    @staticmethod
+    def room(job_id):
+        return f"job_{job_id}"
+
+    @staticmethod
+    def public_view(job):
+        return {key: job[key] for key in ("id", "kind", "status", "language", "result", "created_at", "finished_at")}
+
+    def submit(self, user_id, language, code, stdin="", cases=None, cache=True):
+        """Queues a job and returns it at once; raises QueueFull when over capacity.
+
+        A job with `cases` grades the code against those test cases instead of
+        running it once on `stdin`. cache=False bypasses the result cache.
+        """
+        with self._condition:
+            if self._depth >= self.max_depth:
+                raise QueueFull("Execution queue is full, try again shortly")
+            if self._active_per_user.get(user_id, 0) >= self.max_per_user:
+                raise QueueFull(f"You already have {self.max_per_user} runs in progress")
+
+            self._prune()
+            job = {
+                "id": uuid.uuid4().hex,
+                "user_id": user_id,
+                "kind": "test" if cases is not None else "run",
+                "language": language,
+                "code": code,
+                "stdin": stdin or "",
+                "cases": cases,
+                "cache": cache,
+                "status": "queued",
+                "result": None,
+                "created_at": time.time(),
+                "finished_at": None,
+            }
+            if self.app is not None:  # Recorded before a thread can pick the job up and update it
+                self._record(job)
+            self._jobs[job["id"]] = job
+            self._queues.setdefault(user_id, deque()).append(job["id"])
+            self._depth += 1
+            self._active_per_user[user_id] = self._active_per_user.get(user_id, 0) + 1
+            self._start_threads()
+            self._condition.notify()
+            return job
+
+    def get(self, job_id):
+        """The job, from this process or, when another worker runs it, from its code_jobs row."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+        if job is not None or self.app is None or not job_id:
+            return job
+        row = db.session.get(CodeJob, str(job_id))
+        if row is None:
+            return None
+        return {
+            "id": row.id, "user_id": row.user_id, "kind": row.kind, "language": row.language, "status": row.status,
+            "result": json.loads(row.result_json) if row.result_json else None,
+            "created_at": row.created_at, "finished_at": row.finished_at,
+        }
+
+    def _record(self, job):
+        db.session.add(CodeJob(id=job["id"], user_id=str(job["user_id"]), kind=job["kind"], language=job["language"],
+                               status=job["status"], created_at=job["created_at"]))
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _update_record(self, job):
+        """Copies the job's status and result to its row, and drops rows past FINISHED_JOB_TTL; runs off the request."""
+        with self.app.app_context():
+            try:
+                db.session.query(CodeJob).filter_by(id=job["id"]).update({
+                    "status": job["status"], "finished_at": job["finished_at"],
+                    "result_json": json.dumps(job["result"]) if job["result"] is not None else None,
+                })
+                if job["finished_at"]:
+                    db.session.query(CodeJob).filter(CodeJob.finished_at < time.time() - FINISHED_JOB_TTL).delete()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"⚠️ Could not record job {job['id']}: {e}")
+
+    def stats(self):
+        with self._condition:
+            return {"queued": self._depth, "running": self._running, "concurrency": self.concurrency}
+
+    def _start_threads(self):
+        while len(self._threads) < self.concurrency:
+            thread = threading.Thread(target=self._work, daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _prune(self):
+        cutoff = time.time() - FINISHED_JOB_TTL
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["finished_at"] and job["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def _next_job(self):
+        """Pops the head job of the next user in rotation; the user moves to the back."""
+        user_id, pending = next(iter(self._queues.items()))
+        job = self._jobs[pending.popleft()]
+        del self._queues[user_id]
+        if pending:
+            self._queues[user_id] = pending
+        self._depth -= 1
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queues:
+                    self._condition.wait()
+                job = self._next_job()
+                job["status"] = "running"
+                self._running += 1
+            if self.app is not None:
+                self._update_record(job)
+
+            try:
+                if job["cases"] is not None:
+                    result = run_test_cases(job["language"], job["code"], job["cases"], cache=job["cache"])
+                else:
+                    result = execute_code(job["language"], job["code"], job["stdin"], cache=job["cache"])
+            except Exception as e:
+                result = {"error": str(e)}
+
+            with self._condition:
+                job["result"] = result
+                job["status"] = "done"
+                job["finished_at"] = time.time()
+                job["code"] = job["stdin"] = job["cases"] = None  # Only the result is needed from here on
+                self._running -= 1
+                self._active_per_user[job["user_id"]] -= 1
+                if not self._active_per_user[job["user_id"]]:
+                    del self._active_per_user[job["user_id"]]
+            if self.app is not None:
+                self._update_record(job)
+
+            if self.on_complete:
+                try:
+                    self.on_complete(job)
+                except Exception as e:
+                    print(f"⚠️ Could not deliver result of job {job['id']}: {e}")
+
+
+execution_queue = ExecutionQueue()
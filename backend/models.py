@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, SmallInteger, String, ForeignKey, DateTime, Float, Text, LargeBinary, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -156,6 +156,8 @@ class Exam(db.Model):
     duration_minutes = Column(Integer, nullable=False)
     status = Column(String(20), nullable=False)  
     external_url = Column(String(500), nullable=True)  
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped with every update; the ETag
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow)
 
     # Relationships
     class_ = relationship("Class", back_populates="exams")
@@ -173,6 +175,10 @@ class ExamSubmission(db.Model):
     exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     answers_json = Column(Text, nullable=False)  # Store JSON as text
+    code = Column(Text, nullable=True)  # Source code for coding exams
+    language = Column(String(20), nullable=True)  # "python" or "javascript"
+    tokens = Column(LargeBinary, nullable=True)  # Normalized token stream of the code (packed uint16)
+    minhash = Column(LargeBinary, nullable=True)  # Packed MinHash signature of the code
     score = Column(Integer, nullable=True)
     submitted_at = Column(DateTime, default=datetime.utcnow)  # Automatically sets the timestamp
 
@@ -182,15 +188,91 @@ class ExamSubmission(db.Model):
     # Relationships
     exam = relationship("Exam", back_populates="submissions")
     student = relationship("User", back_populates="exam_submissions", foreign_keys=[student_id])
+    fingerprints = relationship("PlagiarismFingerprint", back_populates="submission", cascade="all, delete-orphan")
+    lsh_buckets = relationship("PlagiarismLshBucket", back_populates="submission", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<ExamSubmission Exam {self.exam_id} - Student {self.student_id}>"
 
+class PlagiarismFingerprint(db.Model):
+    """Winnowed k-gram hashes of a submission's code, indexed per exam."""
+    __tablename__ = "plagiarism_fingerprints"
+
+    id = Column(Integer, primary_key=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    submission_id = Column(Integer, ForeignKey("exam_submissions.id"), nullable=False)
+    fingerprint = Column(BigInteger, nullable=False)
+
+    # Lookups always go "which submissions of this exam share these hashes"
+    __table_args__ = (Index('ix_plagiarism_fingerprints_exam_fingerprint', 'exam_id', 'fingerprint'),)
+
+    # Relationships
+    submission = relationship("ExamSubmission", back_populates="fingerprints")
+
+    def __repr__(self):
+        return f"<PlagiarismFingerprint Submission {self.submission_id} - {self.fingerprint}>"
+
+class PlagiarismLshBucket(db.Model):
+    """LSH band buckets of a submission's MinHash signature."""
+    __tablename__ = "plagiarism_lsh_buckets"
+
+    id = Column(Integer, primary_key=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    submission_id = Column(Integer, ForeignKey("exam_submissions.id"), nullable=False)
+    band = Column(SmallInteger, nullable=False)
+    bucket = Column(BigInteger, nullable=False)
+
+    # Candidates are looked up per band, either within one exam or across all exams
+    __table_args__ = (
+        Index('ix_plagiarism_lsh_buckets_band_bucket', 'band', 'bucket'),
+        Index('ix_plagiarism_lsh_buckets_exam_band_bucket', 'exam_id', 'band', 'bucket'),
+    )
+
+    # Relationships
+    submission = relationship("ExamSubmission", back_populates="lsh_buckets")
+
+    def __repr__(self):
+        return f"<PlagiarismLshBucket Submission {self.submission_id} - Band {self.band}>"
+
+class PlagiarismReport(db.Model):
+    """Cached all-pairs similarity report for an exam."""
+    __tablename__ = "plagiarism_reports"
+
+    id = Column(Integer, primary_key=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), unique=True, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, complete or failed
+    submission_count = Column(Integer, nullable=True)
+    report_json = Column(Text, nullable=True)  # Matrix and suspicious clusters as JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    exam = relationship("Exam")
+
+    def __repr__(self):
+        return f"<PlagiarismReport Exam {self.exam_id} - {self.status}>"
+
+class CodeJob(db.Model):
+    """A code execution job as every worker sees it; the worker it was submitted to runs it."""
+    __tablename__ = "code_jobs"
+
+    id = Column(String(32), primary_key=True)
+    user_id = Column(String(64), nullable=False)  # JWT identity of the submitter
+    kind = Column(String(10), nullable=False)  # run or test
+    language = Column(String(20), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running or done
+    result_json = Column(Text, nullable=True)
+    created_at = Column(Float, nullable=False)  # Unix time, as the job is reported
+    finished_at = Column(Float, nullable=True, index=True)
+
+    def __repr__(self):
+        return f"<CodeJob {self.id} - {self.status}>"
+
 class Chat(db.Model):
     """Stores class-based messages."""
     __tablename__ = "chats"
 
-    id = Column(Integer, primary_key=True)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)  # Snowflake id from chat_ingest
     class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)  # ✅ Added school_id
     sender_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -202,6 +284,9 @@ class Chat(db.Model):
     school = relationship("School", back_populates="chats")
     sender = relationship("User", back_populates="chats_sent", foreign_keys=[sender_id])
 
+    # Serves the id-keyset pages of a class's history; ids grow with send time
+    __table_args__ = (Index('ix_chats_class_school_id', 'class_id', 'school_id', 'id'),)
+
     def __repr__(self):
         return f"<Chat {self.sender_id} - {self.class_id}>"
 
@@ -214,6 +299,8 @@ class Quiz(db.Model):
     school_id = Column(Integer, ForeignKey("schools.id"), nullable=False)  # Add school_id
     quiz_title = Column(String(150), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped with every question edit; the ETag
+    updated_at = Column(DateTime, nullable=True, default=datetime.utcnow)
 
     # Relationships
     class_ = relationship("Class", back_populates="quizzes")
@@ -221,6 +308,9 @@ class Quiz(db.Model):
     questions = relationship("QuizQuestion", back_populates="quiz", cascade="all, delete-orphan")
     submissions = relationship("QuizSubmission", back_populates="quiz", cascade="all, delete-orphan")
 
+    # Serves the newest-first keyset pagination of a school's quizzes
+    __table_args__ = (Index('ix_quizzes_school_created_id', 'school_id', 'created_at', 'id'),)
+
     def __repr__(self):
         return f"<Quiz {self.quiz_title}>"
 
@@ -229,7 +319,7 @@ class QuizQuestion(db.Model):
     __tablename__ = "quiz_questions"
 
     id = Column(Integer, primary_key=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False, index=True)
     question = Column(String(500), nullable=False)
     option_1 = Column(String(200), nullable=False)
     option_2 = Column(String(200), nullable=False)
@@ -243,6 +333,24 @@ class QuizQuestion(db.Model):
     def __repr__(self):
         return f"<QuizQuestion {self.question}>"
 
+class QuizAnalytics(db.Model):
+    """Cached item analytics of a quiz, kept as running sums so new submissions fold in."""
+    __tablename__ = "quiz_analytics"
+
+    id = Column(Integer, primary_key=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), unique=True, nullable=False)
+    key_signature = Column(String(64), nullable=False)  # Hash of the answer key the sums were computed with
+    submission_count = Column(Integer, nullable=False, default=0)
+    last_submission_id = Column(Integer, nullable=False, default=0)  # Highest submission folded in
+    stats_json = Column(Text, nullable=False)  # Running sums as JSON
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    quiz = relationship("Quiz")
+
+    def __repr__(self):
+        return f"<QuizAnalytics Quiz {self.quiz_id} - {self.submission_count} submissions>"
+
 class QuizSubmission(db.Model):
     """Tracks student quiz submissions."""
     __tablename__ = "quiz_submissions"
@@ -250,7 +358,8 @@ class QuizSubmission(db.Model):
     id = Column(Integer, primary_key=True)
     quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    answers_json = Column(Text, nullable=False)  # Store student's answers as JSON
+    answers_json = Column(Text, nullable=True)  # Answers as JSON; only rows from before answers were packed
+    answers_packed = Column(LargeBinary, nullable=True)  # One option byte per question, in question id order (0 = unanswered)
     score = Column(Integer, nullable=True)
     submitted_at = Column(DateTime, default=datetime.utcnow)
 
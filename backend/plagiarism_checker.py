@@ -1,21 +1,409 @@
+import click
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
 from difflib import SequenceMatcher
-from models import ExamSubmission
+from sqlalchemy import and_, func, insert, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, ExamSubmission, PlagiarismFingerprint, PlagiarismLshBucket, PlagiarismReport
+from code_normalizer import normalize_code, pack_tokens, unpack_tokens
 
-def check_plagiarism(exam_id, new_code):
-    """Checks how similar the submitted code is to past submissions for the same exam."""
-    
-    past_submissions = ExamSubmission.query.filter_by(exam_id=exam_id).all()
-    
-    if not past_submissions:
-        return 0  # No past submissions, so no plagiarism detected
+KGRAM_SIZE = 8  # Normalized tokens per k-gram
+WINNOW_WINDOW = 4  # k-grams per winnowing window
+CANDIDATE_LIMIT = 5  # Submissions that get the exact SequenceMatcher pass
+
+MINHASH_PERMUTATIONS = 64  # Signature length; more is more accurate but larger
+# Estimated Jaccard similarity at which LSH starts finding pairs. It fixes the
+# band/row split of the stored buckets at startup, so changing it means
+# re-indexing every exam (flask rebuild-plagiarism-index). The `threshold` of
+# check_plagiarism only filters the candidates these buckets find.
+LSH_THRESHOLD = float(os.getenv("PLAGIARISM_LSH_THRESHOLD", 0.5))
+
+SUSPICIOUS_SCORE = 80  # Pairs at or above this score are grouped into suspicious clusters
+REPORT_BLOCKS_PER_WORKER = 4  # More blocks than workers keeps every core busy until the end
+# A report still pending after this long lost its build (e.g. the worker restarted) and counts as failed
+REPORT_TIMEOUT = timedelta(seconds=int(os.getenv("PLAGIARISM_REPORT_TIMEOUT", 1800)))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240301)  # Fixed seed: signatures are persisted, so permutations must never change
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(MINHASH_PERMUTATIONS)
+]
+
+
+def _hash_kgram(kgram):
+    """Stable 64-bit signed hash of a k-gram of token ids, so it fits a BIGINT column."""
+    digest = hashlib.blake2b(pack_tokens(kgram), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def fingerprint(tokens, k=KGRAM_SIZE, window=WINNOW_WINDOW):
+    """Returns the winnowed set of k-gram hashes for a normalized token stream."""
+    if not tokens:
+        return set()
+    if len(tokens) <= k:
+        return {_hash_kgram(tokens)}
+
+    hashes = [_hash_kgram(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return {min(hashes)}
+
+    # Winnowing: keep the minimum hash of every window of consecutive k-grams
+    return {min(hashes[i:i + window]) for i in range(len(hashes) - window + 1)}
+
+
+def _lsh_shape(threshold, permutations=MINHASH_PERMUTATIONS):
+    """Picks (bands, rows) so that the LSH S-curve (1/bands)**(1/rows) is closest to the threshold."""
+    best = None
+    for rows in range(1, permutations + 1):
+        bands = permutations // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+LSH_BANDS, LSH_ROWS = _lsh_shape(LSH_THRESHOLD)
+
+
+def minhash_signature(prints):
+    """MinHash signature of a fingerprint set, one minimum per permutation."""
+    if not prints:
+        return None
+    values = [value & 0xFFFFFFFFFFFFFFFF for value in prints]
+    return [min((a * value + b) % _MERSENNE_PRIME for value in values) for a, b in _PERMUTATIONS]
+
+
+def pack_signature(signature):
+    return struct.pack(f"<{len(signature)}Q", *signature)
+
+
+def unpack_signature(blob):
+    return list(struct.unpack(f"<{len(blob) // 8}Q", blob))
+
+
+def estimate_similarity(signature, other):
+    """Estimated Jaccard similarity: the share of permutations whose minimums agree."""
+    matches = sum(1 for left, right in zip(signature, other) if left == right)
+    return matches / len(signature)
+
+
+def lsh_buckets(signature, bands=LSH_BANDS, rows=LSH_ROWS):
+    """Returns (band, bucket) pairs; two signatures sharing any pair are LSH candidates."""
+    buckets = []
+    for band in range(bands):
+        chunk = pack_signature(signature[band * rows:(band + 1) * rows])
+        digest = hashlib.blake2b(chunk, digest_size=8, person=b"lsh-band").digest()
+        buckets.append((band, int.from_bytes(digest, "big", signed=True)))
+    return buckets
+
+
+def submission_tokens(code, language, packed=None):
+    """Token stream of a submission, from its stored normal form when there is one."""
+    if packed is not None:
+        return unpack_tokens(packed)
+    return normalize_code(code, language or "python")
+
+
+def index_submission(submission):
+    """(Re)builds the token stream, fingerprint rows, MinHash signature and LSH buckets of a submission.
+
+    The caller commits.
+    """
+    PlagiarismFingerprint.query.filter_by(submission_id=submission.id).delete()
+    PlagiarismLshBucket.query.filter_by(submission_id=submission.id).delete()
+
+    tokens = normalize_code(submission.code, submission.language or "python")
+    submission.tokens = pack_tokens(tokens)
+    prints = fingerprint(tokens)
+    signature = minhash_signature(prints)
+    submission.minhash = pack_signature(signature) if signature else None
+    if prints:
+        db.session.execute(insert(PlagiarismFingerprint), [
+            {"exam_id": submission.exam_id, "submission_id": submission.id, "fingerprint": value}
+            for value in prints
+        ])
+        db.session.execute(insert(PlagiarismLshBucket), [
+            {"exam_id": submission.exam_id, "submission_id": submission.id, "band": band, "bucket": bucket}
+            for band, bucket in lsh_buckets(signature)
+        ])
+    return len(prints)
+
+
+def rebuild_index(exam_id):
+    """Indexes every coded submission of an exam, e.g. ones stored before the index or normal forms existed."""
+    submissions = ExamSubmission.query.filter(
+        ExamSubmission.exam_id == exam_id,
+        ExamSubmission.code.isnot(None)
+    ).all()
+    for submission in submissions:
+        index_submission(submission)
+    db.session.commit()
+    return len(submissions)
+
+
+def init_app(app):
+    app.cli.add_command(rebuild_index_command)
+
+
+@click.command("rebuild-plagiarism-index")
+def rebuild_index_command():
+    """Re-index every exam's submissions, e.g. after changing PLAGIARISM_LSH_THRESHOLD."""
+    exam_ids = db.session.scalars(select(ExamSubmission.exam_id).where(ExamSubmission.code.isnot(None)).distinct()).all()
+    click.echo(f"Re-indexed {sum(rebuild_index(exam_id) for exam_id in exam_ids)} submissions")
+
+
+def _fingerprint_candidates(exam_id, prints, exclude_submission_id, candidates):
+    """Submission ids of the exam sharing the most fingerprints with the new code."""
+    shared = func.count(PlagiarismFingerprint.id)
+    query = db.session.query(PlagiarismFingerprint.submission_id, shared).filter(
+        PlagiarismFingerprint.exam_id == exam_id,
+        PlagiarismFingerprint.fingerprint.in_(prints)
+    )
+    if exclude_submission_id is not None:
+        query = query.filter(PlagiarismFingerprint.submission_id != exclude_submission_id)
+    top = query.group_by(PlagiarismFingerprint.submission_id).order_by(shared.desc()).limit(candidates).all()
+    return [submission_id for submission_id, _ in top]
+
+
+def _lsh_candidates(exam_id, prints, exclude_submission_id, candidates, threshold, all_exams):
+    """Submission ids found through LSH buckets whose estimated similarity reaches the threshold."""
+    signature = minhash_signature(prints)
+    shared = func.count(PlagiarismLshBucket.id)
+    query = db.session.query(PlagiarismLshBucket.submission_id, shared).filter(
+        tuple_(PlagiarismLshBucket.band, PlagiarismLshBucket.bucket).in_(lsh_buckets(signature))
+    )
+    if not all_exams:
+        query = query.filter(PlagiarismLshBucket.exam_id == exam_id)
+    if exclude_submission_id is not None:
+        query = query.filter(PlagiarismLshBucket.submission_id != exclude_submission_id)
+    bucket_hits = query.group_by(PlagiarismLshBucket.submission_id).all()
+    if not bucket_hits:
+        return []
+
+    signatures = db.session.query(ExamSubmission.id, ExamSubmission.minhash).filter(
+        ExamSubmission.id.in_([submission_id for submission_id, _ in bucket_hits])
+    ).all()
+    ranked = sorted(
+        ((estimate_similarity(signature, unpack_signature(blob)), submission_id)
+         for submission_id, blob in signatures if blob),
+        reverse=True
+    )
+    return [submission_id for similarity, submission_id in ranked[:candidates] if similarity >= threshold]
+
+
+def check_plagiarism(exam_id, new_code, language="python", exclude_submission_id=None, candidates=CANDIDATE_LIMIT,
+                     use_lsh=False, threshold=LSH_THRESHOLD, all_exams=False):
+    """Checks how similar the submitted code is to past submissions for the same exam.
+
+    Code is compared as normalized token streams, so renamed identifiers and
+    edited comments or whitespace do not hide a copy. Past submissions are ranked
+    by the number of fingerprints they share with the new code, and only the top
+    candidates are compared exactly. With use_lsh the candidates come from the
+    MinHash/LSH index instead, which stays sub-linear for large corpora and can
+    search every exam (all_exams) rather than one. `threshold` then drops LSH
+    candidates below that estimated similarity; it cannot find pairs the
+    buckets miss, so it only helps above LSH_THRESHOLD.
+    """
+    new_tokens = normalize_code(new_code, language)
+    prints = fingerprint(new_tokens)
+    if not prints:
+        return 0
+
+    if use_lsh:
+        candidate_ids = _lsh_candidates(exam_id, prints, exclude_submission_id, candidates, threshold, all_exams)
+    else:
+        candidate_ids = _fingerprint_candidates(exam_id, prints, exclude_submission_id, candidates)
+
+    if not candidate_ids:
+        return 0  # No similar past submission, so no plagiarism detected
+
+    past_submissions = db.session.query(ExamSubmission.code, ExamSubmission.language, ExamSubmission.tokens).filter(
+        ExamSubmission.id.in_(candidate_ids)
+    ).all()
 
     highest_score = 0
 
-    for submission in past_submissions:
-        similarity = SequenceMatcher(None, new_code, submission.code).ratio()
+    for code, past_language, packed in past_submissions:
+        # Token vocabularies are tiny, so autojunk would discard the most common (and most telling) tokens
+        past_tokens = submission_tokens(code, past_language, packed)
+        similarity = SequenceMatcher(None, new_tokens, past_tokens, autojunk=False).ratio()
         plagiarism_score = round(similarity * 100)  # Convert to percentage
 
         if plagiarism_score > highest_score:
             highest_score = plagiarism_score
 
     return highest_score  # Return the highest plagiarism score found
+
+
+_report_tokens = None  # Submission token streams, shipped once to each report worker process
+
+
+def _init_report_worker(tokens):
+    global _report_tokens
+    _report_tokens = tokens
+
+
+def _score_rows(rows):
+    """Scores rows[0]..rows[1] of the upper triangle: every pair (i, j) with j > i."""
+    scores = []
+    matcher = SequenceMatcher(None, autojunk=False)
+    for i in range(*rows):
+        # SequenceMatcher caches details about the second sequence, so keep it fixed per row
+        matcher.set_seq2(_report_tokens[i])
+        for j in range(i + 1, len(_report_tokens)):
+            matcher.set_seq1(_report_tokens[j])
+            scores.append((i, j, round(matcher.ratio() * 100)))
+    return scores
+
+
+def _row_blocks(count, blocks):
+    """Splits the rows of an upper triangle into ranges holding roughly equal numbers of pairs."""
+    target = max(1, (count * (count - 1) // 2) // max(blocks, 1))
+    ranges, start, pairs = [], 0, 0
+    for i in range(count):
+        pairs += count - 1 - i
+        if pairs >= target:
+            ranges.append((start, i + 1))
+            start, pairs = i + 1, 0
+    if start < count:
+        ranges.append((start, count))
+    return ranges
+
+
+def _clusters(submissions, scores, threshold):
+    """Groups submissions connected by suspicious pairs, using union-find."""
+    parent = list(range(len(submissions)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    top_score = {}
+    for i, j, score in scores:
+        if score >= threshold:
+            parent[find(i)] = find(j)
+    for i, j, score in scores:
+        if score >= threshold:
+            root = find(i)
+            top_score[root] = max(top_score.get(root, 0), score)
+
+    groups = {}
+    for i in range(len(submissions)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted((
+        {
+            "submission_ids": [submissions[i][0] for i in members],
+            "student_ids": [submissions[i][1] for i in members],
+            "max_score": top_score[root],
+        }
+        for root, members in groups.items() if len(members) > 1
+    ), key=lambda cluster: (-cluster["max_score"], -len(cluster["submission_ids"])))
+
+
+def all_pairs_report(submissions, threshold=SUSPICIOUS_SCORE, workers=None):
+    """Similarity matrix and suspicious clusters for (submission_id, student_id, tokens) tuples.
+
+    Pair blocks are scored in a process pool, so the O(N^2) work uses every core.
+    Pool processes are spawned, not forked: the caller is a multi-threaded web
+    worker, and a fork could copy a lock another thread holds.
+    """
+    count = len(submissions)
+    tokens = [list(stream) for _, _, stream in submissions]
+    matrix = [[100 if i == j else 0 for j in range(count)] for i in range(count)]
+    scores = []
+
+    if count > 1:
+        workers = workers or os.cpu_count() or 1
+        blocks = _row_blocks(count, workers * REPORT_BLOCKS_PER_WORKER)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_report_worker, initargs=(tokens,)) as pool:
+            for block in pool.map(_score_rows, blocks):
+                scores.extend(block)
+
+    for i, j, score in scores:
+        matrix[i][j] = matrix[j][i] = score
+
+    return {
+        "submission_ids": [submission_id for submission_id, _, _ in submissions],
+        "student_ids": [student_id for _, student_id, _ in submissions],
+        "matrix": matrix,
+        "threshold": threshold,
+        "clusters": _clusters(submissions, scores, threshold),
+    }
+
+
+def report_status(report):
+    """The report's status, with a pending report older than REPORT_TIMEOUT counted as failed."""
+    if report.status == "pending" and report.created_at and datetime.utcnow() - report.created_at > REPORT_TIMEOUT:
+        return "failed"
+    return report.status
+
+
+def claim_report(exam_id, refresh=False):
+    """Marks the exam's report as pending for the caller to build; returns (report, claimed).
+
+    The row is inserted, or flipped to pending by an UPDATE whose WHERE only
+    matches a failed, stale or (with `refresh`) complete report, so of
+    several concurrent callers exactly one claims it. The others get the
+    report as it is.
+    """
+    now = datetime.utcnow()
+    db.session.add(PlagiarismReport(exam_id=exam_id, status="pending", created_at=now))
+    try:
+        db.session.commit()
+        return PlagiarismReport.query.filter_by(exam_id=exam_id).one(), True
+    except IntegrityError:
+        db.session.rollback()  # The exam already has a report row
+
+    reports = PlagiarismReport.__table__
+    claimable = [reports.c.status == "failed",
+                 and_(reports.c.status == "pending", reports.c.created_at < now - REPORT_TIMEOUT)]
+    if refresh:
+        claimable.append(reports.c.status == "complete")
+    claimed = db.session.execute(
+        update(reports).where(reports.c.exam_id == exam_id, or_(*claimable))
+        .values(status="pending", created_at=now, completed_at=None)
+    ).rowcount == 1
+    db.session.commit()
+    return PlagiarismReport.query.filter_by(exam_id=exam_id).one(), claimed
+
+
+def build_report(exam_id, threshold=SUSPICIOUS_SCORE, workers=None):
+    """Computes the all-pairs report for an exam's coded submissions and stores it.
+
+    The caller claims the report first with claim_report.
+    """
+    report = PlagiarismReport.query.filter_by(exam_id=exam_id).one()
+
+    try:
+        submissions = db.session.query(
+            ExamSubmission.id, ExamSubmission.student_id,
+            ExamSubmission.code, ExamSubmission.language, ExamSubmission.tokens
+        ).filter(
+            ExamSubmission.exam_id == exam_id,
+            ExamSubmission.code.isnot(None)
+        ).order_by(ExamSubmission.id).all()
+        result = all_pairs_report([
+            (submission_id, student_id, submission_tokens(code, language, packed))
+            for submission_id, student_id, code, language, packed in submissions
+        ], threshold, workers)
+        report.report_json = json.dumps(result)
+        report.submission_count = len(submissions)
+        report.status = "complete"
+    except Exception as e:
+        db.session.rollback()
+        report.status = "failed"
+        print(f"⚠️ Plagiarism report for exam {exam_id} failed: {e}")
+    finally:
+        report.completed_at = datetime.utcnow()
+        db.session.commit()
+    return report
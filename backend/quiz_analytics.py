@@ -0,0 +1,125 @@
+import hashlib
+import json
+import math
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func, select
+from models import db, QuizAnalytics, QuizSubmission
+from quiz_grading import answer_key, submission_matrix
+
+OPTIONS = 4  # Options are numbered 1-4; row 0 of the option counts is "unanswered"
+
+
+def key_signature(question_ids, correct):
+    return hashlib.sha256(json.dumps([list(question_ids), correct.tolist()]).encode()).hexdigest()
+
+
+def empty_sums(question_count):
+    """Running sums every statistic is derived from; all of them add up across batches."""
+    return {
+        "n": 0,
+        "score_sum": 0,
+        "score_square_sum": 0,
+        "correct": [0] * question_count,
+        "correct_score_sum": [0] * question_count,  # Sum of total scores of students who got the item right
+        "options": [[0] * question_count for _ in range(OPTIONS + 1)],
+        "histogram": [0] * (question_count + 1),
+    }
+
+
+def accumulate(sums, matrix, key):
+    """Folds a batch of submissions, as a students x questions answer matrix, into the sums."""
+    correct = matrix == key
+    totals = correct.sum(axis=1, dtype=np.int64)
+    options = np.where((matrix >= 1) & (matrix <= OPTIONS), matrix, 0)
+
+    sums["n"] += len(matrix)
+    sums["score_sum"] += int(totals.sum())
+    sums["score_square_sum"] += int((totals * totals).sum())
+    sums["correct"] = (np.array(sums["correct"]) + correct.sum(axis=0)).tolist()
+    sums["correct_score_sum"] = (np.array(sums["correct_score_sum"]) + (correct * totals[:, None]).sum(axis=0)).tolist()
+    counts = np.stack([(options == option).sum(axis=0) for option in range(OPTIONS + 1)])
+    sums["options"] = (np.array(sums["options"]).reshape(counts.shape) + counts).tolist()
+    sums["histogram"] = (np.array(sums["histogram"]) + np.bincount(totals, minlength=len(key) + 1)).tolist()
+    return sums
+
+
+def _discrimination(n, correct, correct_score_sum, score_sum, sd):
+    """Point-biserial correlation of getting the item right with the total score."""
+    if sd == 0 or correct in (0, n):
+        return None
+    right_mean = correct_score_sum / correct
+    wrong_mean = (score_sum - correct_score_sum) / (n - correct)
+    p = correct / n
+    return round((right_mean - wrong_mean) / sd * math.sqrt(p * (1 - p)), 3)
+
+
+def analytics_report(sums, question_ids):
+    """Turns the running sums into per-question difficulty, discrimination and option counts."""
+    n = sums["n"]
+    mean = sums["score_sum"] / n if n else 0
+    sd = math.sqrt(max(sums["score_square_sum"] / n - mean * mean, 0)) if n else 0
+    questions = []
+    for index, question_id in enumerate(question_ids):
+        correct = sums["correct"][index]
+        questions.append({
+            "question_id": question_id,
+            "difficulty": round(100 * correct / n, 1) if n else None,  # Percent correct
+            "discrimination": _discrimination(n, correct, sums["correct_score_sum"][index], sums["score_sum"], sd) if n else None,
+            "options": {
+                **{str(option): sums["options"][option][index] for option in range(1, OPTIONS + 1)},
+                "unanswered": sums["options"][0][index],
+            },
+        })
+    return {
+        "submission_count": n,
+        "mean_score": round(mean, 2),
+        "score_histogram": sums["histogram"],  # Submissions per score, from 0 to the question count
+        "questions": questions,
+    }
+
+
+def refresh_analytics(quiz_id):
+    """Brings the quiz's cached analytics up to date and returns (row, report); the caller commits.
+
+    Submissions newer than the cached high-water mark are folded into the
+    stored sums. Everything is recomputed when the answer key changed or the
+    submission count does not add up (e.g. a row committed out of id order).
+    """
+    question_ids, key = answer_key(quiz_id)
+    signature = key_signature(question_ids, key)
+    total, last_id = db.session.execute(
+        select(func.count(QuizSubmission.id), func.max(QuizSubmission.id)).where(QuizSubmission.quiz_id == quiz_id)
+    ).one()
+    last_id = last_id or 0
+
+    row = QuizAnalytics.query.filter_by(quiz_id=quiz_id).first()
+    if row and row.key_signature == signature and (row.submission_count, row.last_submission_id) == (total, last_id):
+        return row, analytics_report(json.loads(row.stats_json), question_ids)
+
+    incremental = row is not None and row.key_signature == signature
+    since = row.last_submission_id if incremental else 0
+    new_rows = db.session.execute(
+        select(QuizSubmission.answers_packed, QuizSubmission.answers_json)
+        .where(QuizSubmission.quiz_id == quiz_id, QuizSubmission.id > since, QuizSubmission.id <= last_id)
+    ).all()
+    if incremental and row.submission_count + len(new_rows) != total:
+        incremental, new_rows = False, db.session.execute(
+            select(QuizSubmission.answers_packed, QuizSubmission.answers_json)
+            .where(QuizSubmission.quiz_id == quiz_id, QuizSubmission.id <= last_id)
+        ).all()
+
+    sums = json.loads(row.stats_json) if incremental else empty_sums(len(question_ids))
+    if new_rows:
+        matrix = submission_matrix(new_rows, question_ids)
+        accumulate(sums, matrix, key)
+
+    if row is None:
+        row = QuizAnalytics(quiz_id=quiz_id)
+        db.session.add(row)
+    row.key_signature = signature
+    row.submission_count = sums["n"]
+    row.last_submission_id = last_id
+    row.stats_json = json.dumps(sums)
+    row.refreshed_at = datetime.utcnow()
+    return row, analytics_report(sums, question_ids)
@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from models import db, Quiz, QuizSubmission
+from quiz_grading import cached_answer_key, unpack_answers
+
+EXPORT_BATCH = 1000  # Rows fetched per round trip and written per response chunk
+EXPORT_COLUMNS = ("id", "quiz_id", "student_id", "score", "submitted_at", "answers")
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def submissions_query(school_id, quiz_id=None):
+    """Submissions of one quiz, or of every quiz of the school, in a stable order."""
+    statement = (
+        select(QuizSubmission.id, QuizSubmission.quiz_id, QuizSubmission.student_id,
+               QuizSubmission.score, QuizSubmission.submitted_at,
+               QuizSubmission.answers_packed, QuizSubmission.answers_json)
+        .join(Quiz, Quiz.id == QuizSubmission.quiz_id)
+        .where(Quiz.school_id == school_id)
+        .order_by(QuizSubmission.quiz_id, QuizSubmission.id)
+    )
+    if quiz_id is not None:
+        statement = statement.where(QuizSubmission.quiz_id == quiz_id)
+    return statement
+
+
+def _batches(statement):
+    """Runs the query with a server-side cursor and yields the rows EXPORT_BATCH at a time.
+
+    Only one batch is held in memory, whatever the number of submissions.
+    """
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+class _AnswerDecoder:
+    """Turns a row's stored answers into a {question_id: option} dict.
+
+    Rows arrive ordered by quiz, so only the current quiz's question ids are kept.
+    """
+
+    def __init__(self):
+        self.quiz_id = None
+        self.question_ids = ()
+
+    def __call__(self, row):
+        if row.answers_packed is None:
+            return json.loads(row.answers_json)
+        if row.quiz_id != self.quiz_id:
+            key = cached_answer_key(row.quiz_id)
+            self.quiz_id, self.question_ids = row.quiz_id, key.question_ids if key else ()
+        return unpack_answers(row.answers_packed, self.question_ids)
+
+
+def _ndjson(rows, answers):
+    return "".join(
+        json.dumps({
+            "id": row.id,
+            "quiz_id": row.quiz_id,
+            "student_id": row.student_id,
+            "score": row.score,
+            "submitted_at": row.submitted_at.isoformat() if row.submitted_at else None,
+            "answers": answers(row),
+        }) + "\n"
+        for row in rows
+    )
+
+
+def _csv(rows, answers):
+    # answers is written as JSON text, quoted into a single column
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (row.id, row.quiz_id, row.student_id, row.score,
+         row.submitted_at.isoformat() if row.submitted_at else "",
+         row.answers_json if row.answers_packed is None else json.dumps(answers(row)))
+        for row in rows
+    )
+    return buffer.getvalue()
+
+
+def stream_submissions(statement, export_format):
+    """Yields the export as text chunks, one per batch, for a streamed response."""
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue()
+    encode = _csv if export_format == "csv" else _ndjson
+    answers = _AnswerDecoder()
+    for rows in _batches(statement):
+        yield encode(rows, answers)
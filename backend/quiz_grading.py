@@ -0,0 +1,148 @@
+import json
+import os
+from collections import namedtuple
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from models import db, Quiz, QuizQuestion, QuizSubmission
+from utils.cache import TTLCache
+
+UNANSWERED = 0  # Options are numbered 1-4, so 0 never matches a key
+
+# Answer keys of recently submitted quizzes, so scoring a submission needs no
+# question query. Each key remembers the quiz version it was loaded at, and
+# every use checks that version with one primary-key lookup: routes that
+# change questions touch() the quiz, so a key cached by any server process is
+# reloaded on its next use. Invalidating after a commit only frees the entry
+# early in the process that made the change.
+AnswerKey = namedtuple("AnswerKey", "school_id question_ids correct version", defaults=(None,))
+answer_key_cache = TTLCache(max_entries=512, ttl=int(os.getenv("QUIZ_ANSWER_KEY_TTL", 300)))
+
+
+def answer_key(quiz_id):
+    """Returns the quiz's question ids and their correct options, ordered by question id."""
+    rows = db.session.execute(
+        select(QuizQuestion.id, QuizQuestion.correct_answer)
+        .where(QuizQuestion.quiz_id == quiz_id)
+        .order_by(QuizQuestion.id)
+    ).all()
+    question_ids = [question_id for question_id, _ in rows]
+    return question_ids, np.array([correct for _, correct in rows], dtype=np.int16)
+
+
+def cached_answer_key(quiz_id):
+    """Returns the quiz's AnswerKey from the cache, loading it on a miss or a newer version; None if there is no such quiz."""
+    quiz = db.session.execute(select(Quiz.school_id, Quiz.version).where(Quiz.id == quiz_id)).first()
+    if quiz is None:
+        return None
+    key = answer_key_cache.get(quiz_id)
+    if key is None or key.version != quiz.version:
+        question_ids, correct = answer_key(quiz_id)
+        correct.flags.writeable = False  # Shared between requests
+        key = AnswerKey(quiz.school_id, tuple(question_ids), correct, quiz.version)
+        answer_key_cache.put(quiz_id, key)
+    return key
+
+
+def invalidate_answer_key(quiz_id):
+    answer_key_cache.invalidate(quiz_id)
+
+
+def score_answers(answers, key):
+    """Scores one {question_id: option} submission against an AnswerKey, in memory."""
+    return int(score_matrix(answer_matrix([answers], key.question_ids), key.correct)[0])
+
+
+def decode_answers(answers_json):
+    """Parses a submission's answers_json; malformed answers count as unanswered."""
+    try:
+        answers = json.loads(answers_json)
+    except (TypeError, ValueError):
+        return {}
+    return answers if isinstance(answers, dict) else {}
+
+
+def pack_answers(answers, question_ids):
+    """Encodes {question_id: option} as one byte per question, in question id order.
+
+    Questions are never added to or removed from a quiz once it exists, so the
+    position of a byte always names the same question. UNANSWERED is 0.
+    """
+    return answer_matrix([answers], question_ids).astype(np.uint8).tobytes()
+
+
+def unpack_answers(packed, question_ids):
+    """Decodes packed answers back to the {question_id: option} form the API returns."""
+    options = np.frombuffer(packed, dtype=np.uint8).tolist()
+    return {str(question_id): option for question_id, option in zip(question_ids, options) if option != UNANSWERED}
+
+
+def submission_matrix(rows, question_ids):
+    """Builds the students x questions matrix from (answers_packed, answers_json) rows.
+
+    Packed rows are laid out with a single frombuffer; rows stored before
+    answers were packed are decoded from their JSON.
+    """
+    width = len(question_ids)
+    matrix = np.zeros((len(rows), width), dtype=np.int16)
+    packed = [index for index, (blob, _) in enumerate(rows) if blob is not None and len(blob) == width]
+    if packed:
+        blobs = b"".join(rows[index][0] for index in packed)
+        matrix[packed] = np.frombuffer(blobs, dtype=np.uint8).reshape(len(packed), width)
+    if len(packed) < len(rows):
+        legacy = sorted(set(range(len(rows))) - set(packed))
+        matrix[legacy] = answer_matrix([decode_answers(rows[index][1]) for index in legacy], question_ids)
+    return matrix
+
+
+def answer_matrix(answer_sets, question_ids):
+    """Lays out {question_id: option} answer dicts as a students x questions matrix.
+
+    Answers that are not integer options (missing, null, strings) become
+    UNANSWERED, matching how submit_quiz scores them.
+    """
+    keys = [str(question_id) for question_id in question_ids]
+    rows = [[_option(answers.get(key)) for key in keys] for answers in answer_sets]
+    return np.array(rows, dtype=np.int16).reshape(len(answer_sets), len(keys))
+
+
+def _option(value):
+    return value if type(value) is int and 0 < value < 256 else UNANSWERED
+
+
+def score_matrix(matrix, key):
+    """Scores every student at once: the number of answers equal to the key."""
+    return (matrix == key).sum(axis=1, dtype=np.int32)
+
+
+def regrade_quiz(quiz_id):
+    """Recomputes the score of every submission of a quiz against its current answer key.
+
+    Submissions are scored together as one NumPy matrix and only changed scores
+    are written back, in a single bulk UPDATE. Returns how many submissions
+    were regraded and how many scores changed; the caller commits.
+    """
+    question_ids, key = answer_key(quiz_id)
+    rows = db.session.execute(
+        select(QuizSubmission.id, QuizSubmission.score, QuizSubmission.answers_packed, QuizSubmission.answers_json)
+        .where(QuizSubmission.quiz_id == quiz_id)
+    ).all()
+    if not rows:
+        return {"regraded": 0, "changed": 0}
+
+    matrix = submission_matrix([(packed, answers_json) for _, _, packed, answers_json in rows], question_ids)
+    scores = score_matrix(matrix, key)
+    changes = [
+        {"submission_id": submission_id, "new_score": score}
+        for (submission_id, old_score, _, _), score in zip(rows, scores.tolist())
+        if old_score != score
+    ]
+    if changes:
+        # One executemany UPDATE; no ORM objects are loaded or tracked
+        submissions = QuizSubmission.__table__
+        db.session.execute(
+            update(submissions)
+            .where(submissions.c.id == bindparam("submission_id"))
+            .values(score=bindparam("new_score")),
+            changes
+        )
+    return {"regraded": len(rows), "changed": len(changes)}
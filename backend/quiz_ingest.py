@@ -0,0 +1,139 @@
+import click
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, QuizSubmission
+from quiz_grading import answer_key, decode_answers, pack_answers
+from utils.cache import TTLCache
+from utils.write_behind import WriteBehindBuffer, BufferFull
+
+# Scores accepted by this process, so a client retrying a submission gets the
+# same answer back without a query. Duplicates from other processes, or after
+# this expires, are still dropped by the upsert. While a submission is being
+# accepted its key holds IN_PROGRESS, so a concurrent duplicate cannot also
+# be buffered and reported as created.
+recent_submissions = TTLCache(max_entries=50000, ttl=3600)
+IN_PROGRESS = object()
+
+
+class SubmissionInProgress(Exception):
+    """Raised for a duplicate of a submission this process is still accepting; routes answer 409."""
+
+
+def upsert_submissions(rows):
+    """Inserts submission rows in one statement, skipping (quiz, student) pairs that already exist.
+
+    Returns how many rows were inserted; the first submission of a student
+    always wins, so client retries are harmless.
+    """
+    dialect = db.engine.dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    statement = insert(QuizSubmission).values(rows).on_conflict_do_nothing(index_elements=["quiz_id", "student_id"])
+    try:
+        inserted = db.session.execute(statement).rowcount
+        db.session.commit()
+        return inserted
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+submission_buffer = WriteBehindBuffer(upsert_submissions, name="quiz_submission_buffer")
+
+
+def init_app(app):
+    submission_buffer.init_app(
+        app,
+        max_batch=app.config.get("QUIZ_SUBMISSION_BATCH"),
+        interval=app.config.get("QUIZ_SUBMISSION_FLUSH_INTERVAL"),
+    )
+    app.cli.add_command(pack_answers_command)
+
+
+def pack_stored_answers(batch_size=1000):
+    """Migrates submissions stored as answers_json to answers_packed; returns how many were packed.
+
+    Works quiz by quiz in batches, committing after each, so it can run on a
+    live database and be interrupted and resumed. The JSON is cleared once a
+    row is packed. Answers that are not options of the quiz are dropped; they
+    never counted towards the score.
+    """
+    submissions = QuizSubmission.__table__
+    quiz_ids = db.session.scalars(
+        select(QuizSubmission.quiz_id).where(QuizSubmission.answers_packed.is_(None)).distinct()
+    ).all()
+    packed = 0
+    for quiz_id in quiz_ids:
+        question_ids, _ = answer_key(quiz_id)
+        while True:
+            rows = db.session.execute(
+                select(QuizSubmission.id, QuizSubmission.answers_json)
+                .where(QuizSubmission.quiz_id == quiz_id, QuizSubmission.answers_packed.is_(None))
+                .order_by(QuizSubmission.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.session.execute(
+                update(submissions)
+                .where(submissions.c.id == bindparam("submission_id"))
+                .values(answers_packed=bindparam("packed"), answers_json=None),
+                [{"submission_id": submission_id, "packed": pack_answers(decode_answers(answers_json), question_ids)}
+                 for submission_id, answers_json in rows]
+            )
+            db.session.commit()
+            packed += len(rows)
+    return packed
+
+
+@click.command("pack-quiz-answers")
+@click.option("--batch-size", default=1000, show_default=True, help="Submissions updated per transaction.")
+def pack_answers_command(batch_size):
+    """Convert stored quiz answers from JSON to the packed one-byte-per-question form."""
+    click.echo(f"Packed {pack_stored_answers(batch_size)} quiz submissions")
+
+
+def ingest_submission(row, write_behind=True):
+    """Accepts a scored submission row; returns (score, created).
+
+    With write_behind the row is queued and written with the next batch;
+    otherwise, or when the buffer is full, it is upserted right away. A repeat
+    of a submission this process already accepted returns its original score;
+    one that arrives while the first is still being accepted raises
+    SubmissionInProgress.
+    """
+    key = (row["quiz_id"], row["student_id"])
+    accepted_score = recent_submissions.put_if_absent(key, IN_PROGRESS)
+    if accepted_score is IN_PROGRESS:
+        raise SubmissionInProgress("This submission is already being processed")
+    if accepted_score is not None:
+        return accepted_score, False
+
+    try:
+        score, created = _store_submission(row, write_behind)
+    except BaseException:
+        recent_submissions.invalidate(key)  # Not accepted: a retry may try again
+        raise
+    recent_submissions.put(key, score)
+    return score, created
+
+
+def _store_submission(row, write_behind):
+    if write_behind:
+        # Stored by another worker, before a restart or past the cache's TTL: the
+        # batch upsert would drop this row, so report the score that is kept
+        stored_score = db.session.scalars(
+            select(QuizSubmission.score).where(QuizSubmission.quiz_id == row["quiz_id"],
+                                               QuizSubmission.student_id == row["student_id"])
+        ).first()
+        if stored_score is not None:
+            return stored_score, False
+        try:
+            submission_buffer.add(row)
+            return row["score"], True
+        except BufferFull:
+            pass
+
+    if upsert_submissions([row]):
+        return row["score"], True
+    existing = QuizSubmission.query.filter_by(quiz_id=row["quiz_id"], student_id=row["student_id"]).first()
+    return existing.score, False
@@ -1,36 +1,258 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, select
 from models import db, Chat, User  # Ensure User is imported
+import chat_rooms
+import chat_ingest
+import chat_search
+from user_directory import cached_user, user_cache
 from datetime import datetime
+from collections import deque
+import json
+import time
 
 chat_bp = Blueprint('chat_bp', __name__)
 
-# Get all chats for a specific class (only for chats in the user's school)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+def _chat_rows():
+    """Chat columns with the sender's username, from one joined SELECT; no ORM objects or lazy loads."""
+    return select(Chat.id, Chat.class_id, Chat.school_id, Chat.sender_id, Chat.message, Chat.timestamp,
+                  User.username.label('sender_name')) \
+        .outerjoin(User, User.id == Chat.sender_id)
+
+def _chat_data(row):
+    return {
+        "id": row.id,
+        "class_id": row.class_id,
+        "sender_id": row.sender_id,
+        "sender_name": row.sender_name or "Anonymous",
+        "message": row.message,
+        "timestamp": row.timestamp.isoformat()
+    }
+
+def _new_chat_data(row):
+    """Same shape for a just-sent message row, which may still be in the write-behind buffer."""
+    sender = cached_user(row["sender_id"])
+    return {
+        "id": row["id"],
+        "class_id": row["class_id"],
+        "sender_id": row["sender_id"],
+        "sender_name": sender.username if sender else "Anonymous",
+        "message": row["message"],
+        "timestamp": row["timestamp"].isoformat()
+    }
+
+def _newer_chats(class_id, school_id, last_id, limit):
+    """Messages of a class after `last_id`, oldest first, buffered ones included; returns (chats, has_more).
+
+    Up to `limit` messages come after `last_id`. In write-behind mode the
+    messages of the flush window before it come again as well, so one that
+    another worker wrote late is not skipped; callers drop ids they already have.
+    """
+    filters = [Chat.class_id == class_id, Chat.school_id == school_id]
+    page = db.session.execute(
+        _chat_rows().where(*filters, Chat.id > last_id).order_by(Chat.id.asc()).limit(limit + 1)
+    ).all()
+    floor = chat_ingest.replay_floor(last_id)
+    if floor < last_id:
+        page += db.session.execute(
+            _chat_rows().where(*filters, Chat.id > floor, Chat.id <= last_id).order_by(Chat.id.asc()).limit(MAX_PAGE_SIZE)
+        ).all()
+    chats = [_chat_data(row) for row in page]
+    pending = chat_ingest.pending_chats(class_id, school_id, after=floor)
+    if pending:
+        known = {chat["id"] for chat in chats}
+        chats += [_new_chat_data(row) for row in pending if row["id"] not in known]
+    chats.sort(key=lambda chat: chat["id"])
+    newer = [chat for chat in chats if chat["id"] > last_id]
+    if len(newer) > limit:
+        return [chat for chat in chats if chat["id"] <= newer[limit - 1]["id"]], True
+    return chats, False
+
+def _sse(event, data, event_id=None):
+    """One server-sent event; `event_id` becomes the Last-Event-ID the browser sends when it reconnects."""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Get the chat history of a class (only for chats in the user's school), one page at a time
 @chat_bp.route('/chats/<int:class_id>', methods=['GET'])
 @jwt_required()
 def get_chats(class_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    page = request.args.get('page', 1, type=int)
-    # Filter chats by class_id and by the user's school_id
-    chats_paginated = Chat.query.filter_by(class_id=class_id, school_id=user.school_id)\
-                                .order_by(Chat.timestamp.asc())\
-                                .paginate(page=page, per_page=10)
-
-    chats = [{
-        "id": chat.id,
-        "class_id": chat.class_id,
-        "sender_id": chat.sender_id,
-        "sender_name": chat.sender.username if chat.sender else "Anonymous",
-        "message": chat.message,
-        "timestamp": chat.timestamp.isoformat()
-    } for chat in chats_paginated.items]
+    """Newest messages first; ?before=<id> pages back through older messages.
+
+    ?after=<id> instead returns the messages sent after that one, oldest
+    first, for catching up. Pages hold ?limit= messages (at most 100); pass
+    next_cursor as the same parameter for the next page. Each page is one
+    range scan of ix_chats_class_school_id. ?include_total=true adds the
+    class's message count, which costs a COUNT over the whole history.
+    With the requester in the user cache, a page costs exactly one query.
+    """
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    before = request.args.get('before', type=int)
+    after = request.args.get('after', type=int)
+    if before is not None and after is not None:
+        return jsonify({"msg": "Pass either before or after, not both"}), 400
+
+    filters = [Chat.class_id == class_id, Chat.school_id == user.school_id]
+    if after is not None:
+        filters.append(Chat.id > after)
+        order = Chat.id.asc()
+    else:
+        if before is not None:
+            filters.append(Chat.id < before)
+        order = Chat.id.desc()
+    page = db.session.execute(_chat_rows().where(*filters).order_by(order).limit(limit + 1)).all()
+    chats = [_chat_data(row) for row in page]
 
+    # Messages sent in write-behind mode are served before their batch is written
+    pending = chat_ingest.pending_chats(class_id, user.school_id, before=before, after=after)
+    if pending:
+        known = {chat["id"] for chat in chats}
+        chats += [_new_chat_data(row) for row in pending if row["id"] not in known]
+        chats.sort(key=lambda chat: chat["id"], reverse=after is None)
+
+    has_more = len(chats) > limit
+    chats = chats[:limit]
+    result = {
+        "chats": chats,
+        "has_more": has_more,
+        "next_cursor": chats[-1]["id"] if has_more else None
+    }
+    if request.args.get('include_total', 'false').lower() in ['true', '1']:
+        result["total"] = db.session.scalar(
+            select(func.count(Chat.id)).where(Chat.class_id == class_id, Chat.school_id == user.school_id)
+        )
+    return jsonify(result), 200
+
+# Messages sent after the one a polling client saw last (only chats in the user's school)
+@chat_bp.route('/chats/<int:class_id>/since/<int:last_id>', methods=['GET'])
+@jwt_required()
+def get_chats_since(class_id, last_id):
+    """Only the messages newer than `last_id`, oldest first, at most ?limit= (100).
+
+    For clients that poll instead of holding a socket: a caught-up client
+    costs one empty range scan of ix_chats_class_school_id, with no page
+    re-read and no count; in write-behind mode a second, short scan re-reads
+    the last flush window, whose messages the client skips by id. Pass the
+    returned last_id on the next poll.
+    """
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    limit = min(max(request.args.get('limit', MAX_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    chats, has_more = _newer_chats(class_id, user.school_id, last_id, limit)
     return jsonify({
         "chats": chats,
-        "total": chats_paginated.total,
-        "pages": chats_paginated.pages,
-        "current_page": chats_paginated.page
+        "has_more": has_more,
+        "last_id": max([last_id] + [chat["id"] for chat in chats])
+    }), 200
+
+# Live chat updates of a class as server-sent events, for clients without websockets
+@chat_bp.route('/chats/<int:class_id>/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_chats(class_id):
+    """chat_message, chat_updated and chat_deleted events, as the class's Socket.IO room gets them.
+
+    EventSource cannot send headers, so the token may come as ?jwt=. The
+    stream starts after ?last_id=, or the Last-Event-ID a reconnecting
+    browser sends, else after the newest message. Between events the
+    request waits on the class's event feed without touching the
+    database. Every CHAT_STREAM_KEEPALIVE seconds of quiet it sends a
+    keep-alive and picks up messages sent through other workers from the
+    database. After CHAT_STREAM_DURATION seconds the stream ends and the
+    browser reconnects where it left off.
+    """
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    # Feed events are forwarded as they are, so membership is checked once, before the stream opens
+    if not chat_rooms.is_member(user, class_id):
+        return jsonify({"msg": "You are not a member of this class"}), 403
+    school_id = user.school_id
+    keepalive = current_app.config.get('CHAT_STREAM_KEEPALIVE', 15)
+    deadline = time.monotonic() + current_app.config.get('CHAT_STREAM_DURATION', 300)
+    position = chat_rooms.feed.position(class_id)  # Before the catch-up, so nothing falls in between
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is None:
+        last_id = request.args.get('last_id', type=int)
+    if last_id is None:
+        last_id = db.session.scalar(
+            select(func.max(Chat.id)).where(Chat.class_id == class_id, Chat.school_id == school_id)
+        ) or 0
+    db.session.close()
+    sent = deque(maxlen=2 * MAX_PAGE_SIZE)  # Ids already streamed; feed, database and replay can all deliver one
+
+    def message(chat):
+        nonlocal last_id
+        last_id = max(last_id, chat["id"])
+        sent.append(chat["id"])
+        return _sse('chat_message', chat, chat["id"])
+
+    def catch_up():
+        while True:
+            chats, has_more = _newer_chats(class_id, school_id, last_id, MAX_PAGE_SIZE)
+            db.session.close()  # Hand the connection back while the stream waits
+            for chat in chats:
+                if chat["id"] not in sent:
+                    yield message(chat)
+            if not has_more:
+                return
+
+    def events():
+        nonlocal position
+        yield f"retry: {int(keepalive * 1000)}\n\n"
+        yield from catch_up()
+        while (remaining := deadline - time.monotonic()) > 0:
+            position, feed_events = chat_rooms.feed.wait(class_id, position, timeout=min(keepalive, remaining))
+            if not feed_events:  # Quiet, or the stream fell behind the feed's backlog
+                yield from catch_up()
+                yield ": keepalive\n\n"
+                continue
+            for event, payload in feed_events:
+                if event != 'chat_message':
+                    yield _sse(event, payload)
+                elif payload["id"] not in sent:
+                    yield message(payload)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Full-text search over a class's chat history (only chats in the user's school)
+@chat_bp.route('/chats/<int:class_id>/search', methods=['GET'])
+@jwt_required()
+def search_chats(class_id):
+    """Messages matching ?q=, best match first, ?limit= per page (at most 100).
+
+    Pass next_cursor as ?cursor= for the next page. Served from the chat
+    search index, so messages still in the write-behind buffer show up once
+    their batch is written.
+    """
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"msg": "q is required"}), 400
+    limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = chat_search.decode_cursor(request.args['cursor'])
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"msg": "Invalid cursor"}), 400
+
+    rows = chat_search.search_chats(user.school_id, class_id, text, limit, after=after)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        "chats": [dict(_chat_data(row), score=row.score) for row in rows],
+        "has_more": has_more,
+        "next_cursor": chat_search.encode_cursor(rows[-1].score, rows[-1].id) if has_more else None
     }), 200
 
 # Send a new chat message (only allowed if the class belongs to the user's school)
@@ -38,68 +260,75 @@ def get_chats(class_id):
 @jwt_required()
 def create_chat():
     data = request.get_json()
-    user_id = get_jwt_identity()  # Get the user ID from the token
-    user = User.query.get(user_id)
+    user = cached_user(get_jwt_identity())  # The user from the token
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
 
     if not data or 'class_id' not in data or 'message' not in data:
         return jsonify({"msg": "class_id and message are required"}), 400
 
-    # Optionally, if you have a Class model, verify the class belongs to user.school_id here
+    try:
+        class_id = int(data['class_id'])
+    except (TypeError, ValueError):
+        return jsonify({"msg": "class_id must be a number"}), 400
 
-    new_chat = Chat(
-        class_id=data['class_id'],
-        school_id=user.school_id,  # Set automatically from the user's school
-        sender_id=user_id,
-        message=data['message'],
-        timestamp=datetime.utcnow()
-    )
-    db.session.add(new_chat)
-    db.session.commit()
+    # Checked before the message is stored or broadcast to the class's room
+    if not chat_rooms.is_member(user, class_id):
+        return jsonify({"msg": "You are not a member of this class"}), 403
+
+    # With CHAT_WRITE_BEHIND the row is written with the next batch, after it was broadcast
+    new_chat = chat_ingest.save_chat({
+        "class_id": class_id,
+        "school_id": user.school_id,  # Set automatically from the user's school
+        "sender_id": user.id,
+        "message": data['message'],
+        "timestamp": datetime.utcnow()
+    }, write_behind=current_app.config.get('CHAT_WRITE_BEHIND', False))
+
+    chat_data = _new_chat_data(new_chat)
+    # Pushed to the class's room only; members no longer need to poll
+    chat_rooms.publish('chat_message', class_id, chat_data)
 
     return jsonify({
         "msg": "Chat message sent",
-        "chat": {
-            "id": new_chat.id,
-            "class_id": new_chat.class_id,
-            "sender_id": new_chat.sender_id,
-            "sender_name": user.username if user else "Anonymous",
-            "message": new_chat.message,
-            "timestamp": new_chat.timestamp.isoformat()
-        }
+        "chat": chat_data
     }), 201
 
 # Get a specific chat message (only if it belongs to the user's school)
 @chat_bp.route('/chats/message/<int:chat_id>', methods=['GET'])
 @jwt_required()
 def get_chat(chat_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    chat = Chat.query.get_or_404(chat_id)
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    chat = db.session.execute(_chat_rows().where(Chat.id == chat_id)).first()
+    if chat:
+        school_id, chat_data = chat.school_id, _chat_data(chat)
+    else:
+        pending = [row for row in chat_ingest.chat_buffer.pending() if row["id"] == chat_id]
+        if not pending:
+            return jsonify({"msg": "Chat not found"}), 404
+        school_id, chat_data = pending[0]["school_id"], _new_chat_data(pending[0])
     
-    if chat.school_id != user.school_id:
+    if school_id != user.school_id:
         return jsonify({"msg": "Unauthorized to view this chat"}), 403
 
-    return jsonify({
-        "id": chat.id,
-        "class_id": chat.class_id,
-        "sender_id": chat.sender_id,
-        "sender_name": chat.sender.username if chat.sender else "Anonymous",
-        "message": chat.message,
-        "timestamp": chat.timestamp.isoformat()
-    }), 200
+    return jsonify(chat_data), 200
 
 # Update a chat message (only the sender can edit, and only within the user's school)
 @chat_bp.route('/chats/message/<int:chat_id>', methods=['PUT'])
 @jwt_required()
 def update_chat(chat_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    chat_ingest.ensure_written(chat_id)
     chat = Chat.query.get_or_404(chat_id)
 
     if chat.school_id != user.school_id:
         return jsonify({"msg": "Unauthorized to update this chat"}), 403
 
-    if chat.sender_id != user_id:
+    if chat.sender_id != user.id:
         return jsonify({"msg": "You can only edit your own messages"}), 403
 
     data = request.get_json()
@@ -108,6 +337,7 @@ def update_chat(chat_id):
 
     chat.message = data['message']
     db.session.commit()
+    chat_rooms.publish('chat_updated', chat.class_id, {"id": chat.id, "class_id": chat.class_id, "message": chat.message})
     
     return jsonify({"msg": "Chat updated"}), 200
 
@@ -115,16 +345,26 @@ def update_chat(chat_id):
 @chat_bp.route('/chats/message/<int:chat_id>', methods=['DELETE'])
 @jwt_required()
 def delete_chat(chat_id):
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = cached_user(get_jwt_identity())
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+    chat_ingest.ensure_written(chat_id)
     chat = Chat.query.get_or_404(chat_id)
     
     if chat.school_id != user.school_id:
         return jsonify({"msg": "Unauthorized to delete this chat"}), 403
 
-    if chat.sender_id != user_id:
+    if chat.sender_id != user.id:
         return jsonify({"msg": "You can only delete your own messages"}), 403
 
+    class_id = chat.class_id
     db.session.delete(chat)
     db.session.commit()
+    chat_rooms.publish('chat_deleted', class_id, {"id": chat_id, "class_id": class_id})
     return jsonify({"msg": "Chat deleted"}), 200
+
+# Write-behind buffer depth and flush latency, and user cache hit/miss counters
+@chat_bp.route('/chats/stats', methods=['GET'])
+@jwt_required()
+def get_chat_stats():
+    return jsonify({"buffer": chat_ingest.chat_buffer.stats(), "user_cache": user_cache.stats()}), 200
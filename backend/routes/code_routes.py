@@ -0,0 +1,56 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from code_execution import SUPPORTED_LANGUAGES, MAX_TEST_CASES, result_cache
+from execution_queue import QueueFull
+
+code_bp = Blueprint('code_bp', __name__)
+
+# Queue code for execution (or grading against `cases`); the result is polled or pushed over Socket.IO
+@code_bp.route('/code/jobs', methods=['POST'])
+@jwt_required()
+def submit_code_job():
+    user_id = get_jwt_identity()
+    data = request.get_json()
+    if not data or 'language' not in data or 'code' not in data:
+        return jsonify({"msg": "language and code are required"}), 400
+    if data['language'] not in SUPPORTED_LANGUAGES:
+        return jsonify({"msg": f"Unsupported language: {data['language']}"}), 400
+
+    cases = data.get('cases')
+    if cases is not None:
+        if not isinstance(cases, list) or not all(isinstance(case, dict) for case in cases):
+            return jsonify({"msg": "cases must be a list of {stdin, expected_output} objects"}), 400
+        if len(cases) > MAX_TEST_CASES:
+            return jsonify({"msg": f"At most {MAX_TEST_CASES} test cases can be run at once"}), 400
+        cases = [{"stdin": str(case.get('stdin') or ""), "expected_output": str(case.get('expected_output') or "")}
+                 for case in cases]
+
+    queue = current_app.extensions['execution_queue']
+    try:
+        job = queue.submit(user_id, data['language'], data['code'], data.get('stdin', ""), cases=cases,
+                           cache=data.get('cache', True) is not False)
+    except QueueFull as e:
+        response = jsonify({"msg": str(e), **queue.stats()})
+        response.headers['Retry-After'] = "2"
+        return response, 429
+
+    return jsonify({"job_id": job["id"], "status": job["status"]}), 202
+
+# Poll a queued code execution job (only its owner can see it)
+@code_bp.route('/code/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_code_job(job_id):
+    user_id = get_jwt_identity()
+    queue = current_app.extensions['execution_queue']
+    job = queue.get(job_id)
+    if not job or job["user_id"] != user_id:
+        return jsonify({"msg": "Job not found"}), 404
+
+    return jsonify(queue.public_view(job)), 200
+
+# Queue load and result cache hit/miss counters
+@code_bp.route('/code/stats', methods=['GET'])
+@jwt_required()
+def get_code_stats():
+    queue = current_app.extensions['execution_queue']
+    return jsonify({"queue": queue.stats(), "cache": result_cache.stats()}), 200
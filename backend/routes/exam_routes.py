@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Exam, ExamSubmission, User, Class
+from sqlalchemy.exc import IntegrityError
+from models import db, Exam, ExamSubmission, User, Class, PlagiarismReport
+from plagiarism_checker import check_plagiarism, index_submission, build_report, claim_report, report_status
+from utils.conditional import entity_etag, not_modified, with_validators, touch
+import chat_rooms
 from datetime import datetime
+import json
+import threading
 
 exam_bp = Blueprint('exam_bp', __name__)
 
@@ -94,17 +100,21 @@ def get_exam(exam_id):
     if exam.school_id != user.school_id:
         return jsonify({"msg": "Unauthorized to view this exam"}), 403
 
+    etag = entity_etag("exam", exam.id, exam.version)
+    if not_modified(etag, exam.updated_at):
+        return with_validators(make_response("", 304), etag, exam.updated_at)
+
     # Debugging: Log the exam being accessed
     print(f"Accessing exam {exam_id} for school_id: {user.school_id}")
 
-    return jsonify({
+    return with_validators(make_response(jsonify({
         "id": exam.id,
         "class_id": exam.class_id,
         "exam_title": exam.exam_title,
         "start_time": exam.start_time.isoformat(),
         "duration_minutes": exam.duration_minutes,
         "status": exam.status
-    }), 200
+    }), 200), etag, exam.updated_at)
 
 # Update a specific exam (only if it belongs to the user's school)
 @exam_bp.route('/exams/<int:exam_id>', methods=['PUT'])
@@ -138,7 +148,18 @@ def update_exam(exam_id):
     if 'status' in data:
         exam.status = data['status']
 
+    touch(exam)
     db.session.commit()
+    # Students waiting on the exam page learn about a new status or start time without refreshing
+    chat_rooms.publish('exam_updated', exam.class_id, {
+        "id": exam.id,
+        "class_id": exam.class_id,
+        "exam_title": exam.exam_title,
+        "start_time": exam.start_time.isoformat(),
+        "duration_minutes": exam.duration_minutes,
+        "status": exam.status,
+        "version": exam.version
+    })
     return jsonify({"msg": "Exam updated"}), 200
 
 # Delete a specific exam (only if it belongs to the user's school)
@@ -159,4 +180,117 @@ def delete_exam(exam_id):
 
     db.session.delete(exam)
     db.session.commit()
-    return jsonify({"msg": "Exam deleted"}), 200
\ No newline at end of file
+    return jsonify({"msg": "Exam deleted"}), 200
+
+# Submit answers (and optionally code) for an exam in the user's school
+@exam_bp.route('/exams/<int:exam_id>/submit', methods=['POST'])
+@jwt_required()
+def submit_exam(exam_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+
+    exam = Exam.query.get_or_404(exam_id)
+    if exam.school_id != user.school_id:
+        return jsonify({"msg": "Unauthorized to submit this exam"}), 403
+
+    data = request.get_json()
+    if not data or 'answers' not in data:
+        return jsonify({"msg": "answers are required"}), 400
+
+    code = data.get('code')
+    language = data.get('language', 'python')
+    if code and language not in ["python", "javascript"]:
+        return jsonify({"msg": f"Unsupported language: {language}"}), 400
+
+    plagiarism_score = None
+    if code:
+        plagiarism_score = check_plagiarism(
+            exam_id, code, language,
+            use_lsh=current_app.config.get('PLAGIARISM_USE_LSH', False)
+        )
+
+    submission = ExamSubmission(
+        exam_id=exam_id,
+        student_id=user.id,
+        answers_json=json.dumps(data['answers']),
+        code=code,
+        language=language if code else None,
+        submitted_at=datetime.utcnow()
+    )
+    try:
+        db.session.add(submission)
+        db.session.flush()
+        if code:
+            # Normal form and fingerprints are built once here, so later submissions only do index lookups
+            index_submission(submission)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"msg": "You have already submitted this exam"}), 409
+
+    return jsonify({
+        "msg": "Exam submitted",
+        "id": submission.id,
+        "plagiarism_score": plagiarism_score
+    }), 201
+
+def _run_report(app, exam_id):
+    """Builds the plagiarism report outside the request, in its own app context."""
+    with app.app_context():
+        build_report(exam_id)
+
+def _report_payload(report):
+    status = report_status(report)
+    payload = {
+        "exam_id": report.exam_id,
+        "status": status,
+        "submission_count": report.submission_count,
+        "created_at": report.created_at.isoformat() if report.created_at else None,
+        "completed_at": report.completed_at.isoformat() if report.completed_at else None
+    }
+    if status == "complete":
+        payload["report"] = json.loads(report.report_json)
+    return payload
+
+# Start computing the all-pairs plagiarism report of an exam (served from cache afterwards)
+@exam_bp.route('/exams/<int:exam_id>/plagiarism-report', methods=['POST'])
+@jwt_required()
+def create_plagiarism_report(exam_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+
+    exam = Exam.query.get_or_404(exam_id)
+    if exam.school_id != user.school_id:
+        return jsonify({"msg": "Unauthorized to view this exam"}), 403
+
+    refresh = request.args.get('refresh', 'false').lower() in ['true', '1']
+    # Only the request that claims the row starts a build; a stale one counts as failed and is claimed again
+    report, claimed = claim_report(exam_id, refresh)
+    if not claimed:
+        return jsonify(_report_payload(report)), 202 if report_status(report) == "pending" else 200
+
+    threading.Thread(target=_run_report, args=(current_app._get_current_object(), exam_id), daemon=True).start()
+    return jsonify({"exam_id": exam_id, "status": "pending"}), 202
+
+# Get the cached plagiarism report of an exam
+@exam_bp.route('/exams/<int:exam_id>/plagiarism-report', methods=['GET'])
+@jwt_required()
+def get_plagiarism_report(exam_id):
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"msg": "User not found"}), 404
+
+    exam = Exam.query.get_or_404(exam_id)
+    if exam.school_id != user.school_id:
+        return jsonify({"msg": "Unauthorized to view this exam"}), 403
+
+    report = PlagiarismReport.query.filter_by(exam_id=exam_id).first()
+    if not report:
+        return jsonify({"msg": "No plagiarism report yet, POST to start one"}), 404
+
+    return jsonify(_report_payload(report)), 200 if report_status(report) != "pending" else 202
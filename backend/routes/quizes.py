@@ -1,11 +1,26 @@
-from flask import request, jsonify, Blueprint
+from flask import request, jsonify, Blueprint, current_app, Response, make_response, stream_with_context
 from datetime import datetime
+import base64
 import json
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from models import db, Quiz, QuizQuestion, QuizSubmission, User
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from quiz_grading import (
+    regrade_quiz, cached_answer_key, invalidate_answer_key, score_answers, pack_answers, unpack_answers
+)
+from quiz_analytics import refresh_analytics
+from quiz_ingest import ingest_submission, SubmissionInProgress
+from quiz_export import EXPORT_FORMATS, submissions_query, stream_submissions
+from utils.conditional import entity_etag, not_modified, with_validators, touch
+from services.quiz_service import QuizService, QuizValidationError, MAX_IMPORT_QUESTIONS
 
 quiz_bp = Blueprint("quiz_bp", __name__)
 
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
 @quiz_bp.route("/quizzes", methods=["POST"])
 @jwt_required()  # Ensure the user is authenticated
 def create_quiz():
@@ -24,65 +39,138 @@ def create_quiz():
         return jsonify({"error": "Missing required fields"}), 400
 
     try:
-        # Create the quiz with the user's school_id
-        quiz = Quiz(quiz_title=quiz_title, class_id=class_id, school_id=user.school_id)
-        db.session.add(quiz)
+        # One transaction: the quiz and all its questions are created together or not at all
+        created = QuizService.create_quizzes(user.school_id, [data])[0]
         db.session.commit()
+        return jsonify({"message": "Quiz created successfully", **created}), 201
+    except QuizValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@quiz_bp.route("/quizzes/import", methods=["POST"])
+@jwt_required()  # Ensure the user is authenticated
+def import_quizzes():
+    """Create many quizzes at once from a JSON list or a question-bank CSV.
+
+    JSON: {"quizzes": [{quiz_title, class_id, questions}]} (or the bare list).
+    CSV: an uploaded "file" or a text/csv body with one row per question and
+    the columns quiz_title, class_id, question, option_1-4, correct_answer.
+    Nothing is created unless every quiz is valid.
+    """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
 
-        # Add questions to the quiz
-        for question_data in questions:
-            question = QuizQuestion(
-                quiz_id=quiz.id,
-                question=question_data["question"],
-                option_1=question_data["options"][0],
-                option_2=question_data["options"][1],
-                option_3=question_data["options"][2],
-                option_4=question_data["options"][3],
-                correct_answer=question_data["correctAnswer"],
-            )
-            db.session.add(question)
+    try:
+        upload = request.files.get("file")
+        if upload is not None and not upload.filename.lower().endswith(".json"):
+            quizzes = QuizService.parse_csv(upload.read().decode("utf-8-sig"))
+        elif upload is not None:
+            quizzes = json.load(upload)
+        elif request.mimetype == "text/csv":
+            quizzes = QuizService.parse_csv(request.get_data(as_text=True))
+        else:
+            quizzes = request.get_json(silent=True)
+        if isinstance(quizzes, dict):
+            quizzes = quizzes.get("quizzes")
+        if not isinstance(quizzes, list) or not quizzes:
+            return jsonify({"error": "Expected a non-empty list of quizzes"}), 400
+        question_count = sum(len(quiz.get("questions") or []) for quiz in quizzes if isinstance(quiz, dict))
+        if question_count > MAX_IMPORT_QUESTIONS:
+            return jsonify({"error": f"At most {MAX_IMPORT_QUESTIONS} questions can be imported at once"}), 400
 
+        created = QuizService.create_quizzes(user.school_id, quizzes)
         db.session.commit()
-        return jsonify({"message": "Quiz created successfully", "quiz_id": quiz.id}), 201
+        return jsonify({
+            "message": "Quizzes imported successfully",
+            "quizzes": created,
+            "question_count": question_count,
+        }), 201
+    except (QuizValidationError, UnicodeDecodeError, ValueError) as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+def _encode_cursor(created_at, quiz_id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{quiz_id}".encode()).decode()
+
+def _decode_cursor(cursor):
+    """Returns (created_at, id) of the last quiz of the previous page; raises ValueError if malformed."""
+    created_at, quiz_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(quiz_id)
+
+def _question_data(question):
+    return {
+        "id": question.id,
+        "question": question.question,
+        "options": [question.option_1, question.option_2, question.option_3, question.option_4],
+        "correct_answer": question.correct_answer,
+    }
+
 @quiz_bp.route("/quizzes", methods=["GET"])
 @jwt_required()  # Ensure the user is authenticated
 def get_all_quizzes():
-    """Get all quizzes for the logged-in user's school."""
+    """List the logged-in user's school quizzes, newest first, one page at a time.
+
+    By default each quiz is a summary with its question count. Pass
+    ?include=questions for the full questions. Pages hold ?limit= quizzes
+    (at most 100); pass the returned next_cursor as ?cursor= for the next page.
+    """
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
 
+    limit = min(max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    include_questions = request.args.get("include") == "questions"
+    filters = [Quiz.school_id == user.school_id]
+    if request.args.get("cursor"):
+        try:
+            filters.append(tuple_(Quiz.created_at, Quiz.id) < _decode_cursor(request.args["cursor"]))
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({"error": "Invalid cursor"}), 400
+    order = (Quiz.created_at.desc(), Quiz.id.desc())
+
     try:
-        quizzes = Quiz.query.filter_by(school_id=user.school_id).all()  # Filter by school_id
+        if include_questions:
+            # Questions of the whole page come from one extra SELECT ... IN query
+            quizzes = db.session.scalars(
+                select(Quiz).options(selectinload(Quiz.questions)).where(*filters).order_by(*order).limit(limit + 1)
+            ).all()
+            rows = [(quiz.id, quiz.quiz_title, quiz.class_id, quiz.created_at, len(quiz.questions)) for quiz in quizzes]
+        else:
+            rows = db.session.execute(
+                select(Quiz.id, Quiz.quiz_title, Quiz.class_id, Quiz.created_at, func.count(QuizQuestion.id))
+                .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+                .where(*filters)
+                .group_by(Quiz.id)
+                .order_by(*order)
+                .limit(limit + 1)
+            ).all()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
         quiz_list = []
-        for quiz in quizzes:
+        for index, (quiz_id, quiz_title, class_id, created_at, question_count) in enumerate(rows):
             quiz_data = {
-                "id": quiz.id,
-                "quiz_title": quiz.quiz_title,
-                "class_id": quiz.class_id,
-                "created_at": quiz.created_at.isoformat(),
-                "questions": [
-                    {
-                        "id": question.id,
-                        "question": question.question,
-                        "options": [
-                            question.option_1,
-                            question.option_2,
-                            question.option_3,
-                            question.option_4,
-                        ],
-                        "correct_answer": question.correct_answer,
-                    }
-                    for question in quiz.questions
-                ],
+                "id": quiz_id,
+                "quiz_title": quiz_title,
+                "class_id": class_id,
+                "created_at": created_at.isoformat(),
+                "question_count": question_count,
             }
+            if include_questions:
+                quiz_data["questions"] = [_question_data(question) for question in quizzes[index].questions]
             quiz_list.append(quiz_data)
-        return jsonify(quiz_list), 200
+
+        next_cursor = _encode_cursor(rows[-1][3], rows[-1][0]) if has_more else None
+        return jsonify({"quizzes": quiz_list, "next_cursor": next_cursor}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -99,15 +187,13 @@ def get_quiz(quiz_id):
     if not quiz:
         return jsonify({"error": "Quiz not found or unauthorized"}), 404
 
-    questions = []
-    for question in quiz.questions:
-        question_data = {
-            "id": question.id,
-            "question": question.question,
-            "options": [question.option_1, question.option_2, question.option_3, question.option_4],
-            "correct_answer": question.correct_answer,
-        }
-        questions.append(question_data)
+    # Refreshing clients are answered from the version stamp, before the questions are loaded
+    etag = entity_etag("quiz", quiz.id, quiz.version)
+    last_modified = quiz.updated_at or quiz.created_at
+    if not_modified(etag, last_modified):
+        return with_validators(make_response("", 304), etag, last_modified)
+
+    questions = [_question_data(question) for question in quiz.questions]
 
     quiz_data = {
         "id": quiz.id,
@@ -115,7 +201,7 @@ def get_quiz(quiz_id):
         "created_at": quiz.created_at.isoformat(),
         "questions": questions,
     }
-    return jsonify(quiz_data), 200
+    return with_validators(make_response(jsonify(quiz_data), 200), etag, last_modified)
 
 @quiz_bp.route("/quizzes/<int:quiz_id>/submissions", methods=["GET"])
 @jwt_required()  # Ensure the user is authenticated
@@ -132,6 +218,7 @@ def get_quiz_submissions(quiz_id):
             return jsonify({"error": "Quiz not found or unauthorized"}), 404
 
         submissions = QuizSubmission.query.filter_by(quiz_id=quiz_id).all()
+        question_ids = cached_answer_key(quiz_id).question_ids
         submission_list = []
         for submission in submissions:
             submission_list.append({
@@ -140,12 +227,48 @@ def get_quiz_submissions(quiz_id):
                 "quiz_id": submission.quiz_id,
                 "score": submission.score,
                 "submitted_at": submission.submitted_at.isoformat(),
-                "answers": json.loads(submission.answers_json),
+                "answers": (json.loads(submission.answers_json) if submission.answers_packed is None
+                            else unpack_answers(submission.answers_packed, question_ids)),
             })
         return jsonify({"submissions": submission_list}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _export_response(statement, filename):
+    export_format = request.args.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    # Rows are read and sent batch by batch while the response streams
+    return Response(
+        stream_with_context(stream_submissions(statement, export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+@quiz_bp.route("/quizzes/<int:quiz_id>/submissions/export", methods=["GET"])
+@jwt_required()  # Ensure the user is authenticated
+def export_quiz_submissions(quiz_id):
+    """Stream all submissions of a quiz as NDJSON (default) or CSV (?format=csv)."""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    quiz = Quiz.query.filter_by(id=quiz_id, school_id=user.school_id).first()
+    if not quiz:
+        return jsonify({"error": "Quiz not found or unauthorized"}), 404
+    return _export_response(submissions_query(user.school_id, quiz_id), f"quiz_{quiz_id}_submissions")
+
+@quiz_bp.route("/quizzes/submissions/export", methods=["GET"])
+@jwt_required()  # Ensure the user is authenticated
+def export_school_submissions():
+    """Stream the submissions of every quiz of the user's school as NDJSON or CSV."""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    return _export_response(submissions_query(user.school_id), f"school_{user.school_id}_submissions")
+
 @quiz_bp.route("/quizzes/<int:quiz_id>/submit", methods=["POST"])
 @jwt_required()  # Ensure the user is authenticated
 def submit_quiz(quiz_id):
@@ -163,33 +286,120 @@ def submit_quiz(quiz_id):
         if not student_id or not answers:
             return jsonify({"error": "Missing student_id or answers"}), 400
 
-        quiz = Quiz.query.filter_by(id=quiz_id, school_id=user.school_id).first()  # Ensure quiz belongs to the user's school
-        if not quiz:
+        key = cached_answer_key(quiz_id)
+        if not key or key.school_id != user.school_id:  # Ensure quiz belongs to the user's school
             return jsonify({"error": "Quiz not found or unauthorized"}), 404
 
-        questions = QuizQuestion.query.filter_by(quiz_id=quiz_id).all()
-        
-        score = 0
-        total_questions = len(questions)
-
-        for question in questions:
-            correct_answer = question.correct_answer
-            selected_answer = answers.get(str(question.id))  # Get the selected answer for this question
-
-            if selected_answer and selected_answer == correct_answer:
-                score += 1  
-
-        submission = QuizSubmission(
-            student_id=student_id,
-            quiz_id=quiz_id,
-            score=score,
-            submitted_at=datetime.utcnow(),
-            answers_json=json.dumps(answers),  # Store the answers as JSON
-        )
-        db.session.add(submission)
-        db.session.commit()
+        total_questions = len(key.question_ids)
+        row = {
+            "student_id": student_id,
+            "quiz_id": quiz_id,
+            "score": score_answers(answers, key),
+            "submitted_at": datetime.utcnow(),
+            "answers_packed": pack_answers(answers, key.question_ids),  # One byte per question
+        }
+        # Written with the next batch; the score is already known from the cached key
+        try:
+            score, created = ingest_submission(row, write_behind=current_app.config.get("QUIZ_WRITE_BEHIND", False))
+        except SubmissionInProgress as e:
+            return jsonify({"error": str(e)}), 409
+        if not created:
+            return jsonify({"message": "Quiz already submitted", "score": score, "total": total_questions}), 200
 
         return jsonify({"message": "Quiz submitted successfully", "score": score, "total": total_questions}), 201
     except Exception as e:
         db.session.rollback()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+@quiz_bp.route("/quizzes/<int:quiz_id>/questions/<int:question_id>", methods=["PATCH"])
+@jwt_required()  # Ensure the user is authenticated
+def update_quiz_question(quiz_id, question_id):
+    """Edit a question; fixing its correct answer regrades every submission."""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    quiz = Quiz.query.filter_by(id=quiz_id, school_id=user.school_id).first()  # Ensure quiz belongs to the user's school
+    if not quiz:
+        return jsonify({"error": "Quiz not found or unauthorized"}), 404
+    question = QuizQuestion.query.filter_by(id=question_id, quiz_id=quiz_id).first()
+    if not question:
+        return jsonify({"error": "Question not found"}), 404
+
+    data = request.get_json() or {}
+    correct_answer = data.get("correctAnswer", question.correct_answer)
+    options = data.get("options")
+    if not isinstance(correct_answer, int) or not 1 <= correct_answer <= 4:
+        return jsonify({"error": "correctAnswer must be an option number from 1 to 4"}), 400
+    if options is not None and (not isinstance(options, list) or len(options) != 4
+                                or not all(isinstance(option, str) for option in options)):
+        return jsonify({"error": "options must be a list of exactly 4 strings"}), 400
+
+    try:
+        if "question" in data:
+            question.question = data["question"]
+        if options is not None:
+            question.option_1, question.option_2, question.option_3, question.option_4 = options
+        key_changed = correct_answer != question.correct_answer
+        question.correct_answer = correct_answer
+        touch(quiz)
+        db.session.flush()
+
+        regrade = regrade_quiz(quiz_id) if key_changed else {"regraded": 0, "changed": 0}
+        db.session.commit()
+        invalidate_answer_key(quiz_id)
+        return jsonify({"message": "Question updated successfully", **regrade}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@quiz_bp.route("/quizzes/<int:quiz_id>/regrade", methods=["POST"])
+@jwt_required()  # Ensure the user is authenticated
+def regrade_quiz_submissions(quiz_id):
+    """Rescore all submissions of a quiz against its current answer key."""
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    quiz = Quiz.query.filter_by(id=quiz_id, school_id=user.school_id).first()  # Ensure quiz belongs to the user's school
+    if not quiz:
+        return jsonify({"error": "Quiz not found or unauthorized"}), 404
+
+    try:
+        regrade = regrade_quiz(quiz_id)
+        db.session.commit()
+        return jsonify({"message": "Quiz regraded successfully", **regrade}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@quiz_bp.route("/quizzes/<int:quiz_id>/analytics", methods=["GET"])
+@jwt_required()  # Ensure the user is authenticated
+def get_quiz_analytics(quiz_id):
+    """Per-question difficulty, discrimination and option counts, plus the score histogram.
+
+    Served from the quiz_analytics cache table, into which submissions that
+    arrived since the last request are folded first.
+    """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    quiz = Quiz.query.filter_by(id=quiz_id, school_id=user.school_id).first()  # Ensure quiz belongs to the user's school
+    if not quiz:
+        return jsonify({"error": "Quiz not found or unauthorized"}), 404
+
+    try:
+        row, report = refresh_analytics(quiz_id)
+        refreshed_at = row.refreshed_at
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Another request cached it first; this report is just as fresh
+        return jsonify({"quiz_id": quiz_id, "refreshed_at": refreshed_at.isoformat(), **report}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
@@ -13,6 +13,7 @@ from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from datetime import datetime, timedelta
 from models import User, School, Class, StudentsClasses, db
+from user_directory import invalidate_user
 import secrets
 from urllib.parse import quote_plus, urlencode
 
@@ -270,6 +271,7 @@ def profile(user_id):
         if 'username' in data:
             user.username = data['username']
         db.session.commit()
+        invalidate_user(user.id)  # Chats show the new name right away
         return jsonify({"msg": "Profile updated successfully."}), 200
 
 # ------------------------------------------------------------------------------
@@ -354,6 +356,7 @@ def update_user(user_id):
     if 'email' in data:
         user_to_update.email = data['email']
     db.session.commit()
+    invalidate_user(user_id)
 
     return jsonify({"msg": "User updated successfully."}), 200
 
@@ -377,6 +380,7 @@ def delete_user(user_id):
 
     db.session.delete(user_to_delete)
     db.session.commit()
+    invalidate_user(user_id)
     return jsonify({"msg": "User deleted successfully."}), 200
 
 # ------------------------------------------------------------------------------
@@ -412,6 +416,7 @@ def add_student_to_school(school_id):
 
     student.school_id = school_id
     db.session.commit()
+    invalidate_user(student.id)
     return jsonify({"msg": "Student assigned to school successfully."}), 200
 
 # ------------------------------------------------------------------------------
@@ -447,6 +452,7 @@ def add_educator_to_school(school_id):
 
     teacher.school_id = school_id
     db.session.commit()
+    invalidate_user(teacher.id)
     return jsonify({"msg": "Educator assigned to school successfully."}), 200
 
 # ------------------------------------------------------------------------------
@@ -0,0 +1,93 @@
+import csv
+import io
+from sqlalchemy import insert
+from models import db, Quiz, QuizQuestion
+
+MAX_IMPORT_QUESTIONS = 5000  # Per import request
+CSV_COLUMNS = ("quiz_title", "class_id", "question", "option_1", "option_2", "option_3", "option_4", "correct_answer")
+
+
+class QuizValidationError(ValueError):
+    """Raised for a malformed quiz payload; routes answer 400 with the message."""
+
+
+class QuizService:
+    @staticmethod
+    def _question_row(question_data, where):
+        if not isinstance(question_data, dict):
+            raise QuizValidationError(f"{where}: must be an object")
+        options = question_data.get("options")
+        correct_answer = question_data.get("correctAnswer")
+        if not question_data.get("question"):
+            raise QuizValidationError(f"{where}: question text is required")
+        if not isinstance(options, list) or len(options) != 4:
+            raise QuizValidationError(f"{where}: options must list exactly 4 options")
+        if isinstance(correct_answer, str) and correct_answer.strip().isdigit():
+            correct_answer = int(correct_answer)
+        if not isinstance(correct_answer, int) or not 1 <= correct_answer <= 4:
+            raise QuizValidationError(f"{where}: correctAnswer must be an option number from 1 to 4")
+        return {
+            "question": question_data["question"],
+            "option_1": options[0],
+            "option_2": options[1],
+            "option_3": options[2],
+            "option_4": options[3],
+            "correct_answer": correct_answer,
+        }
+
+    @staticmethod
+    def create_quizzes(school_id, quizzes):
+        """Creates quizzes with all their questions in the current transaction.
+
+        Every payload is validated before anything is written, then all quizzes
+        and all questions are inserted with one executemany INSERT each. Returns
+        [{"quiz_id", "question_ids"}] in payload order; the caller commits.
+        """
+        quiz_rows, question_rows = [], []
+        for number, quiz_data in enumerate(quizzes, start=1):
+            where = f"Quiz {number}"
+            if not isinstance(quiz_data, dict) or not isinstance(quiz_data.get("questions"), list):
+                raise QuizValidationError(f"{where}: must be an object with a list of questions")
+            if not quiz_data.get("quiz_title") or not quiz_data.get("class_id") or not quiz_data.get("questions"):
+                raise QuizValidationError(f"{where}: quiz_title, class_id and questions are required")
+            class_id = quiz_data["class_id"]
+            if isinstance(class_id, str) and class_id.strip().isdigit():
+                class_id = int(class_id)
+            if not isinstance(class_id, int):
+                raise QuizValidationError(f"{where}: class_id must be a number")
+            quiz_rows.append({"quiz_title": quiz_data["quiz_title"], "class_id": class_id, "school_id": school_id})
+            question_rows.append([
+                QuizService._question_row(question_data, f"{where}, question {index}")
+                for index, question_data in enumerate(quiz_data["questions"], start=1)
+            ])
+
+        quiz_ids = db.session.execute(
+            insert(Quiz).returning(Quiz.id, sort_by_parameter_order=True), quiz_rows
+        ).scalars().all()
+        rows = [dict(row, quiz_id=quiz_id) for quiz_id, questions in zip(quiz_ids, question_rows) for row in questions]
+        question_ids = iter(db.session.execute(
+            insert(QuizQuestion).returning(QuizQuestion.id, sort_by_parameter_order=True), rows
+        ).scalars().all())
+        return [
+            {"quiz_id": quiz_id, "question_ids": [next(question_ids) for _ in questions]}
+            for quiz_id, questions in zip(quiz_ids, question_rows)
+        ]
+
+    @staticmethod
+    def parse_csv(text):
+        """Groups question-bank CSV rows (see CSV_COLUMNS) into quiz payloads, in file order."""
+        reader = csv.DictReader(io.StringIO(text))
+        missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+        if missing:
+            raise QuizValidationError(f"CSV is missing columns: {', '.join(missing)}")
+
+        quizzes = {}
+        for row in reader:
+            key = (row["quiz_title"], row["class_id"])
+            quiz = quizzes.setdefault(key, {"quiz_title": row["quiz_title"], "class_id": row["class_id"], "questions": []})
+            quiz["questions"].append({
+                "question": row["question"],
+                "options": [row["option_1"], row["option_2"], row["option_3"], row["option_4"]],
+                "correctAnswer": row["correct_answer"],
+            })
+        return list(quizzes.values())
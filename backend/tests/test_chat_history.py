@@ -0,0 +1,138 @@
+import pytest
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from models import Chat, Class, User, db
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_chat_history_pages_by_id_cursor(app):
+    user = User(username='student', email='student@example.com', role='Student', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all(
+        Chat(class_id=1, school_id=1, sender_id=user.id, message=f'Message {i}', timestamp=datetime.utcnow())
+        for i in range(1, 8)
+    )
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    client = app.test_client()
+
+    newest = client.get('/chats/1?limit=3', headers=headers).json
+    assert [chat['message'] for chat in newest['chats']] == ['Message 7', 'Message 6', 'Message 5']
+    assert 'total' not in newest
+    older = client.get(f'/chats/1?limit=5&before={newest["next_cursor"]}&include_total=true', headers=headers).json
+    assert [chat['message'] for chat in older['chats']] == ['Message 4', 'Message 3', 'Message 2', 'Message 1']
+    assert (older['has_more'], older['next_cursor'], older['total']) == (False, None, 7)
+
+    caught_up = client.get(f'/chats/1?after={newest["chats"][1]["id"]}', headers=headers).json
+    assert [chat['message'] for chat in caught_up['chats']] == ['Message 7']
+
+def test_chat_page_is_one_query(app):
+    from sqlalchemy import event
+    from user_directory import user_cache
+    user_cache.clear()  # User ids restart with every test database
+    senders = [User(username=f'sender{i}', email=f'sender{i}@example.com', role='Student', school_id=1) for i in range(5)]
+    for sender in senders:
+        sender.set_password('password')
+    db.session.add_all(senders)
+    db.session.flush()
+    db.session.add_all(
+        Chat(class_id=1, school_id=1, sender_id=senders[i % 5].id, message=f'Message {i}', timestamp=datetime.utcnow())
+        for i in range(20)
+    )
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(senders[0].id))}'}
+    client = app.test_client()
+    client.get('/chats/1', headers=headers)  # Puts the requester in the user cache
+
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    response = client.get('/chats/1', headers=headers)
+    assert len(response.json['chats']) == 20
+    assert {chat['sender_name'] for chat in response.json['chats']} == {f'sender{i}' for i in range(5)}
+    assert len(statements) == 1
+
+def test_write_behind_chats_are_served_before_they_are_written(app, monkeypatch):
+    import chat_ingest
+    from utils.snowflake import SnowflakeGenerator
+    from user_directory import user_cache
+    user_cache.clear()  # User ids restart with every test database
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Class(id=1, school_id=1, name='Class', educator_id=user.id))
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    client = app.test_client()
+    app.config['CHAT_WRITE_BEHIND'] = True
+    monkeypatch.setattr(chat_ingest, 'chat_ids', SnowflakeGenerator(worker_id=0))
+    chat_ingest.chat_buffer.interval = 60  # Only written when flushed below
+
+    sent = [client.post('/chats', json={'class_id': 1, 'message': f'Message {i}'}, headers=headers).json['chat']
+            for i in range(3)]
+    assert [chat['id'] for chat in sent] == sorted(chat['id'] for chat in sent)
+    assert Chat.query.count() == 0
+    newest = client.get('/chats/1', headers=headers).json['chats']
+    assert [chat['message'] for chat in newest] == ['Message 2', 'Message 1', 'Message 0']
+
+    chat_ingest.chat_buffer.flush_now()
+    assert [chat.id for chat in Chat.query.order_by(Chat.id)] == [chat['id'] for chat in sent]
+    assert client.get('/chats/1', headers=headers).json['chats'] == newest
+
+def test_chats_written_right_away_use_autoincrement_ids(app):
+    from user_directory import user_cache
+    user_cache.clear()  # User ids restart with every test database
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Class(id=1, school_id=1, name='Class', educator_id=user.id))
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    client = app.test_client()
+
+    sent = [client.post('/chats', json={'class_id': 1, 'message': f'Message {i}'}, headers=headers).json['chat']['id']
+            for i in range(2)]
+    assert sent == [1, 2]
+
+def test_autoincrement_ids_continue_after_snowflake_ids(app, monkeypatch):
+    import chat_ingest
+    from utils.snowflake import SnowflakeGenerator
+    from user_directory import user_cache
+    user_cache.clear()  # User ids restart with every test database
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Class(id=1, school_id=1, name='Class', educator_id=user.id))
+    db.session.commit()
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    client = app.test_client()
+    app.config['CHAT_WRITE_BEHIND'] = True
+    monkeypatch.setattr(chat_ingest, 'chat_ids', SnowflakeGenerator(worker_id=0))
+    buffered = client.post('/chats', json={'class_id': 1, 'message': 'Buffered'}, headers=headers).json['chat']['id']
+    chat_ingest.chat_buffer.flush_now()
+
+    app.config['CHAT_WRITE_BEHIND'] = False  # Switched off again: back to autoincrement ids
+    direct = client.post('/chats', json={'class_id': 1, 'message': 'Direct'}, headers=headers).json['chat']['id']
+    assert direct > buffered
+    newest = client.get('/chats/1', headers=headers).json['chats']
+    assert [chat['message'] for chat in newest] == ['Direct', 'Buffered']
+
+def test_write_behind_requires_a_worker_id(monkeypatch):
+    monkeypatch.setenv('CHAT_WRITE_BEHIND', 'true')
+    monkeypatch.delenv('SNOWFLAKE_WORKER_ID', raising=False)
+    with pytest.raises(RuntimeError, match='SNOWFLAKE_WORKER_ID'):
+        create_app()
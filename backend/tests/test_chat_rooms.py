@@ -0,0 +1,68 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from models import User, Class, StudentsClasses, db
+from app import create_app, socketio  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _user(username, role):
+    user = User(username=username, email=f'{username}@example.com', role=role, school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+def test_chats_reach_only_the_class_room(app):
+    teacher = _user('teacher', 'Educator')
+    member = _user('member', 'Student')
+    outsider = _user('outsider', 'Student')
+    first = Class(school_id=1, name='First', educator_id=teacher.id)
+    second = Class(school_id=1, name='Second', educator_id=teacher.id)
+    db.session.add_all([first, second])
+    db.session.flush()
+    db.session.add_all([StudentsClasses(student_id=member.id, class_id=first.id),
+                        StudentsClasses(student_id=outsider.id, class_id=second.id)])
+    db.session.commit()
+
+    assert not socketio.test_client(app).is_connected()  # No token, no connection
+    member_socket = socketio.test_client(app, auth={'token': create_access_token(identity=str(member.id))})
+    outsider_socket = socketio.test_client(app, auth={'token': create_access_token(identity=str(outsider.id))})
+
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(teacher.id))}'}
+    response = app.test_client().post('/chats', json={'class_id': first.id, 'message': 'Hello'}, headers=headers)
+    assert response.status_code == 201
+
+    received = member_socket.get_received()
+    assert [(event['name'], event['args'][0]['message']) for event in received] == [('chat_message', 'Hello')]
+    assert outsider_socket.get_received() == []
+
+def test_chats_to_other_schools_classes_are_refused(app):
+    teacher = _user('teacher', 'Educator')
+    member = _user('member', 'Student')
+    own_class = Class(school_id=1, name='First', educator_id=teacher.id)
+    db.session.add(own_class)
+    db.session.flush()
+    db.session.add(StudentsClasses(student_id=member.id, class_id=own_class.id))
+    stranger = User(username='stranger', email='stranger@example.com', role='Student', school_id=2)
+    stranger.set_password('password')
+    db.session.add(stranger)
+    db.session.commit()
+    member_socket = socketio.test_client(app, auth={'token': create_access_token(identity=str(member.id))})
+
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(stranger.id))}'}
+    response = app.test_client().post('/chats', json={'class_id': own_class.id, 'message': 'Hi'}, headers=headers)
+    assert response.status_code == 403
+    assert member_socket.get_received() == []
+
+    stranger_socket = socketio.test_client(app, auth={'token': create_access_token(identity=str(stranger.id))})
+    stranger_socket.emit('join_class', {'class_id': str(own_class.id)})
+    assert [event['name'] for event in stranger_socket.get_received()] == ['error']
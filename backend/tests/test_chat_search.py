@@ -0,0 +1,67 @@
+import pytest
+from datetime import datetime
+from flask_jwt_extended import create_access_token
+from models import Chat, Class, StudentsClasses, User, db
+from user_directory import user_cache
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def headers(app):
+    user_cache.clear()  # User ids restart with every test database
+    teacher = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user = User(username='student', email='student@example.com', role='Student', school_id=1)
+    for member in (teacher, user):
+        member.set_password('password')
+    db.session.add_all([teacher, user])
+    db.session.flush()
+    for class_id in (1, 2):
+        db.session.add_all([Class(id=class_id, school_id=1, name=f'Class {class_id}', educator_id=teacher.id),
+                            StudentsClasses(student_id=user.id, class_id=class_id)])
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+def _send(client, headers, message, class_id=1):
+    return client.post('/chats', json={'class_id': class_id, 'message': message}, headers=headers).json['chat']['id']
+
+def test_search_ranks_and_pages_within_class(app, headers):
+    client = app.test_client()
+    _send(client, headers, 'The homework is due on Friday')
+    best = _send(client, headers, 'Homework homework homework: chapter three homework')
+    _send(client, headers, 'See you at lunch')
+    _send(client, headers, 'Homework for the other class', class_id=2)
+    db.session.add(Chat(class_id=1, school_id=2, sender_id=1, message='Homework at another school',
+                        timestamp=datetime.utcnow()))
+    db.session.commit()
+
+    first = client.get('/chats/1/search?q=homework&limit=1', headers=headers).json
+    assert [chat['id'] for chat in first['chats']] == [best]
+    assert first['chats'][0]['sender_name'] == 'student'
+    second = client.get(f'/chats/1/search?q=homework&limit=1&cursor={first["next_cursor"]}', headers=headers).json
+    assert [chat['message'] for chat in second['chats']] == ['The homework is due on Friday']
+    assert (second['has_more'], second['next_cursor']) == (False, None)
+
+    assert client.get('/chats/1/search?q=homework+"lunch', headers=headers).json['chats'] == []
+    assert client.get('/chats/1/search?q=', headers=headers).status_code == 400
+    assert client.get('/chats/1/search?q=homework&cursor=bogus', headers=headers).status_code == 400
+
+def test_search_index_follows_edits_and_deletes(app, headers):
+    client = app.test_client()
+    chat_id = _send(client, headers, 'Meet in room twelve')
+
+    client.put(f'/chats/message/{chat_id}', json={'message': 'Meet in the library'}, headers=headers)
+    assert client.get('/chats/1/search?q=twelve', headers=headers).json['chats'] == []
+    assert [chat['id'] for chat in client.get('/chats/1/search?q=library', headers=headers).json['chats']] == [chat_id]
+
+    client.delete(f'/chats/message/{chat_id}', headers=headers)
+    assert client.get('/chats/1/search?q=library', headers=headers).json['chats'] == []
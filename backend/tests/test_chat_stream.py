@@ -0,0 +1,114 @@
+import threading
+from datetime import datetime
+import pytest
+from flask_jwt_extended import create_access_token
+from models import Class, StudentsClasses, User, db
+from user_directory import user_cache
+from utils.event_feed import EventFeed
+from utils.snowflake import SnowflakeGenerator
+import chat_ingest
+import chat_rooms
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['CHAT_STREAM_KEEPALIVE'] = 0.05
+    app.config['CHAT_STREAM_DURATION'] = 0.4
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def token(app):
+    user_cache.clear()  # User ids restart with every test database
+    teacher = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user = User(username='student', email='student@example.com', role='Student', school_id=1)
+    for member in (teacher, user):
+        member.set_password('password')
+    db.session.add_all([teacher, user])
+    db.session.flush()
+    for class_id in (1,):
+        db.session.add_all([Class(id=class_id, school_id=1, name=f'Class {class_id}', educator_id=teacher.id),
+                            StudentsClasses(student_id=user.id, class_id=class_id)])
+    db.session.commit()
+    return create_access_token(identity=str(user.id))
+
+def _send(client, token, message):
+    response = client.post('/chats', json={'class_id': 1, 'message': message},
+                           headers={'Authorization': f'Bearer {token}'})
+    return response.json['chat']['id']
+
+def test_since_returns_only_newer_messages(app, token):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    first = _send(client, token, 'One')
+    _send(client, token, 'Two')
+    _send(client, token, 'Three')
+
+    page = client.get(f'/chats/1/since/{first}?limit=1', headers=headers).json
+    assert [chat['message'] for chat in page['chats']] == ['Two']
+    assert page['has_more']
+    rest = client.get(f'/chats/1/since/{page["last_id"]}', headers=headers).json
+    assert [chat['message'] for chat in rest['chats']] == ['Three']
+    caught_up = client.get(f'/chats/1/since/{rest["last_id"]}', headers=headers).json
+    assert (caught_up['chats'], caught_up['has_more'], caught_up['last_id']) == ([], False, rest['last_id'])
+
+def test_since_picks_up_a_message_another_worker_wrote_late(app, token, monkeypatch):
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    app.config['CHAT_WRITE_BEHIND'] = True
+    monkeypatch.setattr(chat_ingest, 'chat_ids', SnowflakeGenerator(worker_id=0))
+    other_worker = SnowflakeGenerator(worker_id=1)
+    late = {'id': other_worker.next_id(), 'class_id': 1, 'school_id': 1, 'sender_id': 1, 'message': 'Late',
+            'timestamp': datetime.utcnow()}  # Sent first, still in the other worker's buffer
+    mine = _send(client, token, 'Mine')
+    chat_ingest.chat_buffer.flush_now()
+
+    seen = client.get('/chats/1/since/0', headers=headers).json
+    assert ([chat['message'] for chat in seen['chats']], seen['last_id']) == (['Mine'], mine)
+    chat_ingest.insert_chats([late])  # The other worker's batch lands after the poll read past its id
+    again = client.get(f'/chats/1/since/{mine}', headers=headers).json
+    assert [chat['message'] for chat in again['chats']] == ['Late', 'Mine']  # The client already has Mine
+    assert (again['has_more'], again['last_id']) == (False, mine)
+
+def test_stream_catches_up_then_forwards_class_events(app, token):
+    client = app.test_client()
+    first = _send(client, token, 'Before the stream')
+    timer = threading.Timer(0.1, chat_rooms.publish, ('chat_updated', 1, {'id': first, 'message': 'Edited'}))
+    timer.start()
+
+    response = client.get(f'/chats/1/stream?last_id=0&jwt={token}')
+    body = response.get_data(as_text=True)
+    timer.join()
+
+    assert response.mimetype == 'text/event-stream'
+    assert f'id: {first}\nevent: chat_message\n' in body
+    assert 'event: chat_updated\ndata: {"id": %d, "message": "Edited"}' % first in body
+    assert body.count('event: chat_message') == 1
+    assert ': keepalive' in body
+
+def test_stream_is_refused_outside_the_class(app, token):
+    stranger = User(username='stranger', email='stranger@example.com', role='Student', school_id=2)
+    stranger.set_password('password')
+    db.session.add(stranger)
+    db.session.commit()
+    response = app.test_client().get(f'/chats/1/stream?jwt={create_access_token(identity=str(stranger.id))}')
+    assert response.status_code == 403
+
+def test_event_feed_waits_per_topic_and_reports_gaps():
+    feed = EventFeed(backlog=2)
+    position = feed.position('a')
+    assert feed.wait('a', position, timeout=0.01) == (0, [])
+
+    threading.Timer(0.05, feed.publish, ('a', 'chat_message', {'id': 1})).start()
+    assert feed.wait('a', position, timeout=5) == (1, [('chat_message', {'id': 1})])
+
+    for i in range(2, 5):
+        feed.publish('a', 'chat_message', {'id': i})
+    assert feed.wait('a', 1, timeout=0) == (4, None)  # Event 2 already fell out of the backlog
+    assert feed.wait('a', 2, timeout=0) == (4, [('chat_message', {'id': 3}), ('chat_message', {'id': 4})])
@@ -0,0 +1,182 @@
+import json
+import shutil
+import threading
+import pytest
+import code_execution
+from code_execution import (
+    execute_code, run_test_cases, InterpreterPool, WorkerCrashed, MAX_OUTPUT_BYTES, FILE_SIZE_LIMIT_BYTES
+)
+from utils.cache import TTLCache
+
+requires_node = pytest.mark.skipif(shutil.which("node") is None, reason="node is not installed")
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    code_execution.result_cache.clear()
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_execute_python(use_pool):
+    result = execute_code("python", "name = input()\nprint(f'Hello, {name}!')", stdin="Ada", use_pool=use_pool)
+    assert result == {"output": "Hello, Ada!\n", "error": None, "exit_code": 0}
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_execute_python_error(use_pool):
+    result = execute_code("python", "1 / 0", use_pool=use_pool)
+    assert result["exit_code"] == 1
+    assert "ZeroDivisionError" in result["error"]
+
+def test_execute_timeout():
+    assert execute_code("python", "while True: pass", timeout=1) == {"error": "Code execution timed out"}
+
+def test_execute_unsupported_language():
+    assert execute_code("ruby", "puts 1") == {"error": "Unsupported language: ruby"}
+
+def test_pool_isolates_runs():
+    pool = InterpreterPool("python", size=1)
+    try:
+        pool.run("import sys; sys.leaked = True; secret = 1")
+        result = pool.run("import sys; print(hasattr(sys, 'leaked'), 'secret' in globals())")
+        assert result["stdout"] == "False False\n"
+    finally:
+        pool.close()
+
+FORGE = """
+import os, re, sys
+forged = '{"id": "%s", "results": [{"stdout": "forged", "stderr": "", "exit_code": 0, "timed_out": false, "elapsed_ms": 0}]}\\n'
+# Look for the request id anywhere on the stack, in frame locals and module globals
+ids = set()
+frame = sys._getframe()
+while frame:
+    for scope in (frame.f_locals, frame.f_globals):
+        for value in list(scope.values()):
+            for item in (value.values() if isinstance(value, dict) else [value]):
+                if isinstance(item, (str, bytes)) and re.search(r"[0-9a-f]{16}", str(item)):
+                    ids.add(str(item))
+    frame = frame.f_back
+written = 0
+paths = [fd for fd in range(3, 64)]
+try:
+    paths += [f"/proc/{os.getppid()}/fd/{fd}" for fd in os.listdir(f"/proc/{os.getppid()}/fd")]
+except OSError:
+    pass
+for target in paths:
+    try:
+        fd = target if isinstance(target, int) else os.open(target, os.O_WRONLY)
+        for request_id in ids or [""]:
+            os.write(fd, (forged % request_id).encode())
+        written += 1
+    except OSError:
+        pass
+print(sorted(ids), written)
+"""
+
+def test_student_code_cannot_reach_the_worker_protocol():
+    pool = InterpreterPool("python", size=1)
+    try:
+        assert pool.run(FORGE)["stdout"] == "[] 0\n"
+        assert pool.run("print('hello from next run')")["stdout"] == "hello from next run\n"
+    finally:
+        pool.close()
+
+def test_pool_recovers_from_crashed_worker():
+    pool = InterpreterPool("python", size=1)
+    try:
+        worker = pool._new_worker()
+        pool._idle.put(worker)
+        threading.Timer(0.3, worker.process.kill).start()
+        with pytest.raises(WorkerCrashed):
+            pool.run("import time; time.sleep(3)")
+        assert pool.run("print('ok')")["stdout"] == "ok\n"
+    finally:
+        pool.close()
+
+@requires_node
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_execute_javascript(use_pool):
+    code = "process.stdin.on('data', d => console.log(String(d).trim().toUpperCase()))"
+    result = execute_code("javascript", code, stdin="hi", use_pool=use_pool)
+    assert result == {"output": "HI\n", "error": None, "exit_code": 0}
+
+DOUBLE_CASES = [
+    {"stdin": "2\n", "expected_output": "4\n"},
+    {"stdin": "5", "expected_output": "10  \n\n"},
+    {"stdin": "3", "expected_output": "7"},
+]
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_run_test_cases_python(use_pool):
+    result = run_test_cases("python", "print(int(input()) * 2)", DOUBLE_CASES, use_pool=use_pool)
+    assert result["passed"] == [True, True, False]
+    assert (result["score"], result["total"]) == (2, 3)
+    assert "output" not in result["cases"][0]
+    assert result["cases"][2]["output"] == "6\n"
+
+def test_run_test_cases_timeouts_are_per_case():
+    code = "n = int(input())\nwhile n == 5: pass\nprint(n * 2)"
+    result = run_test_cases("python", code, DOUBLE_CASES, timeout=0.5)
+    assert result["passed"] == [True, False, False]
+    assert [case["timed_out"] for case in result["cases"]] == [False, True, False]
+
+def test_run_test_cases_syntax_error_fails_every_case():
+    result = run_test_cases("python", "def (", DOUBLE_CASES)
+    assert result["passed"] == [False, False, False]
+    assert "SyntaxError" in result["cases"][0]["error"]
+
+@requires_node
+def test_run_test_cases_javascript_isolates_cases():
+    code = "globalThis.runs = (globalThis.runs || 0) + 1\n" \
+           "console.log(Number(require('fs').readFileSync(0, 'utf8')) * 2 * runs)"
+    result = run_test_cases("javascript", code, DOUBLE_CASES)
+    assert result["passed"] == [True, True, False]
+
+@requires_node
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_run_test_cases_javascript_cannot_forge_results(use_pool):
+    forged = {"results": [{"stdout": "4\n", "stderr": "", "exit_code": 0, "timed_out": False, "elapsed_ms": 0}] * 3}
+    code = f"require('fs').writeSync(1, '\\n' + JSON.stringify({json.dumps(forged)}) + '\\n'); require('process').exit(0)"
+    result = run_test_cases("javascript", code, DOUBLE_CASES, use_pool=use_pool)
+    assert result["passed"] == [False, False, False]
+
+@pytest.mark.parametrize("use_pool", [True, False])
+def test_runaway_output_is_truncated(use_pool):
+    result = execute_code("python", "while True: print('x' * 100)", use_pool=use_pool)
+    assert result["truncated"]
+    assert result["output"].endswith("[output truncated]\n")
+    assert len(result["output"]) <= MAX_OUTPUT_BYTES + 100
+
+def test_file_size_limit():
+    result = execute_code("python", f"open('big', 'w').write('a' * {2 * FILE_SIZE_LIMIT_BYTES})")
+    assert "File too large" in result["error"]
+
+def test_scratch_directory_is_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(code_execution, "SCRATCH_ROOT", str(tmp_path))
+    result = execute_code("python", "open('notes.txt', 'w').write('hi')\nprint('ok')", use_pool=False)
+    assert result["output"] == "ok\n"
+    assert list(tmp_path.iterdir()) == []
+
+def test_identical_runs_are_cached():
+    stats = code_execution.result_cache.stats()
+    code = "import random; print(random.random())"
+    first = execute_code("python", code)
+    assert execute_code("python", code) == first
+    assert execute_code("python", code, stdin="other input") != first
+    after = code_execution.result_cache.stats()
+    assert (after["hits"] - stats["hits"], after["misses"] - stats["misses"]) == (1, 2)
+    assert execute_code("python", code, cache=False) != first
+
+def test_timeouts_are_not_cached():
+    execute_code("python", "while True: pass", timeout=0.5)
+    assert code_execution.result_cache.stats()["entries"] == 0
+
+def test_ttl_cache_bounds():
+    cache = TTLCache(max_entries=2, ttl=60, max_bytes=10, sizeof=len)
+    cache.put("a", "1234")
+    cache.put("b", "1234")
+    assert cache.get("a") == "1234"  # "a" is now the most recently used
+    cache.put("c", "1234")
+    assert cache.get("b") is None and cache.get("a") == "1234"
+    cache.put("d", "12345678")
+    assert cache.stats()["bytes"] <= 10
+    expired = TTLCache(ttl=0)
+    expired.put("a", 1)
+    assert expired.get("a") is None
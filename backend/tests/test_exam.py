@@ -1,8 +1,9 @@
 import pytest
+from datetime import datetime
 from flask import Flask, jsonify
 from flask.testing import FlaskClient
 from flask_jwt_extended import create_access_token, JWTManager
-from models import User, Exam, Class, db
+from models import User, Exam, Class, Quiz, QuizQuestion, db
 from app import create_app  # Assuming you have a create_app function in your app.py
 
 @pytest.fixture
@@ -39,6 +40,18 @@ def jwt_token(app):
         access_token = create_access_token(identity=user.id, additional_claims={"role": user.role})
         return access_token
 
+@pytest.fixture
+def headers(app):
+    from user_directory import user_cache
+    user_cache.clear()  # User ids restart with every test database
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Class(id=1, name='Test Class', school_id=1, educator_id=user.id))
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
 def test_get_exams(client, jwt_token):
     # Add a test exam
     exam = Exam(
@@ -150,4 +163,50 @@ def test_delete_exam(client, jwt_token):
 
     # Verify the exam was deleted
     deleted_exam = Exam.query.get(exam.id)
-    assert deleted_exam is None
\ No newline at end of file
+    assert deleted_exam is None
+
+def test_get_exam_conditional(client, headers):
+    exam = Exam(
+        class_id=1,
+        exam_title='Test Exam',
+        start_time=datetime(2023, 10, 1, 10),
+        duration_minutes=60,
+        status='scheduled',
+        school_id=1
+    )
+    db.session.add(exam)
+    db.session.commit()
+
+    first = client.get(f'/exams/{exam.id}', headers=headers)
+    etag = first.headers['ETag']
+    cached = client.get(f'/exams/{exam.id}', headers={**headers, 'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+
+    # Any update moves the exam to a new version
+    client.put(f'/exams/{exam.id}', json={'status': 'in_progress'}, headers=headers)
+    refreshed = client.get(f'/exams/{exam.id}', headers={**headers, 'If-None-Match': etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers['ETag'] != etag
+    assert refreshed.json['status'] == 'in_progress'
+
+def test_get_quiz_conditional(client, headers):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    question = QuizQuestion(quiz_id=quiz.id, question='1 + 1', option_1='1', option_2='2', option_3='3',
+                            option_4='4', correct_answer=2)
+    db.session.add(question)
+    db.session.commit()
+
+    first = client.get(f'/quizzes/{quiz.id}', headers=headers)
+    etag = first.headers['ETag']
+    cached = client.get(f'/quizzes/{quiz.id}', headers={**headers, 'If-None-Match': etag})
+    assert (cached.status_code, cached.data) == (304, b'')
+
+    # Editing a question moves the quiz to a new version
+    client.patch(f'/quizzes/{quiz.id}/questions/{question.id}', json={'question': 'One plus one'}, headers=headers)
+    refreshed = client.get(f'/quizzes/{quiz.id}', headers={**headers, 'If-None-Match': etag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers['ETag'] != etag
+    assert refreshed.json['questions'][0]['question'] == 'One plus one'
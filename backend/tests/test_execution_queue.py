@@ -0,0 +1,108 @@
+import threading
+import pytest
+from execution_queue import ExecutionQueue, QueueFull
+
+def run_all(queue, expected):
+    finished = threading.Semaphore(0)
+    order = []
+
+    def on_complete(job):
+        order.append(job["result"]["output"].strip())
+        finished.release()
+
+    queue.on_complete = on_complete
+    return order, lambda: all(finished.acquire(timeout=10) for _ in range(expected))
+
+def test_jobs_run_off_the_request_thread():
+    queue = ExecutionQueue(concurrency=1)
+    order, wait = run_all(queue, 1)
+    job = queue.submit(1, "python", "print(input())", stdin="queued")
+    assert job["status"] == "queued"
+    assert wait()
+    assert queue.get(job["id"])["status"] == "done"
+    assert order == ["queued"]
+
+def test_users_are_served_round_robin():
+    queue = ExecutionQueue(concurrency=1, max_per_user=5)
+    order, wait = run_all(queue, 4)
+    for i in range(3):
+        queue.submit("busy", "python", f"print('busy{i}')")
+    queue.submit("quiet", "python", "print('quiet')")
+    assert wait()
+    assert order.index("quiet") < order.index("busy2")
+
+def test_test_case_jobs():
+    queue = ExecutionQueue(concurrency=1)
+    finished = threading.Event()
+    queue.on_complete = lambda job: finished.set()
+    cases = [{"stdin": "1", "expected_output": "1"}, {"stdin": "2", "expected_output": "3"}]
+    job = queue.submit(1, "python", "print(input())", cases=cases)
+    assert finished.wait(10)
+    assert queue.public_view(job)["kind"] == "test"
+    assert job["result"]["passed"] == [True, False]
+
+def test_backpressure():
+    queue = ExecutionQueue(concurrency=0, max_depth=2, max_per_user=1)  # No workers: jobs stay queued
+    queue.submit("a", "python", "print(1)")
+    with pytest.raises(QueueFull):
+        queue.submit("a", "python", "print(1)")
+    queue.submit("b", "python", "print(1)")
+    with pytest.raises(QueueFull):
+        queue.submit("c", "python", "print(1)")
+    assert queue.stats()["queued"] == 2
+
+def test_job_results_reach_only_their_submitter():
+    from flask_jwt_extended import create_access_token
+    from models import User, db
+    from app import create_app, socketio  # Assuming you have a create_app function in your app.py
+
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    with app.app_context():
+        db.create_all()
+        try:
+            users = [User(username=name, email=f'{name}@example.com', role='Student', school_id=1) for name in ('owner', 'other')]
+            for user in users:
+                user.set_password('password')
+            db.session.add_all(users)
+            db.session.commit()
+            tokens = [create_access_token(identity=str(user.id)) for user in users]
+
+            response = app.test_client().post('/code/jobs', json={'language': 'python', 'code': 'print(1)'},
+                                              headers={'Authorization': f'Bearer {tokens[0]}'})
+            job_id = response.json['job_id']
+            other = socketio.test_client(app, auth={'token': tokens[1]})
+            other.emit('subscribe_job', {'job_id': job_id})
+            assert [event['args'][0]['status'] for event in other.get_received()] == ['unknown']
+            owner = socketio.test_client(app, auth={'token': tokens[0]})
+            owner.emit('subscribe_job', {'job_id': job_id})
+            assert 'unknown' not in [event['args'][0].get('status') for event in owner.get_received()]
+        finally:
+            db.drop_all()
+
+def test_other_workers_see_jobs_through_the_database():
+    from models import db
+    from app import create_app  # Assuming you have a create_app function in your app.py
+
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    with app.app_context():
+        db.create_all()
+        try:
+            submitted_to, other_worker = ExecutionQueue(concurrency=1), ExecutionQueue(concurrency=0)
+            for queue in (submitted_to, other_worker):
+                queue.init_app(app)
+            finished = threading.Event()
+            submitted_to.on_complete = lambda job: finished.set()
+            job = submitted_to.submit("7", "python", "print(input())", stdin="shared")
+            assert other_worker.get(job["id"])["user_id"] == "7"
+            assert finished.wait(10)
+
+            seen = other_worker.get(job["id"])
+            assert other_worker.public_view(seen) == submitted_to.public_view(job)
+            assert seen["result"]["output"] == "shared\n"
+            assert other_worker.get("missing") is None
+        finally:
+            db.drop_all()
@@ -0,0 +1,150 @@
+import pytest
+from datetime import datetime
+from models import Exam, ExamSubmission, PlagiarismReport, db
+from code_normalizer import normalize_code, pack_tokens, unpack_tokens
+from plagiarism_checker import (
+    fingerprint, check_plagiarism, index_submission,
+    minhash_signature, pack_signature, unpack_signature, estimate_similarity, lsh_buckets,
+    all_pairs_report, build_report, claim_report, report_status, REPORT_TIMEOUT
+)
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+ORIGINAL = """
+def total(items):
+    result = 0
+    for item in items:
+        result += item
+    return result
+"""
+
+RENAMED = """
+def add_all(values):  # my own solution
+    acc = 0
+    for v in values:
+        acc += v
+    return acc
+"""
+
+UNRELATED = """
+const greet = (name) => `Hello, ${name}!`;
+console.log(greet("world"));
+"""
+
+ORIGINAL_TOKENS = normalize_code(ORIGINAL)
+UNRELATED_TOKENS = normalize_code(UNRELATED, "javascript")
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def add_submission(exam_id, student_id, code, language='python'):
+    submission = ExamSubmission(exam_id=exam_id, student_id=student_id, answers_json='{}', code=code, language=language)
+    db.session.add(submission)
+    db.session.flush()
+    index_submission(submission)
+    db.session.commit()
+    return submission
+
+def test_normalize_code_ignores_names_comments_and_whitespace():
+    assert normalize_code(RENAMED) == ORIGINAL_TOKENS
+    assert normalize_code(ORIGINAL.replace("    ", "\t")) == ORIGINAL_TOKENS
+    assert normalize_code("let a = 1; // one", "javascript") == normalize_code("let b=2 /* two */;", "javascript")
+
+def test_normalize_code_survives_syntax_errors():
+    assert normalize_code('def broken(:\n    "unterminated')
+    assert unpack_tokens(pack_tokens(ORIGINAL_TOKENS)) == ORIGINAL_TOKENS
+
+def test_fingerprint_empty_code():
+    assert fingerprint([]) == set()
+    assert fingerprint(normalize_code(None)) == set()
+
+def test_fingerprint_overlap():
+    copied = fingerprint(normalize_code(ORIGINAL + "\nprint(total([1, 2]))"))
+    assert len(fingerprint(ORIGINAL_TOKENS) & copied) > len(fingerprint(ORIGINAL_TOKENS) & fingerprint(UNRELATED_TOKENS))
+
+def test_minhash_signature_roundtrip():
+    signature = minhash_signature(fingerprint(ORIGINAL_TOKENS))
+    assert unpack_signature(pack_signature(signature)) == signature
+    assert minhash_signature(set()) is None
+
+def test_minhash_estimates_similarity():
+    signature = minhash_signature(fingerprint(ORIGINAL_TOKENS))
+    extended = minhash_signature(fingerprint(normalize_code(ORIGINAL + "print(total([1]))")))
+    assert estimate_similarity(signature, signature) == 1.0
+    assert estimate_similarity(signature, minhash_signature(fingerprint(UNRELATED_TOKENS))) < 0.2
+    assert set(lsh_buckets(signature)) & set(lsh_buckets(extended))
+
+def test_all_pairs_report_clusters_copies():
+    submissions = [(1, 10, ORIGINAL_TOKENS), (2, 11, UNRELATED_TOKENS), (3, 12, normalize_code(RENAMED))]
+    report = all_pairs_report(submissions, threshold=80, workers=2)
+
+    assert report["matrix"][0][0] == 100
+    assert report["matrix"][0][2] == report["matrix"][2][0] >= 80
+    assert report["matrix"][0][1] < 80
+    assert report["clusters"] == [{"submission_ids": [1, 3], "student_ids": [10, 12], "max_score": report["matrix"][0][2]}]
+
+def test_check_plagiarism_uses_index(app):
+    exam = Exam(class_id=1, school_id=1, exam_title='Test Exam', start_time=datetime(2023, 10, 1, 10, 0), duration_minutes=60, status='scheduled')
+    db.session.add(exam)
+    db.session.commit()
+
+    add_submission(exam.id, 1, ORIGINAL)
+    add_submission(exam.id, 2, UNRELATED, 'javascript')
+
+    assert check_plagiarism(exam.id, ORIGINAL) == 100
+    assert check_plagiarism(exam.id, RENAMED) == 100
+    assert check_plagiarism(exam.id, "x = 1") == 0
+    assert check_plagiarism(exam.id, ORIGINAL, use_lsh=True) == 100
+    assert check_plagiarism(exam.id, ORIGINAL, use_lsh=True, all_exams=True) == 100
+
+def test_stale_pending_report_counts_as_failed():
+    fresh = PlagiarismReport(exam_id=1, status="pending", created_at=datetime.utcnow())
+    stale = PlagiarismReport(exam_id=2, status="pending", created_at=datetime.utcnow() - 2 * REPORT_TIMEOUT)
+    assert (report_status(fresh), report_status(stale)) == ("pending", "failed")
+
+def test_only_one_caller_claims_a_report(app):
+    exam = Exam(class_id=1, school_id=1, exam_title='Test Exam', start_time=datetime(2023, 10, 1, 10, 0), duration_minutes=60, status='scheduled')
+    db.session.add(exam)
+    db.session.commit()
+    add_submission(exam.id, 1, ORIGINAL)
+
+    assert claim_report(exam.id)[1]
+    assert not claim_report(exam.id, refresh=True)[1]  # Already pending: a second build is not started
+    assert build_report(exam.id, workers=1).status == "complete"
+    assert not claim_report(exam.id)[1]
+    report, claimed = claim_report(exam.id, refresh=True)
+    assert (claimed, report.status) == (True, "pending")
+
+    report.created_at = datetime.utcnow() - 2 * REPORT_TIMEOUT  # The build that claimed it died
+    db.session.commit()
+    assert claim_report(exam.id)[1]
+    assert PlagiarismReport.query.count() == 1
+
+def test_concurrent_report_requests_start_one_build(app, monkeypatch):
+    from flask_jwt_extended import create_access_token
+    from models import Class, User
+    import routes.exam_routes as exam_routes
+    teacher = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    teacher.set_password('password')
+    db.session.add(teacher)
+    db.session.flush()
+    db.session.add(Class(id=1, school_id=1, name='Class', educator_id=teacher.id))
+    exam = Exam(class_id=1, school_id=1, exam_title='Test Exam', start_time=datetime(2023, 10, 1, 10, 0), duration_minutes=60, status='scheduled')
+    db.session.add(exam)
+    db.session.commit()
+    builds = []
+    monkeypatch.setattr(exam_routes, '_run_report', lambda app, exam_id: builds.append(exam_id))
+    headers = {'Authorization': f'Bearer {create_access_token(identity=str(teacher.id))}'}
+    client = app.test_client()
+
+    responses = [client.post(f'/exams/{exam.id}/plagiarism-report', headers=headers) for _ in range(2)]
+    assert [response.status_code for response in responses] == [202, 202]
+    assert [response.json['status'] for response in responses] == ['pending', 'pending']
+    assert builds == [exam.id]
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from flask_jwt_extended import create_access_token
+from models import Class, Quiz, QuizAnalytics, QuizQuestion, User, db
+from user_directory import user_cache
+import quiz_analytics
+from quiz_analytics import empty_sums, accumulate, analytics_report
+from quiz_grading import answer_key_cache
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+KEY = np.array([1, 2, 3])
+ANSWERS = np.array([
+    [1, 2, 3],
+    [1, 2, 4],
+    [1, 0, 1],
+    [2, 1, 1],
+    [1, 2, 3],
+])
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+@pytest.fixture
+def headers(app):
+    user_cache.clear()  # User ids restart with every test database
+    answer_key_cache.clear()  # So do quiz ids
+    teacher = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    teacher.set_password('password')
+    db.session.add(teacher)
+    db.session.flush()
+    db.session.add(Class(id=1, school_id=1, name='Class', educator_id=teacher.id))
+    db.session.commit()
+    return {'Authorization': f'Bearer {create_access_token(identity=str(teacher.id))}'}
+
+@pytest.fixture
+def quiz(headers):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    db.session.add_all(QuizQuestion(quiz_id=quiz.id, question=f'Question {i}', option_1='a', option_2='b', option_3='c',
+                                    option_4='d', correct_answer=i) for i in (1, 2))
+    db.session.commit()
+    return quiz
+
+def test_analytics_endpoint_caches_folds_in_and_recomputes(app, headers, quiz, monkeypatch):
+    client = app.test_client()
+    first, second = [question.id for question in quiz.questions]
+
+    def submit(student_id, answers):
+        response = client.post(f'/quizzes/{quiz.id}/submit', headers=headers,
+                               json={'student_id': student_id, 'answers': dict(zip((first, second), answers))})
+        assert response.status_code == 201
+
+    folded = []  # Submissions in each batch that is added to the sums
+
+    def counting_accumulate(sums, matrix, key):
+        folded.append(len(matrix))
+        return accumulate(sums, matrix, key)
+
+    monkeypatch.setattr(quiz_analytics, 'accumulate', counting_accumulate)
+    submit(1, (1, 2))
+    submit(2, (1, 1))
+
+    report = client.get(f'/quizzes/{quiz.id}/analytics', headers=headers).json
+    assert (report['submission_count'], folded) == (2, [2])
+    assert [question['difficulty'] for question in report['questions']] == [100.0, 50.0]
+    row = QuizAnalytics.query.filter_by(quiz_id=quiz.id).one()
+    assert row.submission_count == 2
+
+    client.get(f'/quizzes/{quiz.id}/analytics', headers=headers)
+    assert folded == [2]  # Nothing new: served from the cached sums
+
+    submit(3, (2, 2))
+    report = client.get(f'/quizzes/{quiz.id}/analytics', headers=headers).json
+    assert (report['submission_count'], folded) == (3, [2, 1])  # Only the new submission is folded in
+    assert [question['difficulty'] for question in report['questions']] == [66.7, 66.7]
+
+    client.patch(f'/quizzes/{quiz.id}/questions/{first}', json={'correctAnswer': 2}, headers=headers)
+    report = client.get(f'/quizzes/{quiz.id}/analytics', headers=headers).json
+    assert (report['submission_count'], folded) == (3, [2, 1, 3])  # A new key recomputes everything
+    assert [question['difficulty'] for question in report['questions']] == [33.3, 66.7]
+    assert QuizAnalytics.query.count() == 1
+
+def test_batches_add_up_to_a_full_recompute():
+    full = accumulate(empty_sums(3), ANSWERS, KEY)
+    incremental = accumulate(accumulate(empty_sums(3), ANSWERS[:2], KEY), ANSWERS[2:], KEY)
+    assert incremental == full
+
+def test_analytics_report():
+    report = analytics_report(accumulate(empty_sums(3), ANSWERS, KEY), [10, 11, 12])
+    assert report["submission_count"] == 5
+    assert report["score_histogram"] == [1, 1, 1, 2]
+    first = report["questions"][0]
+    assert (first["question_id"], first["difficulty"]) == (10, 80.0)
+    assert report["questions"][1]["options"] == {"1": 1, "2": 3, "3": 0, "4": 0, "unanswered": 1}
+
+def test_discrimination_is_item_total_correlation():
+    report = analytics_report(accumulate(empty_sums(3), ANSWERS, KEY), [10, 11, 12])
+    correct = ANSWERS == KEY
+    totals = correct.sum(axis=1)
+    for index, question in enumerate(report["questions"]):
+        assert question["discrimination"] == round(float(np.corrcoef(correct[:, index], totals)[0, 1]), 3)
@@ -0,0 +1,43 @@
+import json
+import pytest
+from models import Quiz, QuizSubmission, db
+from quiz_export import EXPORT_BATCH, submissions_query, stream_submissions
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def _seed(count):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    other = Quiz(class_id=1, school_id=2, quiz_title='Other School')
+    db.session.add_all([quiz, other])
+    db.session.flush()
+    db.session.add_all(
+        QuizSubmission(quiz_id=quiz.id, student_id=student_id, score=1, answers_json=json.dumps({"1": 2}))
+        for student_id in range(1, count + 1)
+    )
+    db.session.add(QuizSubmission(quiz_id=other.id, student_id=1, score=0, answers_json='{}'))
+    db.session.commit()
+    return quiz
+
+def test_ndjson_export_streams_in_batches(app):
+    quiz = _seed(EXPORT_BATCH + 5)
+    chunks = list(stream_submissions(submissions_query(1, quiz.id), "ndjson"))
+    assert len(chunks) == 2
+    lines = "".join(chunks).splitlines()
+    assert len(lines) == EXPORT_BATCH + 5
+    assert json.loads(lines[0])["answers"] == {"1": 2}
+
+def test_csv_export_is_limited_to_the_school(app):
+    _seed(3)
+    rows = "".join(stream_submissions(submissions_query(1), "csv")).splitlines()
+    assert rows[0] == "id,quiz_id,student_id,score,submitted_at,answers"
+    assert len(rows) == 4
@@ -0,0 +1,165 @@
+import json
+import pytest
+import numpy as np
+from models import Quiz, QuizQuestion, QuizSubmission, db
+from quiz_grading import (
+    answer_matrix, score_matrix, regrade_quiz,
+    AnswerKey, answer_key_cache, cached_answer_key, invalidate_answer_key, score_answers,
+    pack_answers, unpack_answers, submission_matrix
+)
+import quiz_ingest
+from quiz_ingest import (
+    pack_stored_answers, ingest_submission, recent_submissions, submission_buffer, SubmissionInProgress
+)
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_answer_matrix_ignores_invalid_answers():
+    answers = [{"1": 2, "2": 3}, {"1": "2", "3": 4}, {}]
+    matrix = answer_matrix(answers, [1, 2])
+    assert matrix.tolist() == [[2, 3], [0, 0], [0, 0]]
+
+def test_score_matrix():
+    matrix = np.array([[1, 2, 3], [1, 1, 1], [4, 2, 3]])
+    assert score_matrix(matrix, np.array([1, 2, 3])).tolist() == [3, 1, 2]
+
+def test_regrade_quiz_after_key_fix(app):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    first = QuizQuestion(quiz_id=quiz.id, question='1 + 1', option_1='1', option_2='2', option_3='3', option_4='4', correct_answer=1)
+    second = QuizQuestion(quiz_id=quiz.id, question='2 + 2', option_1='1', option_2='2', option_3='3', option_4='4', correct_answer=4)
+    db.session.add_all([first, second])
+    db.session.flush()
+    for student_id, answers in ((1, {first.id: 2, second.id: 4}), (2, {first.id: 1, second.id: 4})):
+        db.session.add(QuizSubmission(quiz_id=quiz.id, student_id=student_id, score=None,
+                                      answers_json=json.dumps({str(k): v for k, v in answers.items()})))
+    db.session.commit()
+
+    first.correct_answer = 2
+    assert regrade_quiz(quiz.id) == {"regraded": 2, "changed": 2}
+    db.session.commit()
+    scores = dict(db.session.query(QuizSubmission.student_id, QuizSubmission.score))
+    assert scores == {1: 2, 2: 1}
+
+def test_score_answers_with_answer_key():
+    key = AnswerKey(school_id=1, question_ids=(7, 9), correct=np.array([2, 4]))
+    assert score_answers({"7": 2, "9": 4}, key) == 2
+    assert score_answers({"7": 2, "9": "4", "11": 1}, key) == 1
+
+def test_answer_key_cache_invalidation(app):
+    answer_key_cache.clear()  # Quiz ids restart with every test database
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    question = QuizQuestion(quiz_id=quiz.id, question='1 + 1', option_1='1', option_2='2', option_3='3', option_4='4', correct_answer=1)
+    db.session.add(question)
+    db.session.commit()
+
+    assert cached_answer_key(quiz.id).correct.tolist() == [1]
+    question.correct_answer = 2
+    db.session.commit()
+    assert cached_answer_key(quiz.id).correct.tolist() == [1]  # Served from the cache
+    invalidate_answer_key(quiz.id)
+    assert cached_answer_key(quiz.id).correct.tolist() == [2]
+    assert cached_answer_key(quiz.id + 1) is None
+
+def test_cached_answer_key_follows_the_quiz_version(app):
+    from utils.conditional import touch
+    answer_key_cache.clear()  # Quiz ids restart with every test database
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    question = QuizQuestion(quiz_id=quiz.id, question='1 + 1', option_1='1', option_2='2', option_3='3', option_4='4', correct_answer=1)
+    db.session.add(question)
+    db.session.commit()
+    assert cached_answer_key(quiz.id).correct.tolist() == [1]
+
+    # Another process edits the question: it bumps the version, but cannot invalidate this process's cache
+    question.correct_answer = 3
+    touch(quiz)
+    db.session.commit()
+    assert cached_answer_key(quiz.id).correct.tolist() == [3]
+
+def test_packed_answers_round_trip():
+    packed = pack_answers({"7": 2, "9": None, "11": 4, "99": 1}, [7, 9, 11])
+    assert packed == bytes([2, 0, 4])
+    assert unpack_answers(packed, [7, 9, 11]) == {"7": 2, "11": 4}
+
+def test_submission_matrix_mixes_packed_and_json_rows():
+    rows = [(bytes([1, 2]), None), (None, json.dumps({"7": 3})), (bytes([4, 0]), None)]
+    assert submission_matrix(rows, [7, 9]).tolist() == [[1, 2], [3, 0], [4, 0]]
+
+def test_pack_stored_answers(app):
+    quiz = Quiz(class_id=1, school_id=1, quiz_title='Test Quiz')
+    db.session.add(quiz)
+    db.session.flush()
+    question = QuizQuestion(quiz_id=quiz.id, question='1 + 1', option_1='1', option_2='2', option_3='3', option_4='4', correct_answer=2)
+    db.session.add(question)
+    db.session.flush()
+    db.session.add_all(
+        QuizSubmission(quiz_id=quiz.id, student_id=student_id, score=1, answers_json=json.dumps({str(question.id): 2}))
+        for student_id in (1, 2, 3)
+    )
+    db.session.commit()
+
+    assert pack_stored_answers(batch_size=2) == 3
+    assert pack_stored_answers() == 0
+    stored = db.session.query(QuizSubmission.answers_packed, QuizSubmission.answers_json).all()
+    assert stored == [(bytes([2]), None)] * 3
+    assert regrade_quiz(quiz.id) == {"regraded": 3, "changed": 0}
+
+def test_write_behind_reports_the_stored_score_of_a_repeat(app):
+    recent_submissions.clear()  # As after a restart, or when another worker took the first submission
+    db.session.add(QuizSubmission(quiz_id=1, student_id=7, score=3, answers_packed=bytes([1])))
+    db.session.commit()
+
+    row = {"quiz_id": 1, "student_id": 7, "score": 1, "answers_packed": bytes([2])}
+    assert ingest_submission(row, write_behind=True) == (3, False)
+    assert submission_buffer.pending() == []
+
+def test_concurrent_duplicate_submission_is_refused(monkeypatch):
+    import threading
+    recent_submissions.clear()
+    storing, release = threading.Event(), threading.Event()
+
+    def slow_store(row, write_behind):
+        storing.set()
+        release.wait(5)
+        return row["score"], True
+
+    monkeypatch.setattr(quiz_ingest, '_store_submission', slow_store)
+    row = {"quiz_id": 1, "student_id": 8, "score": 2}
+    first = []
+    thread = threading.Thread(target=lambda: first.append(ingest_submission(dict(row))))
+    thread.start()
+    assert storing.wait(5)
+    with pytest.raises(SubmissionInProgress):
+        ingest_submission({**row, "score": 0})  # Same student, still being accepted
+    release.set()
+    thread.join()
+    assert first == [(2, True)]
+    assert ingest_submission({**row, "score": 0}) == (2, False)
+
+def test_failed_submission_releases_its_key(monkeypatch):
+    recent_submissions.clear()
+
+    def failing_store(row, write_behind):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(quiz_ingest, '_store_submission', failing_store)
+    row = {"quiz_id": 1, "student_id": 9, "score": 2}
+    with pytest.raises(RuntimeError):
+        ingest_submission(row)
+    monkeypatch.setattr(quiz_ingest, '_store_submission', lambda row, write_behind: (row["score"], True))
+    assert ingest_submission(row) == (2, True)
@@ -0,0 +1,81 @@
+import pytest
+from models import Quiz, QuizQuestion, db
+from services.quiz_service import QuizService, QuizValidationError
+from app import create_app  # Assuming you have a create_app function in your app.py
+
+BANK_CSV = """quiz_title,class_id,question,option_1,option_2,option_3,option_4,correct_answer
+Fractions,1,1/2 + 1/2?,1,2,3,4,1
+Fractions,1,1/4 + 1/4?,1/2,1,2,4,1
+Decimals,2,0.5 + 0.5?,0,1,2,3,2
+"""
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+
+def test_parse_csv_groups_questions_by_quiz():
+    quizzes = QuizService.parse_csv(BANK_CSV)
+    assert [(quiz["quiz_title"], len(quiz["questions"])) for quiz in quizzes] == [("Fractions", 2), ("Decimals", 1)]
+    assert quizzes[1]["questions"][0] == {"question": "0.5 + 0.5?", "options": ["0", "1", "2", "3"], "correctAnswer": "2"}
+
+def test_parse_csv_requires_columns():
+    with pytest.raises(QuizValidationError):
+        QuizService.parse_csv("quiz_title,question\nA,B\n")
+
+def test_create_quizzes_validates_before_writing():
+    bad = [{"quiz_title": "A", "class_id": 1, "questions": [{"question": "Q", "options": ["1", "2"], "correctAnswer": 1}]}]
+    with pytest.raises(QuizValidationError, match="Quiz 1, question 1"):
+        QuizService.create_quizzes(1, bad)
+
+def test_create_quizzes_in_one_transaction(app):
+    created = QuizService.create_quizzes(1, QuizService.parse_csv(BANK_CSV))
+    db.session.commit()
+    assert [len(quiz["question_ids"]) for quiz in created] == [2, 1]
+    assert Quiz.query.count() == 2
+    question = db.session.get(QuizQuestion, created[1]["question_ids"][0])
+    assert (question.quiz_id, question.correct_answer) == (created[1]["quiz_id"], 2)
+
+def test_quiz_listing_pages_with_keyset_cursor(app):
+    from flask_jwt_extended import create_access_token
+    from models import User
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    QuizService.create_quizzes(1, QuizService.parse_csv(BANK_CSV) * 3)
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+    client = app.test_client()
+
+    first = client.get('/quizzes?limit=4', headers=headers).json
+    second = client.get(f'/quizzes?limit=4&cursor={first["next_cursor"]}', headers=headers).json
+    assert [len(first["quizzes"]), len(second["quizzes"]), second["next_cursor"]] == [4, 2, None]
+    assert "questions" not in first["quizzes"][0]
+    assert sorted(quiz["question_count"] for quiz in first["quizzes"] + second["quizzes"]) == [1, 1, 1, 2, 2, 2]
+    full = client.get('/quizzes?include=questions', headers=headers).json
+    assert all(len(quiz["questions"]) == quiz["question_count"] for quiz in full["quizzes"])
+
+def test_question_update_validates_options(app):
+    from flask_jwt_extended import create_access_token
+    from models import User
+    user = User(username='teacher', email='teacher@example.com', role='Educator', school_id=1)
+    user.set_password('password')
+    db.session.add(user)
+    question_id = QuizService.create_quizzes(1, QuizService.parse_csv(BANK_CSV))[0]["question_ids"][0]
+    db.session.commit()
+    question = db.session.get(QuizQuestion, question_id)
+    url = f'/quizzes/{question.quiz_id}/questions/{question.id}'
+    headers = {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+    client = app.test_client()
+
+    for options in ("abcd", {"1": "a", "2": "b", "3": "c", "4": "d"}, ["a", "b", "c"], ["a", "b", "c", 4]):
+        response = client.patch(url, json={"options": options}, headers=headers)
+        assert response.status_code == 400, options
+    assert client.patch(url, json={"options": ["w", "x", "y", "z"]}, headers=headers).status_code == 200
+    assert (question.option_1, question.option_4) == ("w", "z")
@@ -0,0 +1,20 @@
+import time
+import pytest
+from utils.snowflake import SnowflakeGenerator, EPOCH_MS
+
+def test_ids_increase_and_fit_javascript_numbers():
+    generator = SnowflakeGenerator(worker_id=3)
+    ids = [generator.next_id() for _ in range(1000)]  # More than one millisecond's sequence
+    assert ids == sorted(set(ids))
+    assert max(ids) < 2 ** 53
+
+def test_timestamp_round_trip():
+    generator = SnowflakeGenerator(worker_id=1)
+    now_ms = int(time.time() * 1000)
+    assert abs(SnowflakeGenerator.timestamp_ms(generator.next_id()) - now_ms) < 1000
+    assert EPOCH_MS < now_ms
+
+def test_worker_ids_are_not_wrapped():
+    assert SnowflakeGenerator(worker_id=31).worker_id == 31
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(worker_id=35)  # Would collide with worker 3
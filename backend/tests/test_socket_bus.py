@@ -0,0 +1,52 @@
+import threading
+import uuid
+import socketio
+from flask import Flask
+from socketio import packet
+from utils.socket_bus import LocalPubSubManager, socketio_options
+
+def make_worker(channel):
+    """One Socket.IO server on the bus, as a separate gunicorn worker would run it.
+
+    Packets are captured where the server would write them to its own
+    clients' connections (the Flask-SocketIO test client refuses message queues).
+    """
+    server = socketio.Server(client_manager=LocalPubSubManager(channel=channel))
+    server.manager_initialized = True
+    server.manager.initialize()
+    server.delivered = []
+    server.arrived = threading.Event()
+
+    def send_eio_packet(eio_sid, eio_packet):
+        server.delivered.append((eio_sid, packet.Packet(encoded_packet=eio_packet.data).data))
+        server.arrived.set()
+
+    server._send_eio_packet = send_eio_packet
+    return server
+
+def connect(server, room):
+    eio_sid = uuid.uuid4().hex
+    sid = server.manager.connect(eio_sid, '/')
+    server.manager.enter_room(sid, '/', room, eio_sid=eio_sid)
+    return eio_sid
+
+def test_socketio_options_pick_the_backend():
+    app = Flask(__name__)
+    assert socketio_options(app) == {}
+    app.config['SOCKETIO_MESSAGE_QUEUE'] = 'local://'
+    app.config['SOCKETIO_CHANNEL'] = 'test-options'
+    manager = socketio_options(app)['client_manager']
+    assert isinstance(manager, LocalPubSubManager) and manager.channel == 'test-options'
+    manager.close()
+
+def test_room_broadcast_reaches_clients_of_other_workers():
+    first, second = make_worker('test-fanout'), make_worker('test-fanout')
+    member = connect(second, 'class_1')
+    connect(second, 'class_2')
+
+    first.emit('chat_message', {'message': 'Hello'}, to='class_1')
+    assert second.arrived.wait(5)
+    assert second.delivered == [(member, ['chat_message', {'message': 'Hello'}])]
+    assert first.delivered == []  # Nobody is connected to the emitting worker
+    first.manager.close()
+    second.manager.close()
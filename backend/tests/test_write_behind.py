@@ -0,0 +1,60 @@
+import threading
+import pytest
+from flask import Flask
+from utils.write_behind import WriteBehindBuffer, BufferFull
+
+def make_buffer(flush, **options):
+    buffer = WriteBehindBuffer(flush, **options)
+    buffer.init_app(Flask(__name__))
+    return buffer
+
+def test_items_are_written_in_batches():
+    batches = []
+    done = threading.Event()
+
+    def flush(items):
+        batches.append(list(items))
+        if sum(map(len, batches)) == 10:
+            done.set()
+
+    buffer = make_buffer(flush, max_batch=4, interval=0.05)
+    for item in range(10):
+        buffer.add(item)
+    assert done.wait(5)
+    assert sorted(item for batch in batches for item in batch) == list(range(10))
+    assert all(len(batch) <= 4 for batch in batches)
+    assert buffer.stats()["flushed"] == 10
+
+def test_failed_batch_is_retried_item_by_item():
+    written = []
+
+    def flush(items):
+        if "bad" in items:
+            raise ValueError("bad row")
+        written.extend(items)
+
+    buffer = make_buffer(flush, interval=60)
+    for item in ("a", "bad", "b"):
+        buffer.add(item)
+    buffer.flush_now()
+    assert written == ["a", "b"]
+    assert buffer.stats()["failed"] == 1
+
+def test_full_buffer_rejects_items():
+    buffer = make_buffer(lambda items: None, interval=60, max_pending=1)
+    buffer.add(1)
+    with pytest.raises(BufferFull):
+        buffer.add(2)
+
+def test_pending_items_are_visible_until_written_and_close_drains():
+    written = []
+    buffer = make_buffer(written.extend, interval=60)
+    buffer.add("a")
+    buffer.add("b")
+    assert buffer.pending() == ["a", "b"]
+    buffer.close()
+    assert written == ["a", "b"]
+    assert buffer.pending() == []
+    stats = buffer.stats()
+    assert (stats["pending"], stats["flushed"], stats["batches"]) == (0, 2, 1)
+    assert stats["max_flush_ms"] >= stats["avg_flush_ms"] > 0
@@ -0,0 +1,37 @@
+import os
+from collections import namedtuple
+from sqlalchemy import select
+from models import db, User
+from utils.cache import TTLCache
+
+# Display names and schools of recently active users, so chat routes resolve
+# the requester without a query. Routes that change a username or school
+# invalidate the user's entry after committing; the TTL bounds how long other
+# server processes can serve a stale name. USER_CACHE_SIZE=0 turns it off.
+UserInfo = namedtuple("UserInfo", "id username school_id")
+user_cache = TTLCache(
+    max_entries=int(os.getenv("USER_CACHE_SIZE", 10000)),
+    ttl=int(os.getenv("USER_CACHE_TTL", 300)),
+)
+
+
+def cached_user(user_id):
+    """Returns the user's UserInfo from the cache, loading it on a miss; None if there is no such user."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    info = user_cache.get(user_id)
+    if info is None:
+        row = db.session.execute(
+            select(User.id, User.username, User.school_id).where(User.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        info = UserInfo(*row)
+        user_cache.put(user_id, info)
+    return info
+
+
+def invalidate_user(user_id):
+    user_cache.invalidate(int(user_id))
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from flask import request
+
+
+def entity_etag(kind, entity_id, version):
+    """Strong ETag of an entity's current version stamp."""
+    return f"{kind}-{entity_id}-v{version}"
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc, microsecond=0) if value else None
+
+
+def not_modified(etag, last_modified=None):
+    """True when the request's validators show the client already has this version.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    Both are checked before the response body is built, so a 304 costs one
+    lookup of the version stamp.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        return _as_utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    """Adds ETag/Last-Modified and asks clients to revalidate on every use."""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _as_utc(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def touch(entity):
+    """Moves an entity to a new version stamp; call it with every change its detail view shows.
+
+    The increment happens in SQL, so concurrent edits never reuse a version.
+    """
+    entity.version = type(entity).version + 1
+    entity.updated_at = datetime.utcnow()
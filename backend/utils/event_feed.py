@@ -0,0 +1,51 @@
+import threading
+from collections import deque
+
+
+class EventFeed:
+    """The most recent events of each topic, with blocking waits for new ones.
+
+    Each topic keeps its last `backlog` events, numbered in publish order.
+    Waiters on a topic sleep on that topic's condition, so an idle topic
+    costs its waiters nothing until something is published to it. The
+    feed lives in one process; events published by other workers are not
+    seen here.
+    """
+
+    def __init__(self, backlog=100):
+        self.backlog = backlog
+        self._lock = threading.Lock()
+        self._topics = {}  # topic -> [last position, condition, deque of (position, event, payload)]
+
+    def _topic(self, topic):
+        entry = self._topics.get(topic)
+        if entry is None:
+            entry = self._topics[topic] = [0, threading.Condition(self._lock), deque(maxlen=self.backlog)]
+        return entry
+
+    def publish(self, topic, event, payload):
+        with self._lock:
+            entry = self._topic(topic)
+            entry[0] += 1
+            entry[2].append((entry[0], event, payload))
+            entry[1].notify_all()
+
+    def position(self, topic):
+        """The position of the topic's latest event; pass it to wait() to get only what follows."""
+        with self._lock:
+            return self._topic(topic)[0]
+
+    def wait(self, topic, position, timeout=None):
+        """Blocks until the topic has events after `position`, or `timeout` seconds pass.
+
+        Returns (new position, [(event, payload), ...]). The list is empty on
+        timeout, and None when events after `position` already fell out of
+        the backlog, in which case the caller has to catch up elsewhere.
+        """
+        with self._lock:
+            entry = self._topic(topic)
+            entry[1].wait_for(lambda: entry[0] > position, timeout)
+            events = [(event, payload) for seq, event, payload in entry[2] if seq > position]
+            if entry[0] > position and (not entry[2] or entry[2][0][0] > position + 1):
+                return entry[0], None
+            return entry[0], events
@@ -0,0 +1,50 @@
+import threading
+import time
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+# 41 bits of milliseconds + 5 + 7 = 53 bits: ids stay exact as JavaScript numbers
+
+
+class SnowflakeGenerator:
+    """Time-ordered unique ids: milliseconds since EPOCH_MS, then a worker id, then a per-millisecond sequence.
+
+    Every process issuing ids into the same table needs its own worker id.
+    Ids from one worker strictly increase; ids from different workers are
+    ordered to the millisecond. Each worker issues up to 128 ids per
+    millisecond and waits for the next one beyond that. If the clock steps
+    back, the last timestamp is reused until it catches up.
+    """
+
+    def __init__(self, worker_id):
+        # Two generators sharing a worker id issue the same ids, so it is never derived or wrapped
+        if not 0 <= worker_id < (1 << WORKER_BITS):
+            raise ValueError(f"worker_id must be between 0 and {(1 << WORKER_BITS) - 1}, got {worker_id}")
+        self.worker_id = worker_id
+        self._last_ms = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            now = max(int(time.time() * 1000) - EPOCH_MS, self._last_ms)
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) % (1 << SEQUENCE_BITS)
+                if self._sequence == 0:  # Sequence exhausted for this millisecond
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    @staticmethod
+    def timestamp_ms(snowflake_id):
+        return (snowflake_id >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS
+
+    @staticmethod
+    def first_id_at(timestamp_ms):
+        """The smallest id any worker can issue in the given millisecond."""
+        return (timestamp_ms - EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)
@@ -0,0 +1,75 @@
+import pickle
+import queue
+import threading
+import socketio
+
+DEFAULT_CHANNEL = "flask-socketio"
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """Socket.IO pub/sub over in-process queues.
+
+    Every manager on the same channel in this process receives every
+    message, serialized as a broker would carry it. Several SocketIO servers
+    in one process can so stand in for separate workers in tests and
+    benchmarks, without Redis or a Kombu broker.
+    """
+    name = "local"
+
+    _subscribers = {}  # channel -> queues of the listening managers
+    _lock = threading.Lock()
+
+    def __init__(self, url="local://", channel=DEFAULT_CHANNEL, write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._lock:
+                self._subscribers.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        message = pickle.dumps(data)
+        with self._lock:
+            subscribers = list(self._subscribers.get(self.channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+    def close(self):
+        with self._lock:
+            subscribers = self._subscribers.get(self.channel, [])
+            if self._queue in subscribers:
+                subscribers.remove(self._queue)
+
+
+def client_manager(url, channel=DEFAULT_CHANNEL, write_only=False):
+    """The Socket.IO client manager for a message queue URL, chosen by scheme.
+
+    redis:// or rediss:// (needs the redis package), kafka:// (kafka-python),
+    zmq+tcp:// (pyzmq), local:// (in-process, for tests), or anything else
+    Kombu can connect to, such as amqp:// (kombu).
+    """
+    if url.startswith("local://"):
+        manager_class = LocalPubSubManager
+    elif url.startswith(("redis://", "rediss://")):
+        manager_class = socketio.RedisManager
+    elif url.startswith("kafka://"):
+        manager_class = socketio.KafkaManager
+    elif url.startswith("zmq"):
+        manager_class = socketio.ZmqManager
+    else:
+        manager_class = socketio.KombuManager
+    return manager_class(url, channel=channel, write_only=write_only)
+
+
+def socketio_options(app):
+    """Keyword arguments for SocketIO.init_app that connect it to the SOCKETIO_MESSAGE_QUEUE bus.
+
+    Without a bus, events only reach the clients connected to the emitting worker.
+    """
+    url = app.config.get("SOCKETIO_MESSAGE_QUEUE")
+    if not url:
+        return {}
+    return {"client_manager": client_manager(url, app.config.get("SOCKETIO_CHANNEL") or DEFAULT_CHANNEL)}
@@ -0,0 +1,132 @@
+import atexit
+import threading
+import time
+
+
+class BufferFull(Exception):
+    """Raised when the buffer already holds `max_pending` items; callers write directly instead."""
+
+
+class WriteBehindBuffer:
+    """Collects items from request threads and writes them in batches on a background thread.
+
+    `flush(items)` is called with up to `max_batch` items inside an app
+    context, at the latest `interval` seconds after the first item of a batch
+    arrived. A failing batch is retried item by item, so one bad row does not
+    take the rest of the batch with it. Pending items are flushed at exit.
+    `pending()` lists the items not yet committed, for reads that must see them.
+    """
+
+    def __init__(self, flush, name="write-behind", max_batch=500, interval=0.05, max_pending=10000):
+        self.flush = flush
+        self.name = name
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_pending = max_pending
+        self.app = None
+        self._items = []
+        self._in_flight = []  # Batches taken from _items whose flush has not finished
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._counters = {"flushed": 0, "batches": 0, "failed": 0, "flush_ms_total": 0.0, "last_flush_ms": 0.0,
+                          "max_flush_ms": 0.0}
+        atexit.register(self.close)
+
+    def init_app(self, app, max_batch=None, interval=None, max_pending=None):
+        self.app = app
+        self.max_batch = max_batch or self.max_batch
+        self.interval = interval if interval is not None else self.interval
+        self.max_pending = max_pending or self.max_pending
+        app.extensions[self.name] = self
+
+    def add(self, item):
+        with self._condition:
+            if len(self._items) >= self.max_pending:
+                raise BufferFull(f"{self.name} buffer is full")
+            self._items.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            if len(self._items) >= self.max_batch:
+                self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            batches = self._counters["batches"]
+            return {
+                "pending": len(self._items),
+                "in_flight": sum(map(len, self._in_flight)),
+                **self._counters,
+                "flush_ms_total": round(self._counters["flush_ms_total"], 3),
+                "avg_flush_ms": round(self._counters["flush_ms_total"] / batches, 3) if batches else 0.0,
+            }
+
+    def pending(self):
+        """Snapshot of the items added but not yet written, oldest first."""
+        with self._condition:
+            return [item for batch in self._in_flight for item in batch] + list(self._items)
+
+    def flush_now(self):
+        """Writes everything buffered so far on the calling thread."""
+        while True:
+            with self._condition:
+                batch, self._items = self._items[:self.max_batch], self._items[self.max_batch:]
+                if batch:
+                    self._in_flight.append(batch)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self, timeout=10):
+        """Stops the background thread once its current batch is written, then writes what is left."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self.flush_now()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._items and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                deadline = time.monotonic() + self.interval
+                while len(self._items) < self.max_batch and not self._stopped:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch, self._items = self._items[:self.max_batch], self._items[self.max_batch:]
+                if not batch:  # flush_now took the items while this thread waited
+                    continue
+                self._in_flight.append(batch)
+            self._write(batch)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        with self.app.app_context():
+            try:
+                self.flush(batch)
+                failed = 0
+            except Exception as e:
+                print(f"⚠️ {self.name}: batch of {len(batch)} failed ({e}), retrying one by one")
+                failed = 0
+                for item in batch:
+                    try:
+                        self.flush([item])
+                    except Exception as item_error:
+                        failed += 1
+                        print(f"⚠️ {self.name}: dropped {item!r}: {item_error}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._condition:
+            self._in_flight = [pending for pending in self._in_flight if pending is not batch]
+            self._counters["batches"] += 1
+            self._counters["flush_ms_total"] += elapsed_ms
+            self._counters["last_flush_ms"] = round(elapsed_ms, 3)
+            self._counters["max_flush_ms"] = round(max(self._counters["max_flush_ms"], elapsed_ms), 3)
+            self._counters["flushed"] += len(batch) - failed
+            self._counters["failed"] += failed
@@ -2,6 +2,9 @@ import React, { useState, useEffect, useRef } from "react";
 import axios from "axios";
 import { useParams } from "react-router-dom";
 import { FaPaperPlane } from "react-icons/fa";
+import { io } from "socket.io-client";
+
+const BASE_URL = "https://virtual-school-2.onrender.com";
 
 const ClassChat = () => {
   const { classId } = useParams(); // Get class ID from URL
@@ -15,7 +18,7 @@ const ClassChat = () => {
     const fetchMessages = async () => {
       try {
         const response = await axios.get(`/api/chats/${classId}`);
-        setMessages(response.data.chats);
+        setMessages([...response.data.chats].reverse()); // Newest page, shown oldest first
       } catch (error) {
         console.error("Error fetching messages:", error);
       } finally {
@@ -25,9 +28,19 @@ const ClassChat = () => {
 
     fetchMessages();
 
-    // Poll for new messages every 5 seconds
-    const interval = setInterval(fetchMessages, 5000);
-    return () => clearInterval(interval);
+    // New messages of this class are pushed over the socket instead of polled
+    const socket = io(BASE_URL, { auth: { token: localStorage.getItem("token") } });
+    socket.on("chat_message", (chat) => {
+      if (String(chat.class_id) !== String(classId)) return;
+      setMessages((prev) => (prev.some((m) => m.id === chat.id) ? prev : [...prev, chat]));
+    });
+    socket.on("chat_updated", ({ id, message }) => {
+      setMessages((prev) => prev.map((m) => (m.id === id ? { ...m, message } : m)));
+    });
+    socket.on("chat_deleted", ({ id }) => {
+      setMessages((prev) => prev.filter((m) => m.id !== id));
+    });
+    return () => socket.disconnect();
   }, [classId]);
 
   // Scroll to the latest message
@@ -43,7 +56,8 @@ const ClassChat = () => {
         class_id: classId,
         message: newMessage,
       });
-      setMessages((prev) => [...prev, response.data.chat]);
+      const chat = response.data.chat;
+      setMessages((prev) => (prev.some((m) => m.id === chat.id) ? prev : [...prev, chat]));
       setNewMessage("");
     } catch (error) {
       console.error("Error sending message:", error);
@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useCallback } from "react";
+import { fetchAllPages } from "../../utilities/fetchAllPages";
 
 const BASE_URL = "https://virtual-school-2.onrender.com"; // Backend URL
 
@@ -39,25 +40,25 @@ function ExamManagementPage() {
     try {
       setLoading(true);
       const token = localStorage.getItem("token"); // Get the JWT token from local storage
-      const [examsResponse, quizzesResponse] = await Promise.all([
+      const [examsResponse, allQuizzes] = await Promise.all([
         fetch(`${BASE_URL}/exams?page=${currentPage}`, {
           headers: {
             Authorization: `Bearer ${token}`, // Include the token in the headers
           },
         }),
-        fetch(`${BASE_URL}/quizzes`, {
+        // Every page of quizzes, 100 at a time
+        fetchAllPages(`${BASE_URL}/quizzes?limit=100`, "quizzes", {
           headers: {
             Authorization: `Bearer ${token}`, // Include the token in the headers
           },
         }),
       ]);
 
-      if (!examsResponse.ok || !quizzesResponse.ok) {
+      if (!examsResponse.ok) {
         throw new Error("Failed to fetch data");
       }
 
       const examsData = await examsResponse.json();
-      const quizzesData = await quizzesResponse.json();
 
       // Ensure exams are filtered by the user's school_id
       const user = JSON.parse(localStorage.getItem("user")); // Get user details from local storage
@@ -69,7 +70,7 @@ function ExamManagementPage() {
         pages: examsData.pages,
         currentPage: examsData.current_page,
       });
-      setQuizzes(quizzesData);
+      setQuizzes(allQuizzes); // Summaries: id, title, class and question count
     } catch (err) {
       setError("Failed to load data");
       console.error(err);
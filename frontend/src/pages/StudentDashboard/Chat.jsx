@@ -1,4 +1,5 @@
 import React, { useState, useEffect } from 'react';
+import { io } from 'socket.io-client';
 import { FaPaperPlane } from 'react-icons/fa';
 import { MdEdit, MdDelete } from 'react-icons/md';
 import 'bootstrap/dist/css/bootstrap.min.css';
@@ -9,25 +10,25 @@ const BASE_URL = 'https://virtual-school-2.onrender.com';
 function Chat({ classId = 1 }) {
   const [chats, setChats] = useState([]);
   const [error, setError] = useState('');
-  const [totalPages, setTotalPages] = useState(1);
-  const [currentPage, setCurrentPage] = useState(1);
+  const [olderCursor, setOlderCursor] = useState(null);
   const [message, setMessage] = useState('');
   const token = localStorage.getItem('token');
 
-  // Fetch chats from the server
-  const fetchChats = async (page = 1) => {
+  // Fetch the newest messages, or with a cursor the page of older ones before it
+  const fetchChats = async (before = null) => {
     setError('');
     try {
-      const response = await fetch(`${BASE_URL}/chats/${classId}?page=${page}`, {
+      const query = before ? `?before=${before}` : '';
+      const response = await fetch(`${BASE_URL}/chats/${classId}${query}`, {
         headers: { Authorization: `Bearer ${token}` }
       });
       if (!response.ok) {
         throw new Error('Error fetching chats');
       }
       const data = await response.json();
-      setChats(data.chats);
-      setTotalPages(data.pages);
-      setCurrentPage(data.current_page);
+      const page = [...data.chats].reverse(); // Pages come newest first
+      setChats((prev) => (before ? [...page, ...prev] : page));
+      setOlderCursor(data.next_cursor);
     } catch (err) {
       console.error('Error fetching chats:', err);
       setError("Couldn't load messages");
@@ -39,11 +40,29 @@ function Chat({ classId = 1 }) {
     // eslint-disable-next-line
   }, [classId]);
 
-  // Refresh the current page of chats
+  // Reload the newest messages
   const refreshChats = () => {
-    fetchChats(currentPage);
+    fetchChats();
   };
 
+  // New, edited and deleted messages of this class are pushed over the socket
+  useEffect(() => {
+    const socket = io(BASE_URL, { auth: { token } });
+    const forThisClass = (handler) => (data) => {
+      if (String(data.class_id) === String(classId)) handler(data);
+    };
+    socket.on('chat_message', forThisClass((chat) => {
+      setChats((prev) => (prev.some((c) => c.id === chat.id) ? prev : [...prev, chat]));
+    }));
+    socket.on('chat_updated', forThisClass(({ id, message }) => {
+      setChats((prev) => prev.map((c) => (c.id === id ? { ...c, message } : c)));
+    }));
+    socket.on('chat_deleted', forThisClass(({ id }) => {
+      setChats((prev) => prev.filter((c) => c.id !== id));
+    }));
+    return () => socket.disconnect();
+  }, [classId, token]);
+
   // Delete a chat message
   const handleDelete = async (chatId) => {
     setError('');
@@ -103,8 +122,7 @@ function Chat({ classId = 1 }) {
       if (!response.ok) {
         throw new Error('Error sending chat');
       }
-      setMessage('');
-      refreshChats();
+      setMessage('');  // The message arrives over the socket
     } catch (err) {
       console.error('Error sending chat:', err);
       setError("Couldn't send message");
@@ -165,21 +183,14 @@ function Chat({ classId = 1 }) {
             )}
           </div>
 
-          {/* Pagination */}
-          <nav>
-            <ul className="pagination justify-content-center mb-0">
-              {Array.from({ length: totalPages }).map((_, index) => (
-                <li
-                  key={index}
-                  className={`page-item ${currentPage === index + 1 ? 'active' : ''}`}
-                >
-                  <button className="page-link" onClick={() => fetchChats(index + 1)}>
-                    {index + 1}
-                  </button>
-                </li>
-              ))}
-            </ul>
-          </nav>
+          {/* Older messages */}
+          {olderCursor && (
+            <div className="text-center py-2 border-top">
+              <button className="btn btn-sm btn-outline-secondary" onClick={() => fetchChats(olderCursor)}>
+                Load older messages
+              </button>
+            </div>
+          )}
 
           {/* Bottom Input Bar */}
           <div className="p-3 border-top">
@@ -1,4 +1,5 @@
 import React, { useState, useEffect, useCallback } from "react";
+import { fetchAllPages } from "../../utilities/fetchAllPages";
 
 function StudentActions() {
   const [exams, setExams] = useState([]);
@@ -25,20 +26,21 @@ function StudentActions() {
       }
 
       // 2) Make the requests with the Authorization header
-      const [examsResponse, quizzesResponse] = await Promise.all([
+      const [examsResponse, allQuizzes] = await Promise.all([
         fetch("https://virtual-school-2.onrender.com/exams", {
           headers: {
             Authorization: `Bearer ${token}`,
           },
         }),
-        fetch("https://virtual-school-2.onrender.com/quizzes", {
+        // /quizzes is paged: follow next_cursor until every quiz is loaded
+        fetchAllPages("https://virtual-school-2.onrender.com/quizzes?include=questions&limit=100", "quizzes", {
           headers: {
             Authorization: `Bearer ${token}`,
           },
         }),
       ]);
 
-      if (!examsResponse.ok || !quizzesResponse.ok) {
+      if (!examsResponse.ok) {
         throw new Error("Failed to fetch data");
       }
 
@@ -48,9 +50,7 @@ function StudentActions() {
       // so we'll assume the array is at examsData.exams
       setExams(examsData.exams);
 
-      const quizzesData = await quizzesResponse.json();
-      // /quizzes returns a list ( array ) of quizzes directly
-      setQuizzes(quizzesData);
+      setQuizzes(allQuizzes);
     } catch (err) {
       console.error(err);
       setError("Failed to load data: " + err.message);
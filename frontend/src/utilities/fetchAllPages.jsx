@@ -0,0 +1,17 @@
+// Follows next_cursor from page to page and returns the items of every page
+export const fetchAllPages = async (url, key, options = {}) => {
+  const items = [];
+  let cursor = null;
+  do {
+    const separator = url.includes('?') ? '&' : '?';
+    const pageUrl = cursor ? `${url}${separator}cursor=${encodeURIComponent(cursor)}` : url;
+    const response = await fetch(pageUrl, options);
+    if (!response.ok) {
+      throw new Error(`Failed to fetch ${key}`);
+    }
+    const data = await response.json();
+    items.push(...data[key]);
+    cursor = data.next_cursor;
+  } while (cursor);
+  return items;
+};